@@ -2,17 +2,12 @@
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
 import optuna
-from optuna.integration import PyTorchLightningPruningCallback
 
 import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
+from pytorch_lightning import seed_everything
 
 import source.preprocess as prep
 import source.model_components as model_comps
@@ -23,15 +18,12 @@ import train_SemiSupervised as training_utils
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
 from tqdm import tqdm
 import random
 
-from sklearn.model_selection import train_test_split
-
 
 
 
@@ -410,6 +402,8 @@ def get_args() -> any:
     parser.add_argument('--lr', default = 1e-4, help = 'flag: learning rate', type = float)
     parser.add_argument('--DEVICE', default = 'cuda', help = 'flag: setup GPU', type = str)
     parser.add_argument('--split_option', default=0, type=int, help='Choose how to split into train/valid set') 
+    parser.add_argument('--store_dir', default='', type=str, help='Directory of the shared memory-mapped dataset store (empty: in-memory)')
+    parser.add_argument('--tensor_loader', default=0, type=int, help='0: DataLoader workers | 1: in-memory tensor batches | 2: tensor batches preloaded on DEVICE')
 
     # general architecture variables
     parser.add_argument('--z_dim', default='6', type=str, help='Latent space size')
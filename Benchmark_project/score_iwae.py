@@ -0,0 +1,137 @@
+"""
+@summary: zero-shot fitness ranking with importance-weighted log p(x) estimates of a trained ProtWaveVAE
+(see source/iwae.py). Streams over the FLIP splits and reports the Spearman rho against fitness for every K.
+"""
+import torch
+
+import source.iwae as iwae
+import train_SemiSupervised as train_sess
+
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+
+def get_args() -> any:
+
+    # write output path name
+    parser = argparse.ArgumentParser()
+    
+    # path varibles
+    parser.add_argument('--data_path', default='./data/*.csv')
+    parser.add_argument('--train_path', default='./data/*.csv')
+    parser.add_argument('--valid_path', default='./data/*.csv')
+    parser.add_argument('--test_path', default='./data/*.csv')
+     
+    parser.add_argument('--output_results_path', default='./outputs/benchmark_task/final_model/*.csv')
+    parser.add_argument('--output_model_path', default='./outputs/benchmark_task/final_model/*.pth')
+    parser.add_argument('--output_folder_path', default='./outputs/benchmark_task/*.pth')
+
+    parser.add_argument('--protein', default='AAV')
+
+    # model training variables
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--batch_size', default=512, type=int, help='Size of the batch.')
+    parser.add_argument('--epochs', default=1000, type=int, help='Number of epochs')
+    parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
+    parser.add_argument('--DEVICE', default='cuda', help='Learning rate')
+    parser.add_argument('--split_option', default=0, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--store_dir', default='', type=str, help='Directory of the shared memory-mapped dataset store (empty: in-memory)')
+    parser.add_argument('--tensor_loader', default=0, type=int, help='0: DataLoader workers | 1: in-memory tensor batches | 2: tensor batches preloaded on DEVICE')
+   
+    # general architecture variables
+    parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
+    parser.add_argument('--num_classes', default=2, type=int, help='functional/nonfunctional labels')
+    parser.add_argument('--aa_labels', default=21, type=int, help='AA plus pad gap (20+1) labels')
+    
+    # encoder hyperparameters
+    parser.add_argument('--encoder_rates', default=5, type=int, help='dilation convolution depth')
+    parser.add_argument('--C_in', default=21, type=int, help='input feature depth')
+    parser.add_argument('--C_out', default=256, type=int, help='output feature depth')
+    parser.add_argument('--alpha', default=0.1, type=float, help='leaky Relu hyperparameter (optional)')
+    parser.add_argument('--enc_kernel', default=3, type=int, help='kernel filter size')
+    parser.add_argument('--num_fc', default=1, type=int, help='number of fully connect layers')
+      
+    # top model (discriminative decoder) hyperparameters
+    parser.add_argument('--disc_num_layers', default=2, type=int, help='depth of the discrim. top model')
+    parser.add_argument('--hidden_width', default=10, type=int, help='width of top model')
+    parser.add_argument('--p', default=0.3, type=float, help='top model dropout')
+
+    # decoder wavenet hyperparameters
+    parser.add_argument('--wave_hidden_state', default=256, type=int, help='no. filters for the dilated convolutions')
+    parser.add_argument('--head_hidden_state', default=128, type=int, help='no. filters for the WaveNets top model')
+    parser.add_argument('--num_dil_rates', default=8, type=int, help='depth of the WaveNet')
+    parser.add_argument('--dec_kernel_size', default=3, type=int, help='WaveNet kernel size')
+
+    # loss prefactor weights
+    parser.add_argument('--nll_weight', default=1., type=float, help='NLL prefactor weight')
+    parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
+    parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
+    parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # IWAE scoring (cost grows linearly with K; the estimates for every K in K_list come from the same K_max samples)
+    parser.add_argument('--K_list', default='1|8|32|128', help='no. posterior samples per sequence to report (split by |)')
+    parser.add_argument('--max_rows', default=4096, type=int, help='max. stacked (sequence, sample) rows per decoder pass')
+    parser.add_argument('--splits', default='test', help='benchmark splits to score: train | valid | test (split by |)')
+    parser.add_argument('--ignore_pads', default=0, type=int, help='leave the pad positions out of log p(x|z) (1) or score the full padded sequence (0)')
+
+    args = parser.parse_args()
+    
+    return args
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    if args.DEVICE == 'cuda':
+        train_sess.set_GPU() # set GPU
+    train_sess.set_SEED(args=args)
+    os.makedirs(args.output_folder_path, exist_ok=True)
+    K_list = [int(K) for K in args.K_list.split('|')]
+
+    # benchmark splits
+    train_dataloader, valid_dataloader, test_dataloader, protein_len = train_sess.get_data(args=args)
+    dataloaders = {'train': train_dataloader, 'valid': valid_dataloader, 'test': test_dataloader}
+
+    # trained model
+    PL_model = train_sess.get_model(
+                        args=args,
+                        protein_len=protein_len
+    )
+    model = PL_model.model.to(args.DEVICE)
+    model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
+
+    reports = []
+    for split in args.splits.split('|'):
+
+        start = time.perf_counter()
+        log_w, y_true = iwae.score_dataloader(
+                            model=model,
+                            dataloader=dataloaders[split],
+                            K=max(K_list),
+                            DEVICE=args.DEVICE,
+                            max_rows=args.max_rows,
+                            ignore_pads=bool(args.ignore_pads)
+        )
+        elapsed = time.perf_counter() - start
+
+        report_df = iwae.ranking_report(log_w=log_w, y_true=y_true, K_list=K_list)
+        report_df.insert(0, 'split', split)
+        report_df['seconds_at_K_max'] = elapsed
+        reports.append(report_df)
+
+        # per-sequence scores at the largest K
+        scores_df = pd.DataFrame(
+                {
+                    'fitness': y_true.numpy(),
+                    'iwae': iwae.iwae_bound(log_w, max(K_list)).numpy(),
+                    'elbo': iwae.elbo_bound(log_w, max(K_list)).numpy()
+                }
+        )
+        scores_df.to_csv(args.output_results_path.replace('.csv', f'_iwae_scores_{split}.csv'), index=False)
+
+    report_df = pd.concat(reports, ignore_index=True)
+    report_df.to_csv(args.output_results_path.replace('.csv', '_iwae_spearman.csv'), index=False)
+    print(report_df)
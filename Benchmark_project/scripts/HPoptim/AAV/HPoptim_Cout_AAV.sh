@@ -14,6 +14,7 @@ export test_path='../../.././data/AAV/full_data.csv'
 export output_results_path='../../.././outputs/HPoptim/AAV/HPoptim_Cout'
 export output_model_path='../../.././outputs/HPoptim/AAV/HPoptim_Cout'
 export output_folder_path='../../.././outputs/HPoptim/AAV'
+export store_dir='../../.././outputs/HPoptim/AAV/data_store' # shared memory-mapped datasets of the sweep
 export protein='AAV'
 
 # model training variables
@@ -94,6 +95,7 @@ python ../../../HPoptim_benchmark_ProtWaveVAE.py \
         --MI_weight ${MI_weight} \
         --lambda_weight ${lambda_weight} \
         --gamma_weight ${gamma_weight} \
+		--store_dir ${store_dir} \
 		--search_variable ${search_variable} \
 		--n_trials ${n_trials} \
 		--K ${K} \
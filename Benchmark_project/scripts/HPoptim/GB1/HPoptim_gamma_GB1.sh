@@ -14,6 +14,7 @@ export test_path='../../.././data/'
 export output_results_path='../../.././outputs/HPoptim/GB1/GB1_split0'
 export output_model_path='../../.././outputs/HPoptim/GB1/final_model/GB1_split0.pth'
 export output_folder_path='../../.././outputs/HPoptim/GB1'
+export store_dir='../../.././outputs/HPoptim/GB1/data_store' # shared memory-mapped datasets of the sweep
 export protein='GB1'
 
 
@@ -94,6 +95,7 @@ python ../../../HPoptim_benchmark_ProtWaveVAE.py \
                 --MI_weight ${MI_weight} \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
+		--store_dir ${store_dir} \
 		--search_variable ${search_variable} \
 		--n_trials ${n_trials} \
 		--K ${K} \
@@ -14,6 +14,7 @@ export test_path='../../.././data/stability/stability_test.json'
 export output_results_path='../../.././outputs/HPoptim/stability/stability_'
 export output_model_path='../../.././outputs/HPoptim/stability/final_model/stability_disc_width.pth'
 export output_folder_path='../../.././outputs/HPoptim/stability'
+export store_dir='../../.././outputs/HPoptim/stability/data_store' # shared memory-mapped datasets of the sweep
 export protein='stability'
 
 
@@ -94,6 +95,7 @@ python ../../../HPoptim_benchmark_ProtWaveVAE.py \
                 --MI_weight ${MI_weight} \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
+		--store_dir ${store_dir} \
 		--search_variable ${search_variable} \
 		--n_trials ${n_trials} \
 		--K ${K} \
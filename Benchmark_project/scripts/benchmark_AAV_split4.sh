@@ -54,6 +54,16 @@ export MI_weight=0.99
 export lambda_weight=10.0
 export gamma_weight=10.0
 
+# checkpointing (ckpt_every=0: off, resume=1: restart from the last checkpoint)
+export ckpt_every=0
+export resume=0
+
+# distributed CPU training (num_processes > 1: DDP over gloo)
+export num_processes=1
+
+# mixed precision (1: bfloat16 autocast, 0: float32)
+export bf16=0
+
 
 python ../train_SemiSupervised.py \
 		--data_path ${data_path} \
@@ -86,6 +96,10 @@ python ../train_SemiSupervised.py \
                 --MI_weight ${MI_weight} \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
+                --ckpt_every ${ckpt_every} \
+                --resume ${resume} \
+                --num_processes ${num_processes} \
+                --bf16 ${bf16} \
 		
 
 
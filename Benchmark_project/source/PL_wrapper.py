@@ -5,34 +5,107 @@ author: Niksa Praljak
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
 from torch.autograd import Variable
 from torch.nn import functional as F
 
 
 # super Pytorch Lightning
 import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
 
 import source.preprocess as prep
 #import source.losses as losses
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
+import source.precision as prec
+import protwavevae.telemetry as telemetry
+import protwavevae.micro_batching as micro
+from protwavevae.checkpointing import ( # re-exported: PeriodicCheckpoint is part of this module's API
+        PeriodicCheckpoint,
+        save_loss_histories,
+        load_loss_histories
+)
 
 #import utils.GFP_SS_utils as GFP_utils
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
+import os
 from tqdm import tqdm
 
-from sklearn.metrics import mean_squared_error, precision_score, recall_score, f1_score
-from scipy.stats import pearsonr, spearmanr
+
+def get_world_size(module: pl.LightningModule) -> int:
+    return module.trainer.world_size if module.trainer is not None else 1
+
+
+def all_gather_varlen(
+        module: pl.LightningModule,
+        x: torch.Tensor,
+        sync_grads: bool=False
+    ) -> torch.Tensor:
+    """
+    function description: concatenate a [B_rank, ...] tensor over the DDP ranks (batch sizes may differ between ranks).
+    With sync_grads, gradients flow back to the local slice.
+    """
+    if get_world_size(module) == 1:
+        return x
+
+    sizes = module.all_gather(torch.tensor([x.shape[0]], device = x.device)).view(-1)
+    max_size = int(sizes.max())
+    x_pad = torch.cat((x, x.new_zeros((max_size - x.shape[0],) + tuple(x.shape[1:]))), dim = 0)
+    x_all = module.all_gather(x_pad, sync_grads = sync_grads) # [world_size, max_size, ...]
+    return torch.cat([x_all[rank, :int(size)] for rank, size in enumerate(sizes)], dim = 0)
+
+
+def gather_latents(
+        module: pl.LightningModule,
+        z_pred: torch.FloatTensor,
+        z_true_samples: torch.FloatTensor
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    # the MMD is estimated on the global batch (all ranks) instead of each rank's shard
+    if module.latent_cache is not None: # micro-batch mode: the latent cache already holds the global batch
+        return (
+                z_pred,
+                z_true_samples
+        )
+    z_pred = all_gather_varlen(module, z_pred, sync_grads = module.training)
+    z_true_samples = all_gather_varlen(module, z_true_samples.to(z_pred.device))
+    return (
+            z_pred,
+            z_true_samples
+    )
+
+
+def gather_predictions(
+        module: pl.LightningModule,
+        y_pred: torch.FloatTensor,
+        y_true: torch.FloatTensor
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    # epoch predictions of all ranks (metrics are computed on the whole split)
+    y_pred = all_gather_varlen(module, y_pred.to(module.device)).cpu()
+    y_true = all_gather_varlen(module, y_true.to(module.device)).cpu()
+    return (
+            y_pred,
+            y_true
+    )
+
+
+def sync_mean(module: pl.LightningModule, values: list) -> np.float64:
+    # mean of the per-batch values of all ranks (identical on every rank)
+    if get_world_size(module) == 1:
+        return np.mean(values)
+    stats = module.all_gather(torch.tensor([np.sum(values), len(values)], dtype = torch.float64, device = module.device))
+    return np.float64((stats[:,0].sum() / stats[:,1].sum()).item())
+
+
 
 
 
@@ -60,7 +133,8 @@ class Lit_SSInfoVAE(pl.LightningModule):
         # device
         self.DEVICE=DEVICE
 
-        # model    
+        # model (float32 unless enable_bf16 is called)
+        self.bf16=False
         self.model=SS_InfoVAE
  
          # prefactor weights
@@ -93,6 +167,10 @@ class Lit_SSInfoVAE(pl.LightningModule):
         self.train_pearson_list, self.val_pearson_list = [], []
         self.train_spearman_list, self.val_spearman_list = [], []
 
+        # micro-batch mode (off: see enable_micro_batching)
+        self.micro_batches = 1
+        self.latent_cache = None
+
         self.save_hyperparameters("lr", "z_dim", "xi_weight", "alpha_weight", "lambda_weight", "gamma_weight")
         
     def forward(self,x: torch.FloatTensor) -> (
@@ -121,6 +199,28 @@ class Lit_SSInfoVAE(pl.LightningModule):
     def configure_optimizers(self,):
         return torch.optim.Adam(self.parameters(), lr = self.lr)
 
+    def on_save_checkpoint(self, checkpoint: dict) -> None:
+        save_loss_histories(self, checkpoint)
+
+    def on_load_checkpoint(self, checkpoint: dict) -> None:
+        load_loss_histories(self, checkpoint)
+
+    def enable_micro_batching(self, micro_batches: int) -> None:
+        """
+        function description: train every batch as micro_batches accumulated micro-batches while the MMD is still
+        estimated on the whole batch (see protwavevae.micro_batching); switches to manual optimization.
+        """
+        self.micro_batches = micro_batches
+        self.automatic_optimization = micro_batches <= 1
+
+    def enable_bf16(self) -> None:
+        """
+        function description: opt-in bfloat16 autocast for the conv/linear layers of the encoder, generator,
+        conditioning network and discriminator; losses and BatchNorm statistics stay in float32.
+        """
+        prec.enable_bf16(self.model)
+        self.bf16 = True
+
     def compute_task_metrics(
             self,
             y_pred: torch.FloatTensor,
@@ -133,6 +233,9 @@ class Lit_SSInfoVAE(pl.LightningModule):
         """
         using sklearn metrics, which means that we will have to convert between torch-numpy and GPU         -CPU.
         """
+        from sklearn.metrics import mean_squared_error
+        from scipy.stats import pearsonr, spearmanr
+
         # temp:  convert torch tensor to numpy
         y_pred = y_pred.cpu().detach().numpy().squeeze(1).astype('float')
         y_true = y_true.cpu().detach().numpy().squeeze(1).astype('float')
@@ -158,6 +261,10 @@ class Lit_SSInfoVAE(pl.LightningModule):
             batch: torch.FloatTensor,
             batch_idx: any
         ) -> dict:
+        # micro-batch mode: one optimizer step over the micro-batches of this batch
+        if self.micro_batches > 1 and self.latent_cache is None:
+            return micro.micro_batch_step(self, batch, batch_idx, x_index = 1, gather = lambda x: all_gather_varlen(self, x))
+
         
 
         # return onehot encoded features, regression predictions, and accepted flow indexes
@@ -173,6 +280,9 @@ class Lit_SSInfoVAE(pl.LightningModule):
            z_true_samples = Variable(torch.randn((len(x_onehot), self.z_dim)).to(self.DEVICE))
         else:
            z_true_samples = torch.randn((len(x_onehot), self.z_dim))
+
+        # DDP: gather the latents of all ranks for the MMD
+        z_pred, z_true_samples = gather_latents(self, z_pred, z_true_samples)
  
  
         # compute loss
@@ -188,6 +298,10 @@ class Lit_SSInfoVAE(pl.LightningModule):
         )
         
         
+        # micro-batch mode: MMD of the whole batch (cached latents)
+        if self.latent_cache is not None:
+            loss_mmd = self.latent_cache.mmd(z_pred)
+
         # stop track these variables 
         z_true_samples = z_true_samples.detach().cpu()
 
@@ -204,6 +318,7 @@ class Lit_SSInfoVAE(pl.LightningModule):
         # for now.. only track classification predictions
         return {'loss': loss.float(),'y_pred': y_pred_R, 'y_true': y_pheno_R}
 
+    @telemetry.timed('train/epoch_end_metrics')
     def training_epoch_end(self, outputs: any):
         """
         Function recieves outputs from training_step().
@@ -229,6 +344,9 @@ class Lit_SSInfoVAE(pl.LightningModule):
                 y_true = torch.cat((y_true, out['y_true'].cpu().detach()), dim = 0)
             except RuntimeError:
                 pass
+
+        # DDP: predictions of all ranks
+        y_pred, y_true = gather_predictions(self, y_pred, y_true)
        
         
 
@@ -236,11 +354,11 @@ class Lit_SSInfoVAE(pl.LightningModule):
         MSE, pearson_R, spearman_rho = self.compute_task_metrics(y_pred, y_true)
         
         # compute loss value
-        L = np.mean(self.L_train)
-        L_nll = np.mean(self.L_nll_train)
-        L_kld = np.mean(self.L_kld_train)
-        L_mmd = np.mean(self.L_mmd_train)
-        L_pheno = np.mean(self.L_pheno_train)
+        L = sync_mean(self, self.L_train)
+        L_nll = sync_mean(self, self.L_nll_train)
+        L_kld = sync_mean(self, self.L_kld_train)
+        L_mmd = sync_mean(self, self.L_mmd_train)
+        L_pheno = sync_mean(self, self.L_pheno_train)
         
         # reset lists for next epoch
         self.L_train, self.L_nll_train, self.L_kld_train, self.L_mmd_train, self.L_pheno_train  = [], [], [], [], []
@@ -290,6 +408,9 @@ class Lit_SSInfoVAE(pl.LightningModule):
         else:
            z_true_samples = torch.randn((len(x_onehot), self.z_dim))
 
+        # DDP: gather the latents of all ranks for the MMD
+        z_pred, z_true_samples = gather_latents(self, z_pred, z_true_samples)
+
         # prepare predictions
         # note: drop any samples with ground truth r.e. scores
         # ----------------------------------------------------
@@ -322,6 +443,7 @@ class Lit_SSInfoVAE(pl.LightningModule):
         return {'val_loss': loss, 'val_y_pred': y_pred, 'val_y_true': y_pheno}
 
    
+    @telemetry.timed('valid/epoch_end_metrics')
     def validation_epoch_end(self, outputs: any):
         """
         Function recvieves outputs from validation_step().
@@ -347,16 +469,19 @@ class Lit_SSInfoVAE(pl.LightningModule):
                 y_true = torch.cat((y_true, out['val_y_true'].cpu().detach()), dim = 0)
             except RuntimeError:
                 pass
+
+        # DDP: predictions of all ranks
+        y_pred, y_true = gather_predictions(self, y_pred, y_true)
         
         # -compute metrics-
         MSE, pearson_R, spearman_rho = self.compute_task_metrics(y_pred, y_true)
        
         # compute loss value
-        L = np.mean(self.L_valid)
-        L_nll = np.mean(self.L_nll_valid)
-        L_kld = np.mean(self.L_kld_valid)
-        L_mmd = np.mean(self.L_mmd_valid)
-        L_pheno = np.mean(self.L_pheno_valid)
+        L = sync_mean(self, self.L_valid)
+        L_nll = sync_mean(self, self.L_nll_valid)
+        L_kld = sync_mean(self, self.L_kld_valid)
+        L_mmd = sync_mean(self, self.L_mmd_valid)
+        L_pheno = sync_mean(self, self.L_pheno_valid)
         
         # reset lists for next epoch
         self.L_valid, self.L_nll_valid, self.L_kld_valid, self.L_mmd_valid, self.L_pheno_valid  = [], [], [], [], []
@@ -409,6 +534,7 @@ class Lit_SSInfoVAE(pl.LightningModule):
         return {'test_loss': None, 'test_y_pred': y_pred, 'test_y_true': y_pheno}
 
     
+    @telemetry.timed('test/epoch_end_metrics')
     def test_epoch_end(self, outputs: any) -> None:
         
         
@@ -427,6 +553,9 @@ class Lit_SSInfoVAE(pl.LightningModule):
                 y_true = torch.cat((y_true, out['test_y_true'].cpu().detach()), dim = 0)
             except RuntimeError:
                 pass
+
+        # DDP: predictions of all ranks
+        y_pred, y_true = gather_predictions(self, y_pred, y_true)
         
         # -compute metrics-
         MSE, pearson_R, spearman_rho = self.compute_task_metrics(y_pred, y_true)
@@ -0,0 +1,125 @@
+"""
+@summary: importance-weighted marginal likelihood estimates for zero-shot fitness ranking. For every sequence, K
+posterior samples z_k ~ q(z|x) are drawn from the GatedCNN_encoder and the WaveNet decoder scores all K in one
+stacked batch:
+    log w_k = log p(x|z_k) + log p(z_k) - log q(z_k|x)
+    IWAE_K = logsumexp_k(log w_k) - log K (tightens towards log p(x) as K grows), ELBO_K = mean_k(log w_k).
+The samples are nested, so the estimates for every K' <= K come from the same decoder passes.
+Cost: one encoder pass per sequence plus K decoder passes; accuracy: the IWAE gap shrinks roughly as O(1/K).
+"""
+
+import math
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+import numpy as np
+import pandas as pd
+
+
+PAD_TOKEN = 20 # '-' in preprocess.create_num_seqs
+
+
+@torch.no_grad()
+def log_weights(
+        model: nn.Module,
+        x: torch.FloatTensor,
+        K: int,
+        max_rows: int=4096,
+        ignore_pads: bool=False
+    ) -> torch.FloatTensor:
+    """
+    function description: log importance weights [B, K] of one-hot sequences x [B, L, 21]. The K samples of a
+    sequence are decoded together; max_rows caps the no. of stacked (sequence, sample) rows per decoder pass.
+    note: q(z|x) is the Gaussian N(mu, var) of the encoder (Gaussian eps, not the uniform eps of reparam_trick).
+    """
+    model.eval()
+    B, L, _ = x.shape
+    tokens = x.argmax(dim = -1) # [B, L]
+
+    # q(z|x) and K samples per sequence
+    z_mu, z_var = model.inference(x.permute(0, 2, 1))
+    q_z = torch.distributions.Normal(z_mu.unsqueeze(1), z_var.sqrt().unsqueeze(1)) # batch shape [B, 1, z_dim]
+    z = q_z.sample((K,)).squeeze(2).permute(1, 0, 2) # [B, K, z_dim]
+
+    log_pz = torch.distributions.Normal(0., 1.).log_prob(z).sum(dim = -1) # [B, K]
+    log_qz = q_z.log_prob(z).sum(dim = -1) # [B, K]
+
+    # p(x|z) for the stacked (sequence, sample) rows
+    mask = (tokens != PAD_TOKEN).float() if ignore_pads else torch.ones_like(tokens, dtype = torch.float)
+    z_rows = z.reshape(B * K, -1)
+    rows = torch.arange(B * K, device = x.device) // K # sequence of every row
+    log_px = []
+    for row_idx in torch.split(torch.arange(B * K, device = x.device), max_rows):
+        seq_idx = rows[row_idx]
+        logits = model.generator(x[seq_idx].permute(0, 2, 1), model.cond_mapper(z_rows[row_idx])) # [rows, 21, L]
+        nll = F.cross_entropy(logits, tokens[seq_idx], reduction = 'none') # [rows, L]
+        log_px.append(-(nll * mask[seq_idx]).sum(dim = -1))
+    log_px = torch.cat(log_px).view(B, K)
+
+    return log_px + log_pz - log_qz
+
+
+def iwae_bound(log_w: torch.FloatTensor, K: int) -> torch.FloatTensor:
+    # IWAE estimate from the first K samples
+    return torch.logsumexp(log_w[:, :K], dim = 1) - math.log(K)
+
+
+def elbo_bound(log_w: torch.FloatTensor, K: int) -> torch.FloatTensor:
+    return log_w[:, :K].mean(dim = 1)
+
+
+@torch.no_grad()
+def score_dataloader(
+        model: nn.Module,
+        dataloader: any,
+        K: int,
+        DEVICE: str,
+        max_rows: int=4096,
+        ignore_pads: bool=False
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    """
+    function description: streams over a benchmark split; returns the log weights [N, K] and the fitness values [N].
+    """
+    log_w, y_true = [], []
+    for batch in dataloader:
+        _, x_onehot, y_pheno = batch
+        log_w.append(log_weights(model, x_onehot.to(DEVICE), K, max_rows, ignore_pads).cpu())
+        y_true.append(y_pheno.reshape(-1).cpu())
+    return (
+            torch.cat(log_w),
+            torch.cat(y_true)
+    )
+
+
+def ranking_report(
+        log_w: torch.FloatTensor,
+        y_true: torch.FloatTensor,
+        K_list: list
+    ) -> pd.DataFrame:
+    """
+    function description: Spearman rho of the IWAE and ELBO scores against fitness for every K in K_list.
+    """
+    from scipy.stats import spearmanr
+
+    labelled = ~torch.isnan(y_true)
+    y = y_true[labelled].numpy()
+
+    report = []
+    for K in K_list:
+        iwae, elbo = iwae_bound(log_w, K)[labelled], elbo_bound(log_w, K)[labelled]
+        report.append(
+                {
+                    'K': K,
+                    'num_seqs': int(labelled.sum()),
+                    'mean_iwae': iwae.mean().item(),
+                    'mean_elbo': elbo.mean().item(),
+                    'spearman_iwae': spearmanr(iwae.numpy(), y)[0],
+                    'spearman_elbo': spearmanr(elbo.numpy(), y)[0]
+                }
+        )
+    return pd.DataFrame(report)
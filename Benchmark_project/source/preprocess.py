@@ -5,88 +5,113 @@
 @summary: 
 """
 import torch
-from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
+from torch.utils.data import DataLoader, Dataset, Sampler
 
 
-from sklearn.model_selection import train_test_split
-from sklearn.utils.class_weight import compute_class_weight
-
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot
-from numba import jit 
+import hashlib
 import json
+import os
+
+from protwavevae.preprocess import ( # shared with the other projects
+        pad_ends,
+        create_num_seqs,
+        Block_sampler,
+        create_tensor_dataloader
+)
 
-'__________________ General functions: __________________________ '
+' __________________ Shared dataset store: __________________________ '
 
-## Create numerical represented sequences
-def create_num_seqs(
-        seq_list: list
-    ) -> list:
+class Memmap_store:
     """
-    function description: this convert amino acid tokens into numerical values, preprocessing sequences into their
-    corresponding numerical representations.
+    class description: on-disk .npy backing store for the dataset tensors. Every array is written once per
+    sweep and attached copy-on-write (np.load(mmap_mode='c')), so all HP trials, dataloader workers and
+    sweep processes pointing at the same directory read the same page-cache pages instead of private copies.
+    Arrays are never overwritten: their names carry a fingerprint() of the data they were built from.
+    """
+
+    def __init__(self, store_dir: str):
+
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.store_dir, f'{name}.npy')
+
+    @staticmethod
+    def fingerprint(
+            paths: list,
+            **params: any
+        ) -> str:
+        """
+        function description: short hash of the source files (path, size, modification time) and of the
+        preprocessing parameters, so that a changed dataset or split never attaches the arrays of an earlier one.
+        """
+        sources = []
+        for path in paths:
+            if path and os.path.exists(path):
+                stat = os.stat(path)
+                sources.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
 
+        key = json.dumps({'sources': sources, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha1(key.encode()).hexdigest()[:12]
 
-    args: 
-        seq_list --> list containing sequences with aa labels
+    def put(self, name: str, tensor: torch.Tensor) -> torch.Tensor:
+        """
+        function description: write the tensor (only if not stored yet) and return its memory-mapped view.
+        """
+        if not os.path.exists(self.path(name)):
+            tmp_path = self.path(name).replace('.npy', f'.{os.getpid()}.tmp.npy')
+            np.save(tmp_path, torch.as_tensor(tensor).cpu().numpy())
+            os.replace(tmp_path, self.path(name)) # atomic: concurrent sweeps never attach a partial file
 
-    returns:
-        num_seq_list --> list containing sequences with numerical represented aa labels
+        return self.get(name)
 
+    def get(self, name: str) -> torch.Tensor:
+        return torch.from_numpy(np.load(self.path(name), mmap_mode='c'))
+
+
+class Memmap_dataset(Dataset):
+    """
+    class description: base class of the benchmark datasets. Once attach_store() is called the
+    (num_inputs, onehot_inputs, pheno_outputs) tensors are memory-mapped views, and pickling the dataset
+    (spawned dataloader workers, trial processes) only sends the store location, which is re-attached on load.
     """
 
-    
-    # We will use this dictionary to map each character to an integer so that it can be used as an input to our ML models:
-    dict_int2aa = {
-                   0:"A",1:"C",2:"D",3:"E",4:"F",
-                   5:"G",6:"H",7:"I",8:"K",9:"L",
-                   10:"M",11:"N",12:"P",13:"Q",14:"R",
-                   15:"S",16:"T",17:"V",18:"W",19:"Y",20:"-"
-                  }
-    
-    # tokenizer
-    token2int = {x:ii for ii, x in enumerate('ACDEFGHIKLMNPQRSTVWY-')}
-    
-    # empty list to hold numerical represented seqs
-    num_seq_list = []
-    
-    # convert aa labels into numerical labels
-    for seq in seq_list:
-        num_seq_list.append([token2int[aa] for aa in seq])
-        
-    return num_seq_list
+    tensor_names = ('num_inputs', 'onehot_inputs', 'pheno_outputs')
 
+    def attach_store(
+            self,
+            store: Memmap_store,
+            prefix: str
+        ) -> Dataset:
 
+        self.store, self.store_prefix = store, prefix
 
-'_________________ GFP prep. ______________________________' 
+        for tensor_name in self.tensor_names:
+            setattr(self, tensor_name, store.put(f'{prefix}_{tensor_name}', getattr(self, tensor_name)))
 
+        return self
 
-@jit(nopython = True)
-def pad_ends(
-        seqs: list,
-        max_seq_length: int=237
-    ) -> list:
-	"""
-	function description: padded the sequence ends
-	
-	"""
+    def __getstate__(self,) -> dict:
+
+        state = self.__dict__.copy()
+        if state.get('store') is not None:
+            for tensor_name in self.tensor_names:
+                state.pop(tensor_name) # re-attached from the store
+        return state
+
+    def __setstate__(self, state: dict) -> None:
 
-	padded_seqs = [] # seqs with padded ends
-	for seq in seqs:
-		# current protein seq. length
-		seq_length = len(seq)
-		# number of pads needed
-		pad_need = max_seq_length - seq_length
-		# add number of padded tokens
-		seq+= '-'*pad_need
-		
-		padded_seqs.append(seq)
+        self.__dict__.update(state)
+        if state.get('store') is not None:
+            for tensor_name in self.tensor_names:
+                setattr(self, tensor_name, self.store.get(f'{self.store_prefix}_{tensor_name}'))
+
+
+'_________________ GFP prep. ______________________________' 
 
-	return padded_seqs
 
 def prepare_GFP_datasets(
         train_path: str='./data/GFP_fluorescence_train.csv',
@@ -177,7 +202,7 @@ def prepare_GFP_datasets(
 
 
 
-class GFP_dataset(Dataset):
+class GFP_dataset(Memmap_dataset):
     """
     GFP sequence dataloader
     
@@ -399,7 +424,7 @@ def prepare_GB1_datasets(
     )
 
 
-class GB1_dataset(Dataset):
+class GB1_dataset(Memmap_dataset):
     """
     FLIP stability task: learning pheno landscape while being epistatic
     """
@@ -633,7 +658,7 @@ def prepare_AAV_datasets(
     )
 
 
-class AAV_dataset(Dataset):
+class AAV_dataset(Memmap_dataset):
     """
     FLIP function prediction task:  predict fitness
     """
@@ -786,7 +811,7 @@ def prepare_stability_datasets(
 
 
 
-class stability_dataset(Dataset):
+class stability_dataset(Memmap_dataset):
     """
     TAPE stability task: learning pheno landscape while being epistatic
     """
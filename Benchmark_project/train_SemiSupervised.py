@@ -5,33 +5,25 @@ author: Niksa Praljak
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-# super Pytorch Lightning
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-
 import source.preprocess as prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_wrapper
+import source.precision as prec
+import protwavevae.telemetry as telemetry
 
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
 from tqdm import tqdm
 import random
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import train_test_split
-from scipy.stats import pearsonr, spearmanr
+
+# pytorch_lightning (and source.PL_wrapper) are imported in the functions that use them, so that scripts importing
+# this module for get_data/get_model do not pay for them at startup
 
 """
 Summary: train model session
@@ -61,6 +53,8 @@ def get_args() -> any:
     parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
     parser.add_argument('--DEVICE', default='cuda', help='Learning rate')
     parser.add_argument('--split_option', default=0, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--store_dir', default='', type=str, help='Directory of the shared memory-mapped dataset store (empty: in-memory)')
+    parser.add_argument('--tensor_loader', default=0, type=int, help='0: DataLoader workers | 1: in-memory tensor batches | 2: tensor batches preloaded on DEVICE')
    
     # general architecture variables
     parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
@@ -92,6 +86,24 @@ def get_args() -> any:
     parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
     parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
 
+    # checkpointing
+    parser.add_argument('--ckpt_every', default=0, type=int, help='save a resumable checkpoint every n epochs (0: off)')
+    parser.add_argument('--ckpt_path', default='', help='checkpoint path (default: output_model_path with its extension replaced by _last.ckpt)')
+    parser.add_argument('--resume', default=0, type=int, help='resume training from ckpt_path (1) or start from scratch (0)')
+
+    # distributed CPU training
+    parser.add_argument('--num_processes', default=1, type=int, help='no. CPU DDP processes (gloo); 1: single process')
+
+    # mixed precision
+    parser.add_argument('--bf16', default=0, type=prec.bf16_flag, help='bfloat16 autocast for conv/linear layers (1; needs torch >= 1.10) or float32 (0)')
+
+    # micro-batching
+    parser.add_argument('--micro_batches', default=1, type=int, help='split every batch into micro-batches with gradient accumulation (MMD still over the whole batch)')
+
+    # telemetry
+    parser.add_argument('--profile', default=0, type=int, help='Flag: per-phase timing summary next to the results CSV (also: PROTWAVEVAE_PROFILE=1)')
+    parser.add_argument('--profile_steps', default=0, type=int, help='no. training steps captured by torch.profiler (0: off; needs --profile)')
+
     args = parser.parse_args()
     
     return args
@@ -110,6 +122,7 @@ def set_GPU() -> None:
     return
 
 def set_SEED(args: any) -> None:
+    from pytorch_lightning import seed_everything
     seed_everything(args.SEED, workers = True)
     return 
 
@@ -120,6 +133,47 @@ class prepare_data:
 
         self.args = args
 
+        # optional memory-mapped backing store shared by all trials/workers of a sweep
+        self.store = prep.Memmap_store(args.store_dir) if args.store_dir else None
+
+
+    def create_dataloader(
+            self,
+            dataset: Dataset,
+            split: str,
+            shuffle: bool
+        ) -> DataLoader:
+
+        if self.store is not None:
+            fingerprint = self.store.fingerprint(
+                    paths=[getattr(self.args, key, '') for key in ('data_path', 'train_path', 'valid_path', 'test_path')],
+                    protein=self.args.protein,
+                    split_option=self.args.split_option
+            )
+            dataset.attach_store(
+                    store=self.store,
+                    prefix=f'{self.args.protein}_split{self.args.split_option}_{split}_{fingerprint}'
+            )
+
+        if self.args.tensor_loader:
+            # batches sliced straight from the stored tensors (1: on CPU, 2: preloaded onto DEVICE)
+            return prep.create_tensor_dataloader(
+                    dataset,
+                    batch_size=self.args.batch_size,
+                    shuffle=shuffle,
+                    DEVICE=self.args.DEVICE if self.args.tensor_loader == 2 else 'cpu',
+                    pin_memory=torch.cuda.is_available(),
+                    seed=self.args.SEED
+            )
+
+        return DataLoader(
+                dataset,
+                batch_size=self.args.batch_size,
+                num_workers=4,
+                shuffle=shuffle,
+                persistent_workers=self.store is not None # reuse the same workers across epochs and trials
+        )
+
 
     def get_AAV(self, ) -> (
             DataLoader,
@@ -144,7 +198,7 @@ class prepare_data:
                 pheno_outputs=train_pheno
         )
 
-        train_dataloader = DataLoader(train_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=True)
+        train_dataloader = self.create_dataloader(train_dataset, split='train', shuffle=True)
 
         ###########################
         ## Prepare Valid dataset ##
@@ -156,7 +210,7 @@ class prepare_data:
                 pheno_outputs=valid_pheno
         )
 
-        valid_dataloader = DataLoader(valid_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        valid_dataloader = self.create_dataloader(valid_dataset, split='valid', shuffle=False)
         
         ###########################
         ## Prepare Test dataset ##
@@ -169,7 +223,7 @@ class prepare_data:
                 pheno_outputs=test_pheno
         )
 
-        test_dataloader = DataLoader(test_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        test_dataloader = self.create_dataloader(test_dataset, split='test', shuffle=False)
                
         max_seq_len = train_num.shape[-1]
      
@@ -205,7 +259,7 @@ class prepare_data:
                 pheno_outputs=train_pheno
         )
 
-        train_dataloader = DataLoader(train_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=True)
+        train_dataloader = self.create_dataloader(train_dataset, split='train', shuffle=True)
 
         ###########################
         ## Prepare Valid dataset ##
@@ -217,7 +271,7 @@ class prepare_data:
                 pheno_outputs=valid_pheno
         )
 
-        valid_dataloader = DataLoader(valid_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        valid_dataloader = self.create_dataloader(valid_dataset, split='valid', shuffle=False)
         
         ###########################
         ## Prepare Test dataset ##
@@ -230,7 +284,7 @@ class prepare_data:
                 pheno_outputs=test_pheno
         )
 
-        test_dataloader = DataLoader(test_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        test_dataloader = self.create_dataloader(test_dataset, split='test', shuffle=False)
                
         max_seq_len = train_num.shape[-1]
      
@@ -270,7 +324,7 @@ class prepare_data:
                 pheno_outputs=train_pheno
         )
 
-        train_dataloader = DataLoader(train_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=True)
+        train_dataloader = self.create_dataloader(train_dataset, split='train', shuffle=True)
 
         ###########################
         ## Prepare Valid dataset ##
@@ -282,7 +336,7 @@ class prepare_data:
                 pheno_outputs=valid_pheno
         )
 
-        valid_dataloader = DataLoader(valid_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        valid_dataloader = self.create_dataloader(valid_dataset, split='valid', shuffle=False)
         
         ###########################
         ## Prepare Test dataset ##
@@ -295,7 +349,7 @@ class prepare_data:
                 pheno_outputs=test_pheno
         )
 
-        test_dataloader = DataLoader(test_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        test_dataloader = self.create_dataloader(test_dataset, split='test', shuffle=False)
                
         max_seq_len = train_num.shape[-1]
         
@@ -331,7 +385,7 @@ class prepare_data:
                 pheno_outputs=train_pheno
         )
 
-        train_dataloader = DataLoader(train_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=True)
+        train_dataloader = self.create_dataloader(train_dataset, split='train', shuffle=True)
 
         ###########################
         ## Prepare Valid dataset ##
@@ -343,7 +397,7 @@ class prepare_data:
                 pheno_outputs=valid_pheno
         )
 
-        valid_dataloader = DataLoader(valid_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        valid_dataloader = self.create_dataloader(valid_dataset, split='valid', shuffle=False)
         
         ###########################
         ## Prepare Test dataset ##
@@ -356,7 +410,7 @@ class prepare_data:
                 pheno_outputs=test_pheno
         )
 
-        test_dataloader = DataLoader(test_dataset, batch_size=self.args.batch_size, num_workers=4, shuffle=False)
+        test_dataloader = self.create_dataloader(test_dataset, split='test', shuffle=False)
                
         max_seq_len = train_num.shape[-1]
      
@@ -406,7 +460,7 @@ def get_model(
         protein_len: int
     ) -> any:
 
-        
+    import source.PL_wrapper as PL_wrapper
 
     # define inference model:
     encoder = model_comps.GatedCNN_encoder(
@@ -474,9 +528,26 @@ def get_model(
 
 
 
+def get_trainer_kwargs(args: any) -> dict:
+    """
+    function description: device/strategy arguments of pl.Trainer. With num_processes > 1 training runs as CPU
+    data-parallel DDP over the gloo backend, each rank using its share of the cores.
+    """
+    if args.num_processes > 1:
+        from pytorch_lightning.strategies import DDPStrategy
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.num_processes))
+        return {
+                'accelerator': 'cpu',
+                'devices': args.num_processes,
+                'strategy': DDPStrategy(process_group_backend='gloo', find_unused_parameters=True)
+        }
+
+    return {'gpus': 1 if torch.cuda.is_available() else None}
+
+
 def train_model(
         args: any,
-        PL_model: pl.LightningModule,
+        PL_model: any,
         train_dataloader: DataLoader,
         valid_dataloader: DataLoader
     ) -> (
@@ -484,14 +555,20 @@ def train_model(
             pd.Series
     ):
         
+        import pytorch_lightning as pl
+        import protwavevae.checkpointing as ckpt
+        import protwavevae.telemetry_callback as telemetry_cb
+
+        callbacks, resume_path = ckpt.get_checkpointing(args=args, model_path=args.output_model_path)
+        callbacks += telemetry_cb.get_callbacks(args=args, PL_model=PL_model)
         trainer = pl.Trainer(
          logger=False,
-         callbacks=None,
+         callbacks=callbacks,
          max_epochs=args.epochs,
-         gpus = 1 if torch.cuda.is_available() else None,
+         **get_trainer_kwargs(args=args)
          )      
         
-        trainer.fit(PL_model, train_dataloaders=train_dataloader, val_dataloaders=valid_dataloader)  
+        trainer.fit(PL_model, train_dataloaders=train_dataloader, val_dataloaders=valid_dataloader, ckpt_path=resume_path)
         
         # training metrics
         train_L = trainer.callback_metrics['L_train_epoch'].item()
@@ -587,7 +664,7 @@ def train_model(
 def test_model(
         args: any,
         trainer: any,
-        PL_model: pl.LightningModule,
+        PL_model: any,
         test_dataloader: DataLoader
         ) -> (
                 None
@@ -618,6 +695,7 @@ def test_model(
     return test_df
 
 
+@telemetry.timed('io/save_results')
 def save_results(
         args: any,
         PL_model: any,
@@ -673,8 +751,12 @@ if __name__ == '__main__':
     args = get_args()
     # make output folder directory
     os.makedirs(args.output_folder_path, exist_ok=True)
-    # set GPU
-    set_GPU()
+    # set GPU (CPU DDP ranks run on the CPU)
+    if args.num_processes > 1:
+        args.DEVICE = 'cpu'
+        args.tensor_loader = 0 # the DistributedSampler shards the regular DataLoader
+    else:
+        set_GPU()
     # set seed for reproducibility 
     set_SEED(args=args)
     # acquire data
@@ -684,6 +766,12 @@ if __name__ == '__main__':
                   args=args,
                   protein_len=protein_len
     )
+    # bfloat16 autocast (losses and BatchNorm statistics stay in float32)
+    if args.bf16:
+        PL_model.enable_bf16()
+    # gradient accumulation over micro-batches (the MMD is still estimated on the whole batch)
+    if args.micro_batches > 1:
+        PL_model.enable_micro_batching(args.micro_batches)
     print('Start training !')
     # train model
     trainer, PL_model, final_epoch_results, all_epochs_losses = train_model(
@@ -701,12 +789,15 @@ if __name__ == '__main__':
             test_dataloader=test_dataloader
     )
 
-    # save models and spreadsheet
-    save_results(
-        args=args,
-        PL_model=PL_model,
-        final_epoch_results=final_epoch_results,
-        all_epochs_losses=all_epochs_losses,
-        test_df=test_df
-    )
-    print("Save model ...") 
+    # save models and spreadsheet (only once: DDP rank 0)
+    if trainer.is_global_zero:
+        save_results(
+            args=args,
+            PL_model=PL_model,
+            final_epoch_results=final_epoch_results,
+            all_epochs_losses=all_epochs_losses,
+            test_df=test_df
+        )
+        print("Save model ...")
+        # per-phase timing summary next to the results CSV (--profile)
+        telemetry.write_summary(args.output_results_path) 
@@ -0,0 +1,85 @@
+import torch
+from torch import nn
+
+import source.attribution as attr
+import train_on_pfam as train_sess
+from infer_latents import load_weights
+
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+
+def attr_get_args(parser):
+
+    parser.add_argument('--weights_path', dest='weights_path', default='./outputs/prediction', type=str, help='Flag: Choose directory path for pretrained weights')
+    parser.add_argument('--folder_path', dest='folder_path', default='./outputs/attributions', type=str, help='Flag: Choose directory path for the attribution maps')
+    parser.add_argument('--attr_split', dest='attr_split', default='train', type=str, help='Flag: dataset split to explain (train | valid | test)')
+    parser.add_argument('--attr_method', dest='attr_method', default='integrated_gradients', type=str, help='Flag: saliency | input_x_gradient | integrated_gradients | gradient_shap')
+    parser.add_argument('--attr_batch_size', dest='attr_batch_size', default=16, type=int, help='Flag: no. sequences per pass (each one becomes z_dim x n_steps/n_samples rows)')
+    parser.add_argument('--n_steps', dest='n_steps', default=32, type=int, help='Flag: integrated gradients path steps')
+    parser.add_argument('--n_samples', dest='n_samples', default=16, type=int, help='Flag: GradientSHAP samples per sequence')
+    parser.add_argument('--stdev', dest='stdev', default=0.0, type=float, help='Flag: GradientSHAP input noise (NoiseTunnel)')
+    parser.add_argument('--save_per_sequence', dest='save_per_sequence', default=0, type=int, help='Flag: also stream the per-sequence attributions [N, z_dim, L, 21] to disk (1) or only the summed maps (0)')
+
+
+if __name__ == '__main__':
+
+    # get variable arguments
+    parser = argparse.ArgumentParser()
+    train_sess.get_args(parser)
+    attr_get_args(parser)
+    args = parser.parse_args()
+    args.masked_nll_bucketing = 0 # the attributions are computed on the full padded length (padded NLL)
+
+    os.makedirs(args.folder_path, exist_ok=True)
+
+    # reprod.
+    train_sess.set_SEED(args=args)
+
+    # set GPU (cuda)
+    args.DEVICE = train_sess.set_GPU(args=args)
+
+    # load data ( get sequence length)
+    train_dataloader, valid_dataloader, test_dataloader, protein_len = train_sess.load_data(args=args)
+    dataloaders = {'train': train_dataloader, 'valid': valid_dataloader, 'test': test_dataloader}
+    X = dataloaders[args.attr_split].dataset[0:][1] # one-hot sequences [N, L, 21]
+
+    # call model
+    PL_model = train_sess.call_model(
+            args=args,
+            protein_len=protein_len
+    )
+
+    # load weights
+    model = load_weights(
+            args=args,
+            model=PL_model.model
+    )
+
+    prefix = os.path.join(args.folder_path, f'{args.attr_split}_{args.attr_method}')
+    attr_sum, attr_abs_sum = attr.attribute_dataset(
+            encoder=model.inference,
+            X=X,
+            z_dim=args.z_dim,
+            DEVICE=args.DEVICE,
+            batch_size=args.attr_batch_size,
+            per_sequence_path=f'{prefix}_per_sequence.npy' if args.save_per_sequence else None,
+            method=args.attr_method,
+            n_steps=args.n_steps,
+            n_samples=args.n_samples,
+            stdev=args.stdev
+    )
+
+    # dataset-summed maps: [z_dim, L, 21] (signed and absolute)
+    np.save(f'{prefix}_map.npy', attr_sum)
+    np.save(f'{prefix}_abs_map.npy', attr_abs_sum)
+
+    # per-position importance of every z dimension
+    importance_df = pd.DataFrame(
+            attr_abs_sum.sum(axis=-1).T,
+            columns=[f'z_{z_axis}' for z_axis in range(args.z_dim)]
+    )
+    importance_df.index.name = 'position'
+    importance_df.to_csv(f'{prefix}_position_importance.csv')
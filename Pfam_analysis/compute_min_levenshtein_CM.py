@@ -2,10 +2,8 @@ import numpy as np
 import pandas as pd
 import sys
 import argparse
-from numba import jit
 from tqdm import tqdm
 
-import train_on_pfam as train_sess
 import utils.levenshtein_tools as leven_tools
 
 def get_args(parser):
@@ -75,7 +73,7 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     # reprod
-    train_sess.set_SEED(args=args)
+    leven_tools.set_SEED(args=args)
 
     # compute min levenshteins and save results ...
     compute_leven(args=args)
@@ -2,17 +2,10 @@ import numpy as np
 import pandas as pd
 import sys
 import argparse
-from numba import jit
 from tqdm import tqdm
 
-import source.pfam_preprocess as pfam_prep
-import train_on_CM as CM_train_sess
-import train_on_pfam as train_sess
 import utils.levenshtein_tools as leven_tools
 
-import torch
-import torch.nn as nn
-
 def get_args(parser):
 
 
@@ -141,14 +134,8 @@ def get_CM_data(args: any) -> (
 
     all_df = pd.concat((train_nat_df, test_synthetic_df))
    
-    # prepare natural homologs as training data
-    train_num_X, train_OH_X, train_y = pfam_prep.prepare_CM_dataset(
-            data_path=args.data_path,
-            alignment=args.alignment
-    )
-    
-    # max training sequence length
-    max_seq_len = train_OH_X.shape[1]
+    # max training sequence length (unaligned natural homologs, as in pfam_preprocess.prepare_CM_dataset)
+    max_seq_len = max([len(seq) for seq in train_nat_df.Unaligned_sequence])
 
 
     return (
@@ -180,7 +167,7 @@ if __name__ == '__main__':
     args.alignment=False
     
     # reprod
-    train_sess.set_SEED(args=args)
+    leven_tools.set_SEED(args=args)
 
     # compute min levenshteins and save results ...
     train_nat_df, _, max_seq_len = get_CM_data(args=args)
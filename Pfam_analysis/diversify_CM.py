@@ -2,14 +2,12 @@ import torch
 from torch import nn
 import torch.distributions as dist
 
-import pytorch_lightning as pl
-
 
 import source.preprocess as prep
 import source.pfam_preprocess as pfam_prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_mod
+import source.quantize as quant
 import train_on_pfam as train_sess
 import utils.tools as util_tools
 import train_on_CM as CM_train_sess
@@ -131,11 +129,13 @@ def randomly_diversify_CM_gene(
                                             args=args,
                                             X_context=X.to(args.DEVICE),
                                             L=L,
-                                            option='categorical'
+                                            option='categorical',
+                                            history=False
     ).cpu()
     
     # include deletion gaps
-    X_rand_diversify_samples[:, -1, -num_gaps:,:] = X[:,-num_gaps:, :]
+    if num_gaps > 0:
+        X_rand_diversify_samples[:, -1, -num_gaps:,:] = X[:,-num_gaps:, :]
     
     return X_rand_diversify_samples, 
 
@@ -375,11 +375,11 @@ if __name__ == '__main__':
     # reprod.
     train_sess.set_SEED(args = args)
 
-    # set GPU (cuda)
-    args.DEVICE = train_sess.set_GPU(args=args)
+    # set GPU (cuda); int8 kernels are CPU only
+    args.DEVICE = 'cpu' if args.quantize else train_sess.set_GPU(args=args)
 
     # load data (get sequence length)
-    _, _, _, protein_len = train_sess.load_data(args=args)
+    train_dataloader, _, _, protein_len = train_sess.load_data(args=args)
 
     # call model
     if args.learning_option == 'semi-supervised':
@@ -404,6 +404,14 @@ if __name__ == '__main__':
             args=args,
             model=PL_model.model
     )
+
+    if args.quantize:
+        model = quant.calibrate_and_quantize(
+                args=args,
+                model=model,
+                X_train=train_dataloader.dataset[0:][1],
+                num_calib=args.num_calib
+        )
     
     z = sample_z(
             args=args,
@@ -3,14 +3,14 @@ import torch
 from torch import nn
 import torch.distributions as dist
 from torch.utils.data import DataLoader, Dataset
-import pytorch_lightning as pl
 
 
 import source.preprocess as prep
 import source.pfam_preprocess as pfam_prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_mod
+import source.quantize as quant
+import source.fold_bn as fold_bn
 import train_on_pfam as train_sess
 import utils.tools as util_tools
 
@@ -26,6 +26,8 @@ def sample_get_args(parser):
     parser.add_argument('--samples_output_path', dest='samples_output_path', default='./outputs/prediction', type=str, help='Flag: Choose directory path for the design sequence data')
     parser.add_argument('--weights_path', dest='weights_path', default='./outputs/prediction', type=str, help='Flag: Choose directory path for pretrained weights')
     parser.add_argument('--folder_path', dest='folder_path', default='./outputs/prediction', type=str, help='Flag: Choose directory path for folder')
+    parser.add_argument('--quantize', dest='quantize', default=0, type=int, help='Flag: int8 quantized CPU inference (1) or float32 (0)')
+    parser.add_argument('--num_calib', dest='num_calib', default=512, type=int, help='Flag: no. training sequences used to report the int8 drift')
 
 
 def load_weights(
@@ -33,7 +35,7 @@ def load_weights(
         model: nn.Module
     ) -> nn.Module:
 
-    model.load_state_dict(torch.load(args.weights_path))
+    model.load_state_dict(torch.load(args.weights_path, map_location=args.DEVICE))
     model.eval()
 
     return model
@@ -62,7 +64,16 @@ def infer_latents(
     # eval mode
     model.eval()
 
-    _, z_train_sample, z_train_mode, _ = model(train_dataset[0:][1].to(args.DEVICE))
+    # only the encoder is needed: BatchNorm-folded copy, checked against the original on the first batch
+    X_train = train_dataset[0:][1].to(args.DEVICE)
+    # (int8 models: the quantized encoder, whose 1x1 convs are linear layers with nothing to fold)
+    if args.quantize:
+        encoder = model.inference
+    else:
+        encoder = fold_bn.fold_encoder(model.inference, x_check=X_train[:args.batch_size].permute(0, 2, 1))
+
+    z_train_mode, z_train_var = encoder(X_train.permute(0, 2, 1))
+    z_train_sample = model.reparam_trick(z_train_mode, z_train_var)
    
     return (
         z_train_sample,
@@ -108,8 +119,8 @@ if __name__ == '__main__':
     # reprod.
     train_sess.set_SEED(args=args)
 
-    # set GPU (cuda)
-    args.DEVICE = train_sess.set_GPU(args=args)
+    # set GPU (cuda); int8 kernels are CPU only
+    args.DEVICE = 'cpu' if args.quantize else train_sess.set_GPU(args=args)
 
     # load data ( get sequence length)
     train_dataloader, _, test_dataloader, protein_len = train_sess.load_data(args=args)
@@ -126,6 +137,14 @@ if __name__ == '__main__':
             model=PL_model.model
     )
 
+    if args.quantize:
+        model = quant.calibrate_and_quantize(
+                args=args,
+                model=model,
+                X_train=train_dataloader.dataset[0:][1],
+                num_calib=args.num_calib
+        )
+
     z_train_sample, z_train_mode = infer_latents(
 	args=args,
 	model=model,
@@ -0,0 +1,100 @@
+#!/usr/bin/env sh
+
+python -V
+export DIR="$(dirname "$(pwd)")"
+#source activate torch_GPU
+export PYTHONPATH=${PYTHONPATH}:${DIR}
+
+
+# ==================================
+# = Varibles from training session =
+# ==================================
+
+# path variables
+export data_path='../.././data/protein_families/S1A/pfam_S1A.csv'
+export alignment=False
+export output_results_path='../.././outputs/train_sess/pfam/S1A/training_results.csv'
+export model_output_path='../.././outputs/train_sess/pfam/S1A/S1A_model.pth'
+export dataset_split=0 # 1: train/valid | 0: train
+
+# model training variables
+export SEED=42
+export homolog_option=1 # 0: CM | 1: S1A | 2: lactamase | 3: Gprotein | 4: DHFR
+export epochs=500 #500
+export DEVICE='cuda'
+
+# model configuration
+# model hps
+export z_dim=4
+export class_labels=21
+
+# encoder
+export encoder_rates=0
+export C_in=21
+export C_out=256
+export alpha=0.1
+export enc_kernel=3
+export num_fc=3
+
+# generator
+export wave_hidden_state=128
+export head_hidden_state=512
+export num_dil_rates=5
+export dec_kernel_size=3
+
+# loss weights
+export xi_weight=10
+export alpha_weight=0.99
+export lambda_weight=1
+export lr=1e-4
+
+# ==================================
+# = For the encoder attributions   =
+# ==================================
+
+export folder_path='../.././outputs/attributions/pfam/S1A'
+export weights_path=${model_output_path}
+export attr_split='train'
+export attr_method='integrated_gradients' # saliency | input_x_gradient | integrated_gradients | gradient_shap
+export attr_batch_size=16
+export n_steps=32
+export n_samples=16
+export stdev=0.0
+export save_per_sequence=0
+
+
+python ../../compute_attributions.py \
+		--folder_path ${folder_path} \
+		--weights_path ${weights_path} \
+		--attr_split ${attr_split} \
+		--attr_method ${attr_method} \
+		--attr_batch_size ${attr_batch_size} \
+		--n_steps ${n_steps} \
+		--n_samples ${n_samples} \
+		--stdev ${stdev} \
+		--save_per_sequence ${save_per_sequence} \
+		--data_path ${data_path} \
+		--alignment ${alignment} \
+		--output_results_path ${output_results_path} \
+		--model_output_path ${model_output_path} \
+		--dataset_split ${dataset_split} \
+		--SEED ${SEED} \
+		--homolog_option ${homolog_option} \
+                --epochs ${epochs} \
+		--DEVICE ${DEVICE} \
+		--z_dim ${z_dim} \
+		--class_label ${class_labels} \
+		--encoder_rates ${encoder_rates} \
+		--C_in ${C_in} \
+		--C_out ${C_out} \
+		--alpha ${alpha} \
+		--enc_kernel ${enc_kernel} \
+		--num_fc ${num_fc} \
+		--wave_hidden_state ${wave_hidden_state} \
+		--head_hidden_state ${head_hidden_state} \
+		--num_dil_rates ${num_dil_rates} \
+		--dec_kernel_size ${dec_kernel_size} \
+		--xi_weight ${xi_weight} \
+		--alpha_weight ${alpha_weight} \
+		--lambda_weight ${lambda_weight} \
+		--lr ${lr} \
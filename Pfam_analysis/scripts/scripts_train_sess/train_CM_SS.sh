@@ -55,6 +55,12 @@ export num_classes=1
 export p=0.3
 export gamma_weight=1
 
+# distributed CPU training (num_processes > 1: DDP over gloo)
+export num_processes=1
+
+# mixed precision (1: bfloat16 autocast, 0: float32)
+export bf16=0
+
 
 
 python ../../train_on_CM.py \
@@ -91,6 +97,8 @@ python ../../train_on_CM.py \
 		--num_classes ${num_classes} \
 		--p ${p} \
 		--gamma_weight ${gamma_weight} \
+		--num_processes ${num_processes} \
+		--bf16 ${bf16} \
 
 
 
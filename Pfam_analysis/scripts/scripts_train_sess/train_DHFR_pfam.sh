@@ -12,6 +12,7 @@ export alignment=False
 export output_results_path='../.././outputs/train_sess/pfam/DHFR/training_results.csv'
 export model_output_path='../.././outputs/train_sess/pfam/DHFR/DHFR_model.pth'
 export dataset_split=0 # 1: train/valid | 0: train
+export masked_nll_bucketing=0 # 1: train on the pad-masked NLL with length-bucketed batches (unaligned only)
 
 # model training variables
 export SEED=42
@@ -31,6 +32,7 @@ export C_out=32
 export alpha=0.1
 export enc_kernel=3
 export num_fc=3
+export encoder_pooling='none' # none: fixed length | attention, gated: length-agnostic
 
 # generator
 export wave_hidden_state=128
@@ -44,12 +46,23 @@ export alpha_weight=0.99
 export lambda_weight=10
 export lr=1e-4
 
+# checkpointing (ckpt_every=0: off, resume=1: restart from the last checkpoint)
+export ckpt_every=0
+export resume=0
+
+# distributed CPU training (num_processes > 1: DDP over gloo)
+export num_processes=1
+
+# mixed precision (1: bfloat16 autocast, 0: float32)
+export bf16=0
+
 python ../../train_on_pfam.py \
 		--data_path ${data_path} \
 		--alignment ${alignment} \
 		--output_results_path ${output_results_path} \
 		--model_output_path ${model_output_path} \
 		--dataset_split ${dataset_split} \
+		--masked_nll_bucketing ${masked_nll_bucketing} \
 		--SEED ${SEED} \
 		--homolog_option ${homolog_option} \
                 --epochs ${epochs} \
@@ -62,6 +75,7 @@ python ../../train_on_pfam.py \
 		--alpha ${alpha} \
 		--enc_kernel ${enc_kernel} \
 		--num_fc ${num_fc} \
+		--encoder_pooling ${encoder_pooling} \
 		--wave_hidden_state ${wave_hidden_state} \
 		--head_hidden_state ${head_hidden_state} \
 		--num_dil_rates ${num_dil_rates} \
@@ -70,6 +84,10 @@ python ../../train_on_pfam.py \
 		--alpha_weight ${alpha_weight} \
 		--lambda_weight ${lambda_weight} \
 		--lr ${lr} \
+		--ckpt_every ${ckpt_every} \
+		--resume ${resume} \
+		--num_processes ${num_processes} \
+		--bf16 ${bf16} \
 
 
 
@@ -0,0 +1,4 @@
+"""
+@summary: project adapters around the shared protwavevae core (repository root), which is installed with
+pip install -e <repository root>.
+"""
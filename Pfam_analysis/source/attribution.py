@@ -0,0 +1,128 @@
+"""
+@summary: gradient attributions of the encoder's latent mean for every z dimension at once. Instead of one
+captum call per target, every input is repeated z_dim times along the batch and a single backward pass of
+sum_d mu_d(x_d) returns all the Jacobian rows d(mu_d)/dx (a batched vector-Jacobian product; the eval-mode encoder
+treats every row independently). Integrated gradients and GradientSHAP stack their path/baseline points into the
+same pass. Attributions are per sequence x z dimension x position x amino acid.
+"""
+
+import torch
+from torch import nn
+
+import numpy as np
+from tqdm import tqdm
+
+
+def latent_jacobian(
+        encoder: nn.Module,
+        x: torch.FloatTensor,
+        z_dim: int
+    ) -> torch.FloatTensor:
+    """
+    function description: d(mu_d)/dx for all d; x [B, C, L] -> [B, z_dim, C, L].
+    """
+    B = x.shape[0]
+    x_rep = x.detach().repeat_interleave(z_dim, dim = 0).requires_grad_(True) # [B * z_dim, C, L]
+
+    with torch.enable_grad():
+        mu, _ = encoder(x_rep)
+        # row b * z_dim + d only keeps output d
+        selector = torch.eye(z_dim, device = x.device).repeat(B, 1)
+        grads, = torch.autograd.grad((mu * selector).sum(), x_rep)
+
+    return grads.view(B, z_dim, *x.shape[1:])
+
+
+def path_points(
+        x: torch.FloatTensor,
+        baseline: torch.FloatTensor,
+        alphas: torch.FloatTensor
+    ) -> torch.FloatTensor:
+    # baseline + alpha * (x - baseline) for every alpha: [B, C, L] -> [B * S, C, L]
+    alphas = alphas.view(1, -1, 1, 1)
+    points = baseline.unsqueeze(1) + alphas * (x - baseline).unsqueeze(1)
+    return points.reshape(-1, *x.shape[1:])
+
+
+def attribute(
+        encoder: nn.Module,
+        x: torch.FloatTensor,
+        z_dim: int,
+        method: str='integrated_gradients',
+        n_steps: int=32,
+        n_samples: int=16,
+        stdev: float=0.
+    ) -> torch.FloatTensor:
+    """
+    function description: attributions [B, z_dim, C, L] of one batch (zero baseline, as in the XAI notebooks).
+    methods: saliency | input_x_gradient | integrated_gradients (n_steps, Riemann midpoints) |
+             gradient_shap (n_samples random points on the path with gaussian noise of stdev, i.e. NoiseTunnel).
+    """
+    encoder.eval()
+    B = x.shape[0]
+    baseline = torch.zeros_like(x)
+
+    if method == 'saliency':
+        return latent_jacobian(encoder, x, z_dim).abs()
+
+    if method == 'input_x_gradient':
+        return latent_jacobian(encoder, x, z_dim) * x.unsqueeze(1)
+
+    if method == 'integrated_gradients':
+        alphas = (torch.arange(n_steps, device = x.device) + 0.5) / n_steps
+        grads = latent_jacobian(encoder, path_points(x, baseline, alphas), z_dim)
+        grads = grads.view(B, n_steps, z_dim, *x.shape[1:]).mean(dim = 1)
+        return grads * (x - baseline).unsqueeze(1)
+
+    if method == 'gradient_shap':
+        alphas = torch.rand(B, n_samples, 1, 1, device = x.device) # one random path point per sample
+        points = baseline.unsqueeze(1) + alphas * (x - baseline).unsqueeze(1) # [B, S, C, L]
+        points = points + stdev * torch.randn_like(points)
+        grads = latent_jacobian(encoder, points.reshape(-1, *x.shape[1:]), z_dim)
+        grads = grads.view(B, n_samples, z_dim, *x.shape[1:]).mean(dim = 1)
+        return grads * (x - baseline).unsqueeze(1)
+
+    raise ValueError(f'Unknown attribution method: {method}')
+
+
+def attribute_dataset(
+        encoder: nn.Module,
+        X: torch.FloatTensor,
+        z_dim: int,
+        DEVICE: str,
+        batch_size: int=32,
+        per_sequence_path: str=None,
+        **kwargs
+    ) -> (
+            np.ndarray,
+            np.ndarray
+    ):
+    """
+    function description: streams over one-hot sequences X [N, L, 21] in batches. Returns the dataset-summed
+    attribution maps (signed and absolute, each [z_dim, L, 21]); with per_sequence_path the per-sequence
+    attributions [N, z_dim, L, 21] are written batch by batch into a .npy memmap instead of being kept in memory.
+    """
+    N, L, C = X.shape
+    attr_sum = np.zeros((z_dim, L, C), dtype = np.float64)
+    attr_abs_sum = np.zeros((z_dim, L, C), dtype = np.float64)
+
+    per_sequence = None
+    if per_sequence_path is not None:
+        per_sequence = np.lib.format.open_memmap(per_sequence_path, mode = 'w+', dtype = np.float32, shape = (N, z_dim, L, C))
+
+    for start in tqdm(range(0, N, batch_size)):
+        x = X[start:start+batch_size].float().to(DEVICE).permute(0, 2, 1) # [B, C, L]
+        attr = attribute(encoder, x, z_dim, **kwargs).permute(0, 1, 3, 2).cpu().numpy() # [B, z_dim, L, C]
+
+        attr_sum += attr.sum(axis = 0)
+        attr_abs_sum += np.abs(attr).sum(axis = 0)
+        if per_sequence is not None:
+            per_sequence[start:start+attr.shape[0]] = attr
+
+    if per_sequence is not None:
+        per_sequence.flush()
+
+    return (
+            attr_sum,
+            attr_abs_sum
+    )
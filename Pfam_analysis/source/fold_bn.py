@@ -0,0 +1,10 @@
+"""
+@summary: adapter around the shared BatchNorm folding of the gated-CNN encoder (protwavevae.fold_bn).
+"""
+
+from protwavevae.fold_bn import (
+        Folded_GatedCNN_encoder,
+        encoder_drift,
+        is_foldable,
+        fold_encoder
+)
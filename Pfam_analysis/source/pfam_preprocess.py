@@ -8,22 +8,18 @@ Preprocess function for the tasks that correspond to protein family designs.
 """
 
 
-import torch
-from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
+import copy
 
-from sklearn.model_selection import train_test_split
-from sklearn.utils.class_weight import compute_class_weight
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+from torch.utils.data.dataloader import default_collate
 
 
 import numpy as np
 import pandas as pd
-import numba
-from numba import jit
 
 from source.preprocess import pad_ends, create_num_seqs
+from protwavevae.preprocess import Block_sampler, create_tensor_dataloader # shared with the Benchmark project
 
 
 def prepare_CM_dataset(
@@ -527,3 +523,99 @@ class DHFR_dataset(Dataset):
 
 
 
+
+'__________________ Length bucketing (unaligned families): _________________'
+
+def compute_seq_lens(
+              num_inputs,
+              pad_token = 20
+    ):
+    """
+    function description: sequence length measured up to the last non-pad token (pads are only at the ends)
+    """
+    if not torch.is_tensor(num_inputs):
+        num_inputs = torch.tensor(num_inputs)
+
+    positions = torch.arange(1, num_inputs.shape[-1]+1)
+    return ((num_inputs != pad_token).long() * positions).max(dim = -1)[0]
+
+
+class LengthBucket_sampler(Sampler):
+    """
+    Batch sampler that groups sequences of similar length together. Each epoch the data is shuffled,
+    cut into buckets of batch_size*bucket_factor sequences, sorted by length inside each bucket and
+    chunked into batches whose order is shuffled again.
+    """
+
+    def __init__(
+              self,
+              seq_lens,
+              batch_size,
+              shuffle = True,
+              bucket_factor = 50,
+              seed = 42
+    ):
+
+        self.seq_lens = seq_lens if torch.is_tensor(seq_lens) else torch.tensor(seq_lens)
+        self.batch_size = int(batch_size)
+        self.shuffle = shuffle
+        self.bucket_factor = bucket_factor
+        self.seed = seed
+        self.epoch = 0
+
+        # without shuffling the whole dataset is sorted once (least padding)
+        self.bucket_size = self.batch_size * bucket_factor if shuffle else len(self.seq_lens)
+
+    def __iter__(self):
+
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+
+        n = len(self.seq_lens)
+        order = torch.randperm(n, generator = generator) if self.shuffle else torch.arange(n)
+
+        batches = []
+        for start in range(0, n, self.bucket_size):
+            bucket = order[start:start+self.bucket_size]
+            bucket = bucket[torch.argsort(self.seq_lens[bucket])]
+            batches.extend(torch.split(bucket, self.batch_size))
+
+        if self.shuffle:
+            batches = [batches[ii] for ii in torch.randperm(len(batches), generator = generator)]
+
+        for batch in batches:
+            yield batch.tolist()
+
+    def __len__(self):
+        """
+        function description: number of batches per epoch
+        """
+        n = len(self.seq_lens)
+        full_buckets, last_bucket = divmod(n, self.bucket_size)
+        return full_buckets * -(-self.bucket_size // self.batch_size) + -(-last_bucket // self.batch_size)
+
+    def with_batch_size(self, batch_size):
+        """
+        function description: same lengths, shuffling, seed and epoch with another batch size (see
+        protwavevae.batch_probe.rebatch)
+        """
+        sampler = copy.copy(self)
+        sampler.batch_size = int(batch_size)
+        sampler.bucket_size = sampler.batch_size * self.bucket_factor if self.shuffle else len(self.seq_lens)
+        return sampler
+
+
+def trim_pad_collate(
+              batch,
+              pad_token = 20
+    ):
+    """
+    function description: collate (x_num, x_onehot) samples and pad the batch only up to its own longest
+    sequence plus its end-of-sequence pad, trimming the rest of the shared pad tail. Only for training with
+    InfoVAE.masked_pad_nll, which does not score the trimmed pad->pad positions (same loss as the padded batch).
+    """
+    x_num, x_onehot = default_collate(batch)
+    batch_len = min(int(compute_seq_lens(x_num, pad_token).max()) + 1, x_num.shape[-1])
+
+    return x_num[:, :batch_len], x_onehot[:, :batch_len]
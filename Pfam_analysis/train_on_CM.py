@@ -5,44 +5,31 @@ author: Niksa Praljak
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-from pytorch_lightning.loggers import CSVLogger
-
 import source.preprocess as prep
 import source.pfam_preprocess as pfam_prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_mod
 import train_on_pfam as train_sess
+import protwavevae.telemetry as telemetry
 import utils.tools as util_tools
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
 from tqdm import tqdm
 
-from sklearn.metrics import mean_squared_error
-from scipy.stats import pearsonr, spearmanr
-from sklearn.model_selection import train_test_split
-
 
 def call_SS_model(
         args: any,
         protein_len: int,
-    ) -> pl.LightningModule:
-     
-    
-    
+    ) -> any:
+
+    import source.PL_wrapper as PL_mod
+
     # inference model
     encoder = model_comps.GatedCNN_encoder(
                                 protein_len=protein_len,
@@ -134,16 +121,20 @@ def get_SS_args(parser):
   
 def train_SS_model(
         args: any,
-        PL_model: pl.LightningModule,
+        PL_model: any,
         train_dataloader: DataLoader,
         test_dataloader: any
     ) -> (
             any, 
             pd.Series
     ):
+        import pytorch_lightning as pl
+        import protwavevae.telemetry_callback as telemetry_cb
+
         trainer = pl.Trainer(
+                callbacks=telemetry_cb.get_callbacks(args=args, PL_model=PL_model),
                 max_epochs=args.epochs,
-                gpus = 1 if torch.cuda.is_available() else None,
+                **train_sess.get_trainer_kwargs(args=args)
         )
         
         if args.dataset_split == 1:
@@ -277,6 +268,7 @@ def train_SS_model(
                 all_epochs_losses
         )
 
+@telemetry.timed('io/save_results')
 def save_results(
         args: any,
         PL_model: any,
@@ -422,8 +414,8 @@ if __name__ == '__main__':
     # reproducibility
     train_sess.set_SEED(args=args)
     
-    # set GPU (cuda)
-    args.DEVICE = train_sess.set_GPU(args=args)
+    # set GPU (cuda); CPU DDP ranks run on the CPU
+    args.DEVICE = train_sess.set_GPU(args=args) if args.num_processes == 1 else 'cpu'
 
     # load Data
     train_dataloader, test_dataloader, protein_len = load_CM_data(args=args)
@@ -443,6 +435,12 @@ if __name__ == '__main__':
                 protein_len=protein_len
         )
 
+    # bfloat16 autocast (losses and BatchNorm statistics stay in float32)
+    if args.bf16:
+        PL_model.enable_bf16()
+    # gradient accumulation over micro-batches (the MMD is still estimated on the whole batch)
+    if args.micro_batches > 1:
+        PL_model.enable_micro_batching(args.micro_batches)
      
     print('Train model with alignment: ', args.alignment)
     # train model
@@ -453,13 +451,16 @@ if __name__ == '__main__':
                                                 test_dataloader=test_dataloader
     )
 
-    # save results
-    save_results(
-            args=args,
-            PL_model=PL_model,
-            final_epoch_results=final_epoch_results,
-            all_epoch_losses=all_epoch_results
-    )
+    # save results (only once: DDP rank 0)
+    if PL_model.global_rank == 0:
+        save_results(
+                args=args,
+                PL_model=PL_model,
+                final_epoch_results=final_epoch_results,
+                all_epoch_losses=all_epoch_results
+        )
+        # per-phase timing summary next to the results CSV (--profile)
+        telemetry.write_summary(args.output_results_path)
 
 
 
@@ -5,54 +5,61 @@ author: Niksa Praljak
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-from pytorch_lightning.loggers import CSVLogger
-
 import source.preprocess as prep
 import source.pfam_preprocess as pfam_prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_mod
+import source.precision as prec
+import protwavevae.telemetry as telemetry
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
+import os
 from tqdm import tqdm
 
-from sklearn.metrics import mean_squared_error
-from scipy.stats import pearsonr, spearmanr
-from sklearn.model_selection import train_test_split
+# pytorch_lightning (and source.PL_wrapper) and sklearn are imported in the functions that use them, so that scripts
+# importing this module for load_data/call_model do not pay for them at startup
 
 
 def call_model(
         args: any,
         protein_len: int,
-    ) -> pl.LightningModule:
-     
-    
-    
+    ) -> any:
+
+    import source.PL_wrapper as PL_mod
+
     # inference model
-    encoder = model_comps.GatedCNN_encoder(
-                                protein_len=protein_len,
-                                class_labels=args.class_labels,
-                                z_dim=args.z_dim,
-                                num_rates=args.encoder_rates,
-                                C_in=args.C_in,
-                                C_out=args.C_out,
-                                alpha=args.alpha,
-                                kernel=args.enc_kernel,
-                                num_fc=args.num_fc
-    )
+    if args.encoder_pooling == 'none':
+        encoder = model_comps.GatedCNN_encoder(
+                                    protein_len=protein_len,
+                                    class_labels=args.class_labels,
+                                    z_dim=args.z_dim,
+                                    num_rates=args.encoder_rates,
+                                    C_in=args.C_in,
+                                    C_out=args.C_out,
+                                    alpha=args.alpha,
+                                    kernel=args.enc_kernel,
+                                    num_fc=args.num_fc
+        )
+    
+    else:
+        # length-agnostic encoder (pooling: 'attention' or 'gated')
+        encoder = model_comps.GatedCNN_varlen_encoder(
+                                    class_labels=args.class_labels,
+                                    z_dim=args.z_dim,
+                                    num_rates=args.encoder_rates,
+                                    C_in=args.C_in,
+                                    C_out=args.C_out,
+                                    alpha=args.alpha,
+                                    kernel=args.enc_kernel,
+                                    num_fc=args.num_fc,
+                                    pooling=args.encoder_pooling
+        )
     
     # generator: p(x_t|x_1, ..., x_t=1, z)
     # wave_hidden_state: WaveNet width
@@ -69,10 +76,19 @@ def call_model(
                                 kernel_size=args.dec_kernel_size
     )
     
-    cond_mapper = wavenet.CondNet(
-            z_dim=args.z_dim,
-            output_shape=(1, protein_len)
-    )
+    if args.encoder_pooling == 'none':
+        cond_mapper = wavenet.CondNet(
+                z_dim=args.z_dim,
+                output_shape=(1, protein_len)
+        )
+
+    else:
+        # length-agnostic conditioning (any sequence length)
+        cond_mapper = wavenet.CondNet_varlen(
+                z_dim=args.z_dim,
+                num_basis=args.cond_basis,
+                protein_len=protein_len
+        )
    
     # define final model configuration ...
     # torch model
@@ -83,6 +99,8 @@ def call_model(
             cond_mapper=cond_mapper,
             z_dim=args.z_dim
     )
+    # length-bucketed training optimizes the pad-masked NLL (validation keeps the padded NLL)
+    model.masked_pad_nll = bool(args.masked_nll_bucketing)
 
     # pytorch lightning model
     Lit_InfoVAE = PL_mod.Lit_InfoVAE(
@@ -100,6 +118,49 @@ def call_model(
 
 
 
+def create_dataloader(
+        args: any,
+        dataset: Dataset,
+        shuffle: bool
+    ) -> DataLoader:
+    
+    if args.masked_nll_bucketing and shuffle:
+        # training batches of similar length, padded only up to their own longest sequence (+ its end pad);
+        # validation/test loaders stay padded, so their (padded) NLL is comparable across runs
+        batch_sampler = pfam_prep.LengthBucket_sampler(
+                                seq_lens=pfam_prep.compute_seq_lens(dataset.num_inputs),
+                                batch_size=args.batch_size,
+                                shuffle=shuffle,
+                                bucket_factor=args.bucket_factor,
+                                seed=args.SEED
+        )
+
+        return DataLoader(
+                    dataset = dataset,
+                    batch_sampler = batch_sampler,
+                    collate_fn = pfam_prep.trim_pad_collate,
+                    num_workers = 4
+        )
+
+    if args.tensor_loader:
+        # batches sliced straight from the stored tensors (1: on CPU, 2: preloaded onto DEVICE)
+        return pfam_prep.create_tensor_dataloader(
+                    dataset = dataset,
+                    batch_size = args.batch_size,
+                    shuffle = shuffle,
+                    DEVICE = args.DEVICE if args.tensor_loader == 2 else 'cpu',
+                    pin_memory = torch.cuda.is_available(),
+                    seed = args.SEED
+        )
+
+    return DataLoader(
+                dataset = dataset,
+                batch_size = args.batch_size,
+                num_workers = 4,
+                shuffle = shuffle
+    )
+
+
 def load_data(
         args: any
     ) -> (
@@ -118,6 +179,7 @@ def load_data(
                     torch.FloatTensor,
                     torch.FloatTensor
             ):
+                from sklearn.model_selection import train_test_split
 
                 train_X, valid_X = train_test_split(
                         X,
@@ -243,10 +305,9 @@ def load_data(
                                             onehot_inputs = valid_OH_X,
                 )
 
-                valid_dataloader = DataLoader(
+                valid_dataloader = create_dataloader(
+                                        args = args,
                                         dataset = valid_dataset,
-                                        batch_size = args.batch_size,
-                                        num_workers = 4,
                                         shuffle = False
                 )
 
@@ -260,10 +321,9 @@ def load_data(
                                         onehot_inputs = train_OH_X,
             )
 
-            train_dataloader = DataLoader(
+            train_dataloader = create_dataloader(
+                                    args = args,
                                     dataset = train_dataset,
-                                    batch_size = args.batch_size,
-                                    num_workers = 4,
                                     shuffle = True
             )
 
@@ -298,10 +358,9 @@ def load_data(
                                             onehot_inputs = valid_OH_X,
                 )
 
-                valid_dataloader = DataLoader(
+                valid_dataloader = create_dataloader(
+                                        args = args,
                                         dataset = valid_dataset,
-                                        batch_size = args.batch_size,
-                                        num_workers = 4,
                                         shuffle = False
                 )
 
@@ -315,11 +374,10 @@ def load_data(
                                     onehot_inputs = train_OH_X,
             )
 
-            train_dataloader = DataLoader(
-                                dataset = train_dataset,
-                                batch_size = args.batch_size,
-                                num_workers = 4,
-                                shuffle = True
+            train_dataloader = create_dataloader(
+                                    args = args,
+                                    dataset = train_dataset,
+                                    shuffle = True
             )
 
 
@@ -353,10 +411,9 @@ def load_data(
                                             onehot_inputs = valid_OH_X,
                 )
 
-                valid_dataloader = DataLoader(
+                valid_dataloader = create_dataloader(
+                                        args = args,
                                         dataset = valid_dataset,
-                                        batch_size = args.batch_size,
-                                        num_workers = 4,
                                         shuffle = False
                 )
 
@@ -369,11 +426,10 @@ def load_data(
                                     onehot_inputs = train_OH_X,
             )
 
-            train_dataloader = DataLoader(
-                                dataset = train_dataset,
-                                batch_size = args.batch_size,
-                                num_workers = 4,
-                                shuffle = False
+            train_dataloader = create_dataloader(
+                                    args = args,
+                                    dataset = train_dataset,
+                                    shuffle = False
             )
 
             test_dataloader = None
@@ -407,10 +463,9 @@ def load_data(
                                             onehot_inputs = valid_OH_X,
                 )
 
-                valid_dataloader = DataLoader(
+                valid_dataloader = create_dataloader(
+                                        args = args,
                                         dataset = valid_dataset,
-                                        batch_size = args.batch_size,
-                                        num_workers = 4,
                                         shuffle = False
                 )
 
@@ -424,10 +479,9 @@ def load_data(
                                         onehot_inputs = train_OH_X,
             )
 
-            train_dataloader = DataLoader(
+            train_dataloader = create_dataloader(
+                                    args = args,
                                     dataset = train_dataset,
-                                    batch_size = args.batch_size,
-                                    num_workers = 4,
                                     shuffle = True
             )
 
@@ -464,6 +518,9 @@ def get_args(parser):
     parser.add_argument('--batch_size', dest='batch_size', default=512)
     parser.add_argument('--dataset_split', dest='dataset_split', default=1, type=int)   
     parser.add_argument('--test_size', dest='test_size', default=0.2, type=float)   
+    parser.add_argument('--masked_nll_bucketing', dest='masked_nll_bucketing', default=0, type=int, help='Flag: train on the pad-masked NLL (residues + end pad; pad->pad terms not scored) with unaligned training batches bucketed by length and trimmed to their longest sequence (InfoVAE only; validation keeps the padded NLL).')
+    parser.add_argument('--bucket_factor', dest='bucket_factor', default=50, type=int, help='Flag: no. of batches per length-sorting bucket.')
+    parser.add_argument('--tensor_loader', dest='tensor_loader', default=0, type=int, help='Flag: 0: DataLoader workers | 1: in-memory tensor batches | 2: tensor batches preloaded on DEVICE')
     
 
     # model hyperparameters
@@ -476,7 +533,9 @@ def get_args(parser):
     parser.add_argument('--C_out', dest='C_out', default=32, type=int)
     parser.add_argument('--alpha', dest='alpha', default=0.1, type=float)
     parser.add_argument('--num_fc', dest='num_fc', default=2, type=int)
-    parser.add_argument('--enc_kernel', dest='enc_kernel', default=3, type=int)
+    parser.add_argument('--enc_kernel', dest='enc_kernel', default=3, type=int, help='Flag: encoder kernel size (odd for the length-agnostic encoder).')
+    parser.add_argument('--encoder_pooling', dest='encoder_pooling', default='none', type=str, help='Flag: none (fixed-length encoder) | attention | gated (length-agnostic encoder and conditioning)')
+    parser.add_argument('--cond_basis', dest='cond_basis', default=64, type=int, help='Flag: no. of positional basis functions of the length-agnostic conditioning')
 
     # generator
     parser.add_argument('--wave_hidden_state', dest='wave_hidden_state', default=128, type=int)
@@ -491,25 +550,67 @@ def get_args(parser):
     parser.add_argument('--lambda_weight', dest='lambda_weight', default=10, type=float)
     parser.add_argument('--lr', dest='lr', default=1e-4, type=float)
 
+    # checkpointing
+    parser.add_argument('--ckpt_every', dest='ckpt_every', default=0, type=int, help='Flag: save a resumable checkpoint every n epochs (0: off)')
+    parser.add_argument('--ckpt_path', dest='ckpt_path', default='', type=str, help='Flag: checkpoint path (default: model_output_path with its extension replaced by _last.ckpt)')
+    parser.add_argument('--resume', dest='resume', default=0, type=int, help='Flag: resume training from ckpt_path (1) or start from scratch (0)')
+
+    # distributed CPU training
+    parser.add_argument('--num_processes', dest='num_processes', default=1, type=int, help='Flag: no. CPU DDP processes (gloo); 1: single process')
+
+    # mixed precision
+    parser.add_argument('--bf16', dest='bf16', default=0, type=prec.bf16_flag, help='Flag: bfloat16 autocast for conv/linear layers (1; needs torch >= 1.10) or float32 (0)')
+
+    # micro-batching
+    parser.add_argument('--micro_batches', dest='micro_batches', default=1, type=int, help='Flag: split every batch into micro-batches with gradient accumulation (MMD still over the whole batch)')
+
+    # telemetry
+    parser.add_argument('--profile', dest='profile', default=0, type=int, help='Flag: per-phase timing summary next to the results CSV (also: PROTWAVEVAE_PROFILE=1)')
+    parser.add_argument('--profile_steps', dest='profile_steps', default=0, type=int, help='Flag: no. training steps captured by torch.profiler (0: off; needs --profile)')
+
 
   
+def get_trainer_kwargs(args: any) -> dict:
+    """
+    function description: device/strategy arguments of pl.Trainer. With num_processes > 1 training runs as CPU
+    data-parallel DDP over the gloo backend, each rank using its share of the cores.
+    """
+    if args.num_processes > 1:
+        from pytorch_lightning.strategies import DDPStrategy
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.num_processes))
+        return {
+                'accelerator': 'cpu',
+                'devices': args.num_processes,
+                'strategy': DDPStrategy(process_group_backend='gloo', find_unused_parameters=True)
+        }
+
+    return {'gpus': 1 if torch.cuda.is_available() else None}
+
+
 def train_model(
         args: any,
-        PL_model: pl.LightningModule,
+        PL_model: any,
         train_dataloader: DataLoader,
         valid_dataloader: any
     ) -> (
             any, 
             pd.Series
     ):
+        import pytorch_lightning as pl
+        import protwavevae.checkpointing as ckpt
+        import protwavevae.telemetry_callback as telemetry_cb
+
+        callbacks, resume_path = ckpt.get_checkpointing(args=args, model_path=args.model_output_path)
+        callbacks += telemetry_cb.get_callbacks(args=args, PL_model=PL_model)
         trainer = pl.Trainer(
+                callbacks=callbacks,
                 max_epochs=args.epochs,
-                gpus = 1 if torch.cuda.is_available() else None,
+                **get_trainer_kwargs(args=args)
         )
         
         if args.dataset_split == 1:
             print('\nTrain/Valid split training\n')
-            trainer.fit(PL_model, train_dataloaders=train_dataloader, val_dataloaders=valid_dataloader)
+            trainer.fit(PL_model, train_dataloaders=train_dataloader, val_dataloaders=valid_dataloader, ckpt_path=resume_path)
             
             
             # track losses
@@ -548,7 +649,7 @@ def train_model(
 
         else:
             print('\nTrain on the whole data\n')
-            trainer.fit(PL_model, train_dataloader)
+            trainer.fit(PL_model, train_dataloader, ckpt_path=resume_path)
             
             
             # track losses
@@ -579,6 +680,7 @@ def train_model(
 
 def set_SEED(args:any):
 
+    from pytorch_lightning import seed_everything
     return seed_everything(args.SEED)
 
 def set_GPU(args:any) -> str:
@@ -600,6 +702,7 @@ def set_GPU(args:any) -> str:
 
     return DEVICE
 
+@telemetry.timed('io/save_results')
 def save_results(
         args: any,
         PL_model: any,
@@ -658,8 +761,11 @@ if __name__ == '__main__':
     # reproducibility
     set_SEED(args=args)
     
-    # set GPU (cuda)
-    args.DEVICE = set_GPU(args=args)
+    # set GPU (cuda); CPU DDP ranks run on the CPU
+    args.DEVICE = set_GPU(args=args) if args.num_processes == 1 else 'cpu'
+    if args.num_processes > 1:
+        # the DistributedSampler shards the regular DataLoader
+        args.masked_nll_bucketing, args.tensor_loader = 0, 0
 
 
     # load Data
@@ -670,6 +776,12 @@ if __name__ == '__main__':
            args=args,
            protein_len = protein_len,
     )
+    # bfloat16 autocast (losses and BatchNorm statistics stay in float32)
+    if args.bf16:
+        PL_model.enable_bf16()
+    # gradient accumulation over micro-batches (the MMD is still estimated on the whole batch)
+    if args.micro_batches > 1:
+        PL_model.enable_micro_batching(args.micro_batches)
 
     # train model
     final_epoch_results, all_epoch_results = train_model(
@@ -679,10 +791,13 @@ if __name__ == '__main__':
                                                 valid_dataloader=valid_dataloader
     )
     
-    # save results
-    save_results(
-            args=args,
-            PL_model=PL_model,
-            final_epoch_results=final_epoch_results,
-            all_epoch_losses=all_epoch_results
-    )
+    # save results (only once: DDP rank 0)
+    if PL_model.global_rank == 0:
+        save_results(
+                args=args,
+                PL_model=PL_model,
+                final_epoch_results=final_epoch_results,
+                all_epoch_losses=all_epoch_results
+        )
+        # per-phase timing summary next to the results CSV (--profile)
+        telemetry.write_summary(args.output_results_path)
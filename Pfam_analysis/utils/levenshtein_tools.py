@@ -8,9 +8,17 @@ import numpy as np
 import pandas as pd
 import sys
 import argparse
+import random
 from numba import jit
 from tqdm import tqdm
 
+
+def set_SEED(args: any) -> None:
+    # torch-free counterpart of train_on_pfam.set_SEED for the similarity scripts
+    random.seed(args.SEED)
+    np.random.seed(args.SEED)
+    return
+
 @jit(nopython=True) # Set "nopython" mode for best performance, equivalent to @njit 
 def levenshteinDistanceDP(token1, token2):
 
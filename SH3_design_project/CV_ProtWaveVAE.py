@@ -5,15 +5,11 @@ author: Niksa Praljak
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
 # super Pytorch Lightning
 import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
+from pytorch_lightning import seed_everything
 
 import source.preprocess as prep
 import source.wavenet_decoder as wavenet
@@ -23,15 +19,11 @@ import source.PL_wrapper as PL_wrapper
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
 from tqdm import tqdm
 import random
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import train_test_split
-from scipy.stats import pearsonr, spearmanr
 
 """
 Summary: train model session
@@ -88,6 +80,8 @@ def get_args() -> any:
         
     # cross-validation
     parser.add_argument('--K', default=5, type=int, help='number of CV splits')
+    parser.add_argument('--CV_workers', default=1, type=int, help='number of folds trained in parallel processes')
+    parser.add_argument('--CV_threads', default=0, type=int, help='torch/OpenMP threads per CV process (0: cores / CV_workers)')
     
     args = parser.parse_args()
     
@@ -106,10 +100,21 @@ def set_GPU() -> None:
     DEVICE = 'cuda' if USE_CUDA else 'cpu'
     return
 
-def set_SEED(args: any) -> None:
-    seed_everything(args.SEED, workers = True)
+def set_SEED(
+        args: any,
+        CV_index: int=None
+    ) -> None:
+    # fold CV_index trains with SEED + CV_index, whether the folds run serially or in worker processes
+    seed_everything(args.SEED if CV_index is None else fold_seed(args, CV_index), workers = True)
     return 
 
+def fold_seed(
+        args: any,
+        CV_index: int
+    ) -> int:
+    return args.SEED + CV_index
+
+
 def prepare_data(
         args: any,
         train: any,
@@ -139,7 +144,7 @@ def prepare_data(
     train_dataloader = DataLoader(
                         train_dataset,
                         batch_size=args.batch_size,
-                        num_workers=8,
+                        num_workers=num_workers,
                         shuffle=True
     )
 
@@ -153,7 +158,7 @@ def prepare_data(
     test_dataloader = DataLoader(
                         test_dataset,
                         batch_size=args.batch_size,
-                        num_workers=8,
+                        num_workers=num_workers,
                         shuffle=False
     )
 
@@ -350,6 +355,27 @@ def train_model(
         )
 
 
+# final epoch losses saved by save_results (one row per fold in the CV summary)
+final_epoch_columns = [
+    'train_L',
+    'val_L',
+    'train_NLL',
+    'train_kld',
+    'train_mmd',
+    'train_pheno',
+    'train_precision',
+    'train_recall',
+    'train_f1',
+    'val_NLL',
+    'val_kld',
+    'val_mmd',
+    'val_pheno',
+    'val_precision',
+    'val_recall',
+    'val_f1'
+]
+
+
 def save_results(
         args: any,
         final_epoch_results: list,
@@ -360,24 +386,6 @@ def save_results(
     
     # save results
     # final epoch losses
-    final_epoch_columns = [
-                    'train_L',
-                    'val_L',
-                    'train_NLL',
-                    'train_kld',
-                    'train_mmd',
-                    'train_pheno',
-                    'train_precision',
-                    'train_recall',
-                    'train_f1',
-                    'val_NLL',
-                    'val_kld',
-                    'val_mmd',
-                    'val_pheno',
-                    'val_precision',
-                    'val_recall',
-                    'val_f1'
-    ]               
     final_epoch_dict = dict(map(lambda column, data : (column, [data]), final_epoch_columns, final_epoch_results))
     final_epoch_df = pd.DataFrame(final_epoch_dict)
     final_epoch_df.to_csv(args.output_results_path, index = False)
@@ -393,6 +401,110 @@ def save_results(
     return
 
 
+def save_CV_summary(
+        args: any,
+        CV_final_epoch_results: list
+    ) -> None:
+
+    CV_df = pd.DataFrame(CV_final_epoch_results, columns = final_epoch_columns)
+    CV_df.insert(0, 'CV_index', np.arange(len(CV_df)))
+    CV_df.insert(1, 'SEED', [fold_seed(args, CV_index) for CV_index in CV_df.CV_index]) # per-fold seed
+    CV_df.to_csv(args.output_results_path, index = False)
+
+    return
+
+
+def train_fold(
+        args: any,
+        data: tuple,
+        CV_index: int,
+        train_index: np.ndarray,
+        test_index: np.ndarray,
+        num_workers: int=4
+    ) -> (
+            list,
+            dict
+    ):
+
+    # independent, reproducible model init/dropout/sampling per fold
+    set_SEED(args=args, CV_index=CV_index)
+
+    X_OH, y_pheno, y_C, y_accept = data
+
+    # split data into train/test
+    X_train, X_test = X_OH[train_index], X_OH[test_index]
+    y_pheno_train, y_pheno_test = y_pheno[train_index], y_pheno[test_index]
+    y_C_train, y_C_test = y_C[train_index], y_C[test_index]
+    y_accept_train, y_accept_test = y_accept[train_index], y_accept[test_index]
+
+
+    train_dataloader, test_dataloader, max_seq_len, train_dataset, test_dataset  = prepare_data(
+            args=args,
+            train=(X_train, y_pheno_train, y_C_train, y_accept_train),
+            test=(X_test,y_pheno_test,y_C_test,y_accept_test),
+            num_workers=num_workers,
+    )
+    
+    # acquire model
+    PL_model = get_model(
+            args=args,
+            protein_len=max_seq_len
+    )
+    print('Start training!')
+    # train model
+    PL_model, final_epoch_results, all_epochs_losses = train_model(
+                                                            args=args,
+                                                            PL_model=PL_model,
+                                                            train_dataloader=train_dataloader,
+                                                            test_dataloader=test_dataloader
+    )
+    print('Finished training!')
+
+    return (
+            final_epoch_results,
+            all_epochs_losses
+    )
+
+
+# tokenized dataset attached once by every CV worker process (shared memory, not a per-fold pickle)
+CV_ARGS, CV_DATA = None, None
+
+def init_CV_worker(
+        args: any,
+        data: tuple
+    ) -> None:
+
+    global CV_ARGS, CV_DATA
+
+    torch.set_num_threads(args.CV_threads)
+    CV_ARGS, CV_DATA = args, data # every fold is seeded in train_fold
+    return
+
+
+def run_CV_fold(fold: tuple) -> (
+        int,
+        list,
+        dict
+    ):
+
+    CV_index, train_index, test_index = fold
+
+    final_epoch_results, all_epochs_losses = train_fold(
+                                                args=CV_ARGS,
+                                                data=CV_DATA,
+                                                CV_index=CV_index,
+                                                train_index=train_index,
+                                                test_index=test_index,
+                                                num_workers=0 # the fold process is the worker
+    )
+
+    return (
+            CV_index,
+            final_epoch_results,
+            all_epochs_losses
+    )
+
+
 def CV_train(
         args: any
     ) -> None:
@@ -411,37 +523,37 @@ def CV_train(
             max_seq_len=max_seq_len
     )
 
-    for ii, (train_index, test_index) in enumerate(sss.split(X_OH, y_C)):
+    folds = [(ii, train_index, test_index) for ii, (train_index, test_index) in enumerate(sss.split(X_OH, y_C))]
 
-        # split data into train/test
-        X_train, X_test = X_OH[train_index], X_OH[test_index]
-        y_pheno_train, y_pheno_test = y_pheno[train_index], y_pheno[test_index]
-        y_C_train, y_C_test = y_C[train_index], y_C[test_index]
-        y_accept_train, y_accept_test = y_accept[train_index], y_accept[test_index]
+    if args.CV_workers > 1:
 
+        # split the cores between the fold processes
+        if args.CV_threads == 0:
+            args.CV_threads = max(1, os.cpu_count() // args.CV_workers)
+        os.environ['OMP_NUM_THREADS'] = str(args.CV_threads)
+        os.environ['MKL_NUM_THREADS'] = str(args.CV_threads)
 
-        train_dataloader, test_dataloader, max_seq_len, train_dataset, test_dataset  = prepare_data(
-                args=args,
-                train=(X_train, y_pheno_train, y_C_train, y_accept_train),
-                test=(X_test,y_pheno_test,y_C_test,y_accept_test),
-                num_workers=4,
-        )
-        
-        # acquire model
-        PL_model = get_model(
-                args=args,
-                protein_len=max_seq_len
-        )
-        print('Start training!')
-        # train model
-        PL_model, final_epoch_results, all_epochs_losses = train_model(
-                                                                args=args,
-                                                                PL_model=PL_model,
-                                                                train_dataloader=train_dataloader,
-                                                                test_dataloader=test_dataloader
+        # move the tokenized dataset into shared memory once
+        data = tuple(tensor.share_memory_() for tensor in (X_OH, y_pheno, y_C, y_accept))
+
+        ctx = torch.multiprocessing.get_context('spawn')
+        with ctx.Pool(
+                processes=min(args.CV_workers, args.K),
+                initializer=init_CV_worker,
+                initargs=(args, data)
+            ) as pool:
+            fold_results = pool.map(run_CV_fold, folds)
+
+    else:
+        data = (X_OH, y_pheno, y_C, y_accept)
+        fold_results = (
+                (ii,) + train_fold(args=args, data=data, CV_index=ii, train_index=train_index, test_index=test_index, num_workers=4)
+                for ii, train_index, test_index in folds
         )
-        print('Finished training!')
-        
+ 
+    CV_final_epoch_results = []
+    for ii, final_epoch_results, all_epochs_losses in fold_results:
+
         # save spreadsheets
         save_results(
             args=args,
@@ -449,8 +561,15 @@ def CV_train(
             all_epochs_losses=all_epochs_losses,
             CV_index=ii
         )
+        CV_final_epoch_results.append(final_epoch_results)
         print('Save results ...')
 
+    # merge the final epoch results of all folds (one row per fold)
+    save_CV_summary(
+            args=args,
+            CV_final_epoch_results=CV_final_epoch_results
+    )
+
     return
 
 
@@ -462,7 +581,8 @@ if __name__ == '__main__':
     # create output folder
     os.makedirs(args.folder_path, exist_ok=True)
     # set GPU
-    set_GPU()
+    if args.DEVICE == 'cuda':
+        set_GPU()
     # set seed for reproducibility 
     set_SEED(args=args)
     # Cross-validate
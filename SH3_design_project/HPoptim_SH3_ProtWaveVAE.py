@@ -2,35 +2,28 @@
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
 import optuna
-from optuna.integration import PyTorchLightningPruningCallback
 
 import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
+from pytorch_lightning import seed_everything
 
 import source.preprocess as prep
 import source.model_components as model_comps
 import source.wavenet_decoder as wavenet
 import source.PL_wrapper as PL_wrapper
+import protwavevae.batch_probe as batch_probe
 
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
 from tqdm import tqdm
 import random
 
-from sklearn.model_selection import train_test_split
-
 
 
 
@@ -188,6 +181,26 @@ class Objective(object):
                             z_dim=z_dim
         )
 
+        # largest batches of this configuration within the memory budget (a trial that does not fit is pruned)
+        valid_dataloader = self.valid_dataloader
+        if args.auto_batch_size:
+            safe, records = batch_probe.probe_phases(
+                                            model = PL_model.model,
+                                            protein_len = self.max_seq_len,
+                                            aa_labels = args.aa_labels,
+                                            DEVICE = args.DEVICE,
+                                            max_batches = {'train': args.batch_size, 'eval': args.batch_size},
+                                            budget_mb = args.mem_budget_mb
+            )
+            batch_probe.write_records(f'{args.output_results_path}_{args.search_variable}_trial{trial.number}_batch_probe.csv', records)
+            if min(safe.values()) < 1:
+                raise optuna.TrialPruned(f'trial {trial.number}: not even a batch of one fits into the memory budget')
+
+            # batches above the safe size: accumulated micro-batches (MMD still over the whole batch)
+            _, micro_batches = batch_probe.plan_accumulation(args.batch_size, safe['train'])
+            PL_model.enable_micro_batching(micro_batches)
+            valid_dataloader = batch_probe.rebatch(self.valid_dataloader, min(args.batch_size, safe['eval']))
+
         trainer = pl.Trainer(
                 logger = False,
                 max_epochs = args.epochs,
@@ -195,11 +208,16 @@ class Objective(object):
                 progress_bar_refresh_rate = False
         )
 
-        trainer.fit(
-                PL_model,
-                train_dataloaders = self.train_dataloader,
-                val_dataloaders = self.valid_dataloader
-        )
+        try:
+            trainer.fit(
+                    PL_model,
+                    train_dataloaders = self.train_dataloader,
+                    val_dataloaders = valid_dataloader
+            )
+        except RuntimeError as error: # out of memory ends this trial, not the study
+            if not batch_probe.is_oom(error):
+                raise
+            raise optuna.TrialPruned(f'trial {trial.number}: {error}')
 
 
         train_L = trainer.callback_metrics['L_train_epoch'].item()
@@ -529,6 +547,10 @@ def get_args() -> any:
     parser.add_argument('--search_variable', default = 'z_dim', help = 'Flag: choose hyperparameter variable to grid search.', type = str)
     parser.add_argument('--n_trials', default = 1, help = 'Flag: choose number of trials.', type = int)
     parser.add_argument('--K', default = 5, help = 'Flag: Cross-validation', type = int)
+
+    # memory budget
+    parser.add_argument('--auto_batch_size', default = 0, help = 'Flag: probe the largest batch of every trial within --mem_budget_mb; larger batches become accumulated micro-batches', type = int)
+    parser.add_argument('--mem_budget_mb', default = 0., help = 'Flag: memory budget of the batch-size probe (0: RSS + 80%% of the available memory; CUDA: 80%% of the device memory)', type = float)
     
     
     args = parser.parse_args()
@@ -0,0 +1,213 @@
+import torch
+from torch import nn
+
+import source.rng_streams as rng
+import source.precision as prec
+import train_ProtWaveVAE as ProtWaveVAE
+
+import numpy as np
+import pandas as pd
+import argparse
+import itertools
+import copy
+import time
+import sys
+import os
+
+
+def get_args() -> any:
+
+    # write output path name
+    parser = argparse.ArgumentParser()
+    
+    # path varibles
+    parser.add_argument('--dataset_path', default='./data/ACS_SynBio_SH3_dataset.csv')
+    parser.add_argument('--output_results_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.csv')
+    parser.add_argument('--output_model_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.pth')
+    parser.add_argument('--save_dir', default='./outputs/SH3_precision_benchmark')
+    
+    # model training variables
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--batch_size', default=512, type=int, help='Size of the batch.')
+    parser.add_argument('--epochs', default=1000, type=int, help='Number of epochs')
+    parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
+    parser.add_argument('--DEVICE', default='cpu', help='bfloat16 autocast is benchmarked on the CPU')
+    parser.add_argument('--dataset_split', default=1, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--N', default=100, type=int, help='Batch size')
+
+    # general architecture variables
+    parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
+    parser.add_argument('--num_classes', default=2, type=int, help='functional/nonfunctional labels')
+    parser.add_argument('--aa_labels', default=21, type=int, help='AA plus pad gap (20+1) labels')
+    
+    # encoder hyperparameters
+    parser.add_argument('--encoder_rates', default=5, type=int, help='dilation convolution depth')
+    parser.add_argument('--C_in', default=21, type=int, help='input feature depth')
+    parser.add_argument('--C_out', default=256, type=int, help='output feature depth')
+    parser.add_argument('--alpha', default=0.1, type=float, help='leaky Relu hyperparameter (optional)')
+    parser.add_argument('--enc_kernel', default=3, type=int, help='kernel filter size')
+    parser.add_argument('--num_fc', default=1, type=int, help='number of fully connect layers')
+      
+    # top model (discriminative decoder) hyperparameters
+    parser.add_argument('--disc_num_layers', default=2, type=int, help='depth of the discrim. top model')
+    parser.add_argument('--hidden_width', default=10, type=int, help='width of top model')
+    parser.add_argument('--p', default=0.3, type=float, help='top model dropout')
+
+    # decoder wavenet hyperparameters
+    parser.add_argument('--wave_hidden_state', default=256, type=int, help='no. filters for the dilated convolutions')
+    parser.add_argument('--head_hidden_state', default=128, type=int, help='no. filters for the WaveNets top model')
+    parser.add_argument('--num_dil_rates', default=8, type=int, help='depth of the WaveNet')
+    parser.add_argument('--dec_kernel_size', default=3, type=int, help='WaveNet kernel size')
+
+    # loss prefactor weights
+    parser.add_argument('--nll_weight', default=1., type=float, help='NLL prefactor weight')
+    parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
+    parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
+    parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # benchmark variables
+    parser.add_argument('--load_model', default=1, type=int, help='load the weights in output_model_path (1) or benchmark a freshly initialized model (0)')
+    parser.add_argument('--num_batches', default=10, type=int, help='no. training batches timed per precision')
+    parser.add_argument('--num_warmup', default=2, type=int, help='no. untimed warm-up batches per precision')
+    parser.add_argument('--num_gen', default=64, type=int, help='no. sequences generated per precision')
+    parser.add_argument('--num_threads', default=0, type=int, help='no. torch CPU threads (0: torch default)')
+
+    args = parser.parse_args()
+    
+    return args
+
+
+def time_training(
+        args: any,
+        PL_model: any,
+        batches: list
+    ) -> float:
+    """
+    function description: training throughput (sequences/s) of forward + loss + backward; no optimizer step, so
+    every precision is timed on the same weights.
+    """
+    PL_model.train()
+    num_seqs, elapsed = 0, 0.
+    for ii, batch in enumerate(batches[:args.num_warmup] + batches):
+        torch.manual_seed(args.SEED + ii)
+        start = time.perf_counter()
+        loss = PL_model.training_step(batch, ii)['loss']
+        loss.backward()
+        PL_model.zero_grad()
+        if ii >= args.num_warmup:
+            elapsed += time.perf_counter() - start
+            num_seqs += batch[0].shape[0]
+    return num_seqs / elapsed
+
+
+@torch.no_grad()
+def eval_losses(
+        args: any,
+        PL_model: any,
+        batches: list
+    ) -> dict:
+    """
+    function description: mean validation losses (eval mode, same z noise for every precision).
+    """
+    PL_model.eval()
+    for ii, batch in enumerate(batches):
+        torch.manual_seed(args.SEED + ii)
+        PL_model.validation_step(batch, ii)
+    n = len(batches)
+    return {
+            'loss': np.mean(PL_model.L_valid[-n:]),
+            'nll': np.mean(PL_model.L_nll_valid[-n:]),
+            'kld': np.mean(PL_model.L_kld_valid[-n:]),
+            'mmd': np.mean(PL_model.L_mmd_valid[-n:]),
+            'pheno': np.mean(PL_model.L_pheno_valid[-n:])
+    }
+
+
+@torch.no_grad()
+def time_generation(
+        args: any,
+        model: nn.Module,
+        Z: torch.FloatTensor
+    ) -> (
+            float,
+            torch.LongTensor
+    ):
+    """
+    function description: generation throughput (sequences/s) and final tokens. Counter-based streams make the
+    random draws identical across precisions, so token differences only come from the logits.
+    """
+    X_context = torch.zeros((Z.shape[0], args.max_seq_len, args.aa_labels)).to(args.DEVICE)
+    start = time.perf_counter()
+    X_samples = model.sample(
+                    args=args,
+                    X_context=X_context,
+                    z=Z.to(args.DEVICE),
+                    option='categorical',
+                    streams=rng.Counter_streams(seed=args.SEED),
+                    seq_ids=torch.arange(Z.shape[0])
+    )
+    elapsed = time.perf_counter() - start
+    return (
+            Z.shape[0] / elapsed,
+            X_samples[:, -1].argmax(dim=-1).cpu()
+    )
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    if not prec.bf16_available():
+        sys.exit(f'bfloat16 autocast needs torch >= 1.10 (installed: {torch.__version__})')
+    if args.DEVICE == 'cuda':
+        ProtWaveVAE.set_GPU() # set GPU
+    if args.num_threads > 0:
+        torch.set_num_threads(args.num_threads)
+    ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+    os.makedirs(args.save_dir, exist_ok=True)
+
+    # get data (the same batches are used for every precision)
+    train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
+    batches = list(itertools.islice(train_dataloader, args.num_batches))
+    args.max_seq_len = protein_len
+
+    # float32 reference and a bfloat16 copy with the same weights
+    PL_fp32 = ProtWaveVAE.get_model(
+                            args=args,
+                            protein_len=protein_len
+    ).to(args.DEVICE)
+    if args.load_model:
+        PL_fp32.model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
+    PL_bf16 = copy.deepcopy(PL_fp32)
+    PL_bf16.enable_bf16()
+
+    # latent codes from the prior
+    Z = torch.randn((args.num_gen, args.z_dim))
+
+    results, tokens = [], {}
+    for precision, PL_model in [('fp32', PL_fp32), ('bf16', PL_bf16)]:
+        losses = eval_losses(args=args, PL_model=PL_model, batches=batches)
+        train_throughput = time_training(args=args, PL_model=PL_model, batches=batches)
+        gen_throughput, tokens[precision] = time_generation(args=args, model=PL_model.model, Z=Z)
+        results.append(
+                {
+                    'precision': precision,
+                    'train_seqs_per_s': train_throughput,
+                    'gen_seqs_per_s': gen_throughput,
+                    **{f'{name}_loss': value for name, value in losses.items()}
+                }
+        )
+
+    results_df = pd.DataFrame(results).set_index('precision')
+    # parity against float32
+    parity = {
+            'speedup_train': results_df.loc['bf16', 'train_seqs_per_s'] / results_df.loc['fp32', 'train_seqs_per_s'],
+            'speedup_gen': results_df.loc['bf16', 'gen_seqs_per_s'] / results_df.loc['fp32', 'gen_seqs_per_s'],
+            'token_agreement': (tokens['bf16'] == tokens['fp32']).float().mean().item()
+    }
+    for name in ['loss', 'nll', 'kld', 'mmd', 'pheno']:
+        parity[f'{name}_abs_diff'] = abs(results_df.loc['bf16', f'{name}_loss'] - results_df.loc['fp32', f'{name}_loss'])
+
+    results_df.to_csv(os.path.join(args.save_dir, 'precision_throughput.csv'))
+    pd.DataFrame([parity]).to_csv(os.path.join(args.save_dir, 'precision_parity.csv'), index=False)
+    print(results_df.T)
+    print('bfloat16 parity against float32:\n', pd.DataFrame([parity]).T)
@@ -3,7 +3,6 @@ import numpy as np
 import pandas as pd
 import sys
 import argparse
-from numba import jit
 from tqdm import tqdm
 import utils.compute_min_levenshtein as utils_min_leven
 import random
@@ -0,0 +1,116 @@
+import torch
+from torch import nn
+
+import source.dms as dms
+import train_ProtWaveVAE as ProtWaveVAE
+import mutate_proteins as mut_proteins
+
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+
+
+def get_args() -> any:
+
+    # write output path name
+    parser = argparse.ArgumentParser()
+    
+    # path varibles
+    parser.add_argument('--dataset_path', default='./data/ACS_SynBio_SH3_dataset.csv')
+    parser.add_argument('--output_results_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.csv')
+    parser.add_argument('--output_model_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.pth')
+    parser.add_argument('--save_dir', default='./outputs/SH3_dms')
+    
+    # model training variables
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--batch_size', default=512, type=int, help='Size of the batch.')
+    parser.add_argument('--epochs', default=1000, type=int, help='Number of epochs')
+    parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
+    parser.add_argument('--DEVICE', default='cuda', help='Learning rate')
+    parser.add_argument('--dataset_split', default=1, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--N', default=100, type=int, help='Batch size')
+
+    # general architecture variables
+    parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
+    parser.add_argument('--num_classes', default=2, type=int, help='functional/nonfunctional labels')
+    parser.add_argument('--aa_labels', default=21, type=int, help='AA plus pad gap (20+1) labels')
+    
+    # encoder hyperparameters
+    parser.add_argument('--encoder_rates', default=5, type=int, help='dilation convolution depth')
+    parser.add_argument('--C_in', default=21, type=int, help='input feature depth')
+    parser.add_argument('--C_out', default=256, type=int, help='output feature depth')
+    parser.add_argument('--alpha', default=0.1, type=float, help='leaky Relu hyperparameter (optional)')
+    parser.add_argument('--enc_kernel', default=3, type=int, help='kernel filter size')
+    parser.add_argument('--num_fc', default=1, type=int, help='number of fully connect layers')
+      
+    # top model (discriminative decoder) hyperparameters
+    parser.add_argument('--disc_num_layers', default=2, type=int, help='depth of the discrim. top model')
+    parser.add_argument('--hidden_width', default=10, type=int, help='width of top model')
+    parser.add_argument('--p', default=0.3, type=float, help='top model dropout')
+
+    # decoder wavenet hyperparameters
+    parser.add_argument('--wave_hidden_state', default=256, type=int, help='no. filters for the dilated convolutions')
+    parser.add_argument('--head_hidden_state', default=128, type=int, help='no. filters for the WaveNets top model')
+    parser.add_argument('--num_dil_rates', default=8, type=int, help='depth of the WaveNet')
+    parser.add_argument('--dec_kernel_size', default=3, type=int, help='WaveNet kernel size')
+
+    # loss prefactor weights
+    parser.add_argument('--nll_weight', default=1., type=float, help='NLL prefactor weight')
+    parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
+    parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
+    parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # deep mutational scan variables
+    parser.add_argument('--reference', default='WT', help='WT | PARTIAL | PARALOG | ORTHOLOG')
+    parser.add_argument('--dms_batch_size', default=256, type=int, help='no. mutants scored per batch')
+    parser.add_argument('--doubles', default=0, type=int, help='Flag: also score the double mutants')
+    parser.add_argument('--double_positions', default='', help='1-indexed positions (split by |) combined into double mutants')
+
+    args = parser.parse_args()
+    
+    return args
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    if args.DEVICE == 'cuda':
+        ProtWaveVAE.set_GPU() # set GPU
+    ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+    os.makedirs(args.save_dir, exist_ok=True)
+
+    # get data
+    train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
+    Xtrain, _, _, _ = train_dataloader.dataset[0:1]
+    max_seq_len = Xtrain.shape[1] # (B, L, 21)
+    args.max_seq_len = max_seq_len
+
+    # get model
+    model = ProtWaveVAE.get_SS_model(
+                            args=args,
+                            protein_len=protein_len
+    ).to(args.DEVICE)
+    model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
+
+    scanner = dms.DMS_scanner(
+                    args=args,
+                    model=model,
+                    ref_seq=mut_proteins.ref_seq(args=args),
+                    max_seq_len=max_seq_len,
+                    batch_size=args.dms_batch_size
+    )
+
+    # single mutants: position x residue matrices streamed to disk
+    singles_df = scanner.scan_singles(
+                    loglik_path=os.path.join(args.save_dir, f'dms_{args.reference}_delta_loglik.npy'),
+                    pheno_path=os.path.join(args.save_dir, f'dms_{args.reference}_pheno_pred.npy')
+    )
+    singles_df.to_csv(os.path.join(args.save_dir, f'dms_{args.reference}_singles.csv'), index=False)
+
+    # double mutants over the chosen positions
+    if args.doubles:
+        positions = [int(pos) - 1 for pos in args.double_positions.split('|')] if args.double_positions != '' else list(range(len(scanner.ref_seq)))
+        doubles_df = scanner.scan_doubles(positions=positions)
+        doubles_df.to_csv(os.path.join(args.save_dir, f'dms_{args.reference}_doubles.csv'), index=False)
@@ -1,25 +1,20 @@
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-# super Pytorch Lightning
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-
 import source.preprocess as prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_wrapper
+import source.quantize as quant
+import source.rng_streams as rng
+import source.fold_bn as fold_bn
+import source.precision as prec
 import train_ProtWaveVAE as ProtWaveVAE
+import protwavevae.telemetry as telemetry
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
@@ -79,6 +74,22 @@ def get_args() -> any:
     parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
     parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
 
+    # inference precision
+    parser.add_argument('--quantize', default=0, type=int, help='int8 quantized CPU inference (1) or float32 (0)')
+    parser.add_argument('--num_calib', default=512, type=int, help='no. training sequences used to report the int8 drift')
+    parser.add_argument('--bf16', default=0, type=prec.bf16_flag, help='bfloat16 autocast for conv/linear layers (1; needs torch >= 1.10) or float32 (0)')
+
+    # reproducible generation
+    parser.add_argument('--gen_seed', default=-1, type=int, help='seed of the per-sequence generation streams (-1: global RNG)')
+    parser.add_argument('--gen_chunk_size', default=0, type=int, help='no. sequences generated per chunk (0: all at once)')
+
+    # memory budget
+    parser.add_argument('--auto_batch_size', default=0, type=int, help='probe the largest inference batch and generation chunk within --mem_budget_mb (1)')
+    parser.add_argument('--mem_budget_mb', default=0., type=float, help='memory budget of the batch-size probe (0: RSS + 80%% of the available memory; CUDA: 80%% of the device memory)')
+
+    # telemetry
+    parser.add_argument('--profile', default=0, type=int, help='Flag: per-phase timing summary in save_dir (also: PROTWAVEVAE_PROFILE=1)')
+
     args = parser.parse_args()
     
     return args
@@ -103,6 +114,10 @@ def make_latent_preds(
     # eval mode
     model.eval()
 
+    # BatchNorm-folded encoder, checked against the original on the first batch
+    X_check = dataloader.dataset[0:args.batch_size][0]
+    encoder = fold_bn.fold_encoder(model.inference, x_check=X_check.permute(0,2,1).to(args.DEVICE))
+
     left_idx, right_idx = 0, 0
     for ii, batch in tqdm(enumerate(dataloader)):
 
@@ -112,7 +127,7 @@ def make_latent_preds(
         # update right index
         right_idx += batch_size
 
-        Z_pred_mu, Z_pred_var = model.inference(X_temp.permute(0,2,1).to(args.DEVICE))
+        Z_pred_mu, Z_pred_var = encoder(X_temp.permute(0,2,1).to(args.DEVICE))
         Z_pred_temp = model.reparam_trick(Z_pred_mu, Z_pred_var)
         
         # load empty tensors
@@ -127,6 +142,7 @@ def make_latent_preds(
     )
 
 
+@telemetry.timed('generate/infer_latents')
 def infer_latents(
         args: any,
         model: nn.Module,
@@ -190,12 +206,59 @@ def aniso_func_dist(
 
     return aniso_dist
 
+
+@torch.no_grad()
+def generate_in_chunks(
+    args: any,
+    generate_func: any,
+    batch_tensors: dict,
+    streams: rng.Counter_streams=None,
+    **kwargs
+    ) -> torch.FloatTensor:
+    """
+    function description: run a generation method (model.sample, model.diversify, ...) on chunks of
+    args.gen_chunk_size sequences. Every sequence keeps its global index as seq_id, so with streams the chunked
+    output is identical to a single-batch (or any other chunking) run.
+    """
+    n = next(iter(batch_tensors.values())).shape[0]
+    chunk_size = args.gen_chunk_size if args.gen_chunk_size > 0 else n
+
+    X_chunks = []
+    for start in range(0, n, chunk_size):
+        chunk_tensors = {name: tensor[start:start+chunk_size].to(args.DEVICE) for name, tensor in batch_tensors.items()}
+        with telemetry.phase(f'generate/{generate_func.__name__}'):
+            X_chunks.append(
+                    generate_func(
+                        args=args,
+                        streams=streams,
+                        seq_ids=torch.arange(start, min(start + chunk_size, n)),
+                        **chunk_tensors,
+                        **kwargs
+                    ).cpu()
+            )
+
+    return torch.cat(X_chunks)
+
+
+def sample_latents(
+    dist: torch.distributions.Distribution,
+    n: int,
+    streams: rng.Counter_streams=None
+    ) -> torch.FloatTensor:
+
+    if streams is None:
+        return dist.sample((n,))
+    # one draw per sequence id from the latent stream
+    return rng.sample_mvn(dist=dist, streams=streams, seq_ids=torch.arange(n))
+
+
 @torch.no_grad()
 def sample_func_SH3(
     args: any,
     model: nn.Module,
     aniso_dist: torch.distributions.multivariate_normal.MultivariateNormal,
-    n: int=100
+    n: int=100,
+    streams: rng.Counter_streams=None
     ) -> (
         torch.FloatTensor,
         torch.FloatTensor,
@@ -213,30 +276,37 @@ def sample_func_SH3(
     X_context_greedy = X_context.clone()
 
     # latent-conditional info.
-    Z_context = aniso_dist.sample((n,)).to(args.DEVICE)
+    Z_context = sample_latents(
+        dist=aniso_dist,
+        n=n,
+        streams=rng.spawn(streams, 'latent')
+    ).to(args.DEVICE)
     Z_NOcontext = torch.zeros_like(Z_context)
 
     # generate sequences
-    X_samples_cat = model.sample(
+    X_samples_cat = generate_in_chunks(
         args=args,
-        X_context=X_context_cat,
-        z=Z_context,
+        generate_func=model.sample,
+        batch_tensors={'X_context': X_context_cat, 'z': Z_context},
+        streams=rng.spawn(streams, 'categorical'),
         option='categorical'
-    ).cpu()
+    )
 
-    X_samples_argmax = model.sample(
+    X_samples_argmax = generate_in_chunks(
         args=args,
-        X_context=X_context_greedy,
-        z=Z_context,
+        generate_func=model.sample,
+        batch_tensors={'X_context': X_context_greedy, 'z': Z_context},
+        streams=rng.spawn(streams, 'greedy'),
         option='greedy'
-    ).cpu()
+    )
 
-    X_samples_NOlatent = model.sample(
+    X_samples_NOlatent = generate_in_chunks(
         args=args,
-        X_context=X_context_cat,
-        z=Z_NOcontext,
+        generate_func=model.sample,
+        batch_tensors={'X_context': X_context_cat, 'z': Z_NOcontext},
+        streams=rng.spawn(streams, 'NOlatent'),
         option='categorical'
-    ).cpu()
+    )
 
     return (
         X_samples_cat,
@@ -322,7 +392,8 @@ def diversify_gene(
     seq_list: list,
     max_seq_len: int,
     z_context: torch.FloatTensor,
-    L: int
+    L: int,
+    streams: rng.Counter_streams=None
     ) -> torch.FloatTensor:
     
     # eval mode: 
@@ -345,13 +416,14 @@ def diversify_gene(
         pass
     
     # diversify sequence of interest
-    X_diversify_samples = model.diversify(
+    X_diversify_samples = generate_in_chunks(
             args=args,
-            X_context=X.to(args.DEVICE),
-            z=z_context.to(args.DEVICE),
+            generate_func=model.diversify,
+            batch_tensors={'X_context': X, 'z': z_context},
+            streams=streams,
             L=L,
             option='categorical'
-    ).cpu()
+    )
     
     return X_diversify_samples
            
@@ -362,7 +434,8 @@ def randomly_diversify_gene(
     model: nn.Module,
     seq_list: list,
     max_seq_len: int,
-    L: int
+    L: int,
+    streams: rng.Counter_streams=None
     ) -> torch.FloatTensor:
     
     # eval mode: 
@@ -390,15 +463,19 @@ def randomly_diversify_gene(
     X_temp = model.create_uniform_tensor(args=args,X=X)
     print(X_temp.shape)
     # diversify sequence of interest
-    X_rand_diversify_samples = model.randomly_diversify(
+    X_rand_diversify_samples = generate_in_chunks(
                                             args=args,
-                                            X_context=X.to(args.DEVICE),
+                                            generate_func=model.randomly_diversify,
+                                            batch_tensors={'X_context': X},
+                                            streams=streams,
                                             L=L,
-                                            option='categorical'
-    ).cpu()
+                                            option='categorical',
+                                            history=False
+    )
     
     # include deletion gaps
-    X_rand_diversify_samples[:, -1, -num_gaps:,:] = X[:,-num_gaps:, :]
+    if num_gaps > 0:
+        X_rand_diversify_samples[:, -1, -num_gaps:,:] = X[:,-num_gaps:, :]
     
     return X_rand_diversify_samples, X
 
@@ -410,6 +487,7 @@ def diversify_seq(
     max_seq_len: int,
     L: int,
     n: int=50,
+    streams: rng.Counter_streams=None
     ) -> (
         torch.FloatTensor,
         torch.FloatTensor,
@@ -421,7 +499,11 @@ def diversify_seq(
     model.eval()
     
     # latent-conditional info. 
-    Z_context = aniso_dist.sample((n,)).to(args.DEVICE)
+    Z_context = sample_latents(
+        dist=aniso_dist,
+        n=n,
+        streams=rng.spawn(streams, 'latent')
+    ).to(args.DEVICE)
     Z_NOcontext = torch.zeros_like(Z_context).to(args.DEVICE)
     
     # latent conditioning
@@ -431,7 +513,8 @@ def diversify_seq(
         seq_list=seq_list,
         max_seq_len=max_seq_len,
         z_context=Z_context,
-        L=L
+        L=L,
+        streams=rng.spawn(streams, 'latent_diversify')
     ) 
     
     # no latent conditioning 
@@ -441,7 +524,8 @@ def diversify_seq(
         seq_list=seq_list,
         max_seq_len=max_seq_len,
         z_context=Z_NOcontext,
-        L=L
+        L=L,
+        streams=rng.spawn(streams, 'NOlatent_diversify')
     )
 
 
@@ -451,7 +535,8 @@ def diversify_seq(
             model=model,
             seq_list=seq_list,
             max_seq_len=max_seq_len,
-            L=L
+            L=L,
+            streams=rng.spawn(streams, 'random_diversify')
     )
 
     return (
@@ -494,7 +579,8 @@ def design_SH3_LatentOnly(
         args=args,
         model=model,
         aniso_dist=aniso_dist,
-        n=300
+        n=300,
+        streams=rng.spawn(args.gen_streams, 'LatentOnly')
     )      
         
     # generate dataframe for the amino acid sequences of the categorical sampling
@@ -535,9 +621,10 @@ def design_SH3_LatentOnly(
    # torch.save(design_tensors, os.path.join(args.save_dir, f"LatentOnly/LatentOnly_Sho1Designs.tensors"))
 
     # save dataframes
-    cat_sample_df.to_csv(os.path.join(args.save_dir, f"LatentOnly/LatentOnly_Sho1Designs[categorical].csv"), index=False)
-    Nocontext_sample_df.to_csv(os.path.join(args.save_dir, f"LatentOnly/NoLatent_Sho1Designs[categorical].csv"), index=False)
-    argmax_sample_df.to_csv(os.path.join(args.save_dir, f"LatentOnly/Latent_Sho1Designs[argmax].csv"), index=False)
+    with telemetry.phase('io/write_csv'):
+        cat_sample_df.to_csv(os.path.join(args.save_dir, f"LatentOnly/LatentOnly_Sho1Designs[categorical].csv"), index=False)
+        Nocontext_sample_df.to_csv(os.path.join(args.save_dir, f"LatentOnly/NoLatent_Sho1Designs[categorical].csv"), index=False)
+        argmax_sample_df.to_csv(os.path.join(args.save_dir, f"LatentOnly/Latent_Sho1Designs[argmax].csv"), index=False)
 
 
     return 
@@ -570,7 +657,8 @@ def diversify_SH3_WT(
                         seq_list=WT_seq,
                         max_seq_len=args.max_seq_len,
                         L=L,
-                        n=args.N
+                        n=args.N,
+                        streams=rng.spawn(args.gen_streams, f'WT[L={L}]')
         )
 
         # generate dataframes for the amino acid sequences that used latent conditioning
@@ -612,8 +700,9 @@ def diversify_SH3_WT(
     #    torch.save(design_tensors, os.path.join(args.save_dir, f"WT/WT_diversify[L={L}].tensors.{ii}"))
 
         # save datafranes
-        Xwt_latent_df.to_csv(os.path.join(args.save_dir, f"WT/WT_diversify[L={L}].csv"), index=False)
-        Xwt_NOlatent_df.to_csv(os.path.join(args.save_dir, f"WT/WT_diversify_NOlatent[L={L}].csv"), index=False)
+        with telemetry.phase('io/write_csv'):
+            Xwt_latent_df.to_csv(os.path.join(args.save_dir, f"WT/WT_diversify[L={L}].csv"), index=False)
+            Xwt_NOlatent_df.to_csv(os.path.join(args.save_dir, f"WT/WT_diversify_NOlatent[L={L}].csv"), index=False)
     #   Xwt_random_df.to_csv(os.path.join(args.save_dir, f"WT/WT_diversify_random[L={L}].csv"), index=False)
 
 
@@ -685,7 +774,8 @@ def diversify_partial_rescue_paralog(
     ]
     
     # save the spreadsheet for the paralog of interest
-    paralog_of_interest_df.to_csv(os.path.join(args.save_dir, f"PartialParalog/PartialRescueParalog.csv"), index = False)
+    with telemetry.phase('io/write_csv'):
+        paralog_of_interest_df.to_csv(os.path.join(args.save_dir, f"PartialParalog/PartialRescueParalog.csv"), index = False)
 
     partial_paralog_seq = list(paralog_of_interest_df.Sequences_unaligned)
     
@@ -701,7 +791,8 @@ def diversify_partial_rescue_paralog(
                 seq_list=partial_paralog_seq,
                 max_seq_len=args.max_seq_len,
                 L=L,
-                n=args.N
+                n=args.N,
+                streams=rng.spawn(args.gen_streams, f'PARTIAL[L={L}]')
         )
 
         # generate dataframes for the amino acid sequences that used latent conditioning + known amino acids 
@@ -741,8 +832,9 @@ def diversify_partial_rescue_paralog(
        # torch.save(design_tensors, os.path.join(args.save_dir, f"PartialParalog/PartialParalog_diversify[L={L}].tensors.{ii}"))
 
         # save datafranes
-        Xpartial_latent_df.to_csv(os.path.join(args.save_dir, f"PartialParalog/PartialParalog_diversify[L={L}].csv"), index=False)
-        Xpartial_NOlatent_df.to_csv(os.path.join(args.save_dir, f"PartialParalog/PartialParalog_diversify_NOlatent[L={L}].csv"), index=False)
+        with telemetry.phase('io/write_csv'):
+            Xpartial_latent_df.to_csv(os.path.join(args.save_dir, f"PartialParalog/PartialParalog_diversify[L={L}].csv"), index=False)
+            Xpartial_NOlatent_df.to_csv(os.path.join(args.save_dir, f"PartialParalog/PartialParalog_diversify_NOlatent[L={L}].csv"), index=False)
        # Xpartial_random_df.to_csv(os.path.join(args.save_dir, f"PartialParalog_diversify_random[L={L}].csv"), index=False)
 
 
@@ -774,7 +866,8 @@ def diversify_paralog(
     ]
     
     # save the spreadsheet for the paralog of interest
-    paralog_of_interest_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog.csv"), index = False)
+    with telemetry.phase('io/write_csv'):
+        paralog_of_interest_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog.csv"), index = False)
 
     nonfunc_paralog_seq = list(paralog_of_interest_df.Sequences_unaligned)
     
@@ -790,7 +883,8 @@ def diversify_paralog(
                 seq_list=nonfunc_paralog_seq,
                 max_seq_len=args.max_seq_len,
                 L=L,
-                n=args.N
+                n=args.N,
+                streams=rng.spawn(args.gen_streams, f'PARALOG[L={L}]')
         )
 
         # generate dataframes for the amino acid sequences that used latent conditioning + known amino acids 
@@ -830,8 +924,9 @@ def diversify_paralog(
        # torch.save(design_tensors, os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog_diversify[L={L}].tensors.{ii}"))
 
         # save datafranes
-        Xparalog_latent_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog_diversify[L={L}].csv"), index=False)
-        Xparalog_NOlatent_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog_diversify_NOlatent[L={L}].csv"), index=False)
+        with telemetry.phase('io/write_csv'):
+            Xparalog_latent_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog_diversify[L={L}].csv"), index=False)
+            Xparalog_NOlatent_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog/NonfuncParalog_diversify_NOlatent[L={L}].csv"), index=False)
        # Xparalog_random_df.to_csv(os.path.join(args.save_dir, f"NonfuncParalog_diversify_random[L={L}].csv"), index=False)
 
 
@@ -853,7 +948,8 @@ def diversify_Sho1_orthology(
     ortholog_df = func_sho1_df.iloc[np.argmax(func_sho1_df['perc_min_leven[dissimilarity]']),:].to_frame().T
 
     # save dataframe
-    ortholog_df.to_csv(os.path.join(args.save_dir, f"Ortholog/Sho1Ortholog_diversify.csv"), index=False)
+    with telemetry.phase('io/write_csv'):
+        ortholog_df.to_csv(os.path.join(args.save_dir, f"Ortholog/Sho1Ortholog_diversify.csv"), index=False)
 
     # get sequence
     ortholog_seq = list(ortholog_df.Sequences_unaligned)
@@ -871,7 +967,8 @@ def diversify_Sho1_orthology(
                         seq_list=ortholog_seq,
                         max_seq_len=args.max_seq_len,
                         L=L,
-                        n=args.N
+                        n=args.N,
+                        streams=rng.spawn(args.gen_streams, f'ORTHOLOG[L={L}]')
         )
 
         # generate dataframes for the amino acid sequences that used latent conditioning
@@ -921,8 +1018,13 @@ def diversify_Sho1_orthology(
 if __name__ == '__main__':
 
     args = get_args()
-    ProtWaveVAE.set_GPU() # set GPU
+    if args.quantize:
+        args.DEVICE = 'cpu' # int8 kernels are CPU only
+    else:
+        ProtWaveVAE.set_GPU() # set GPU
     ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+    # per-sequence generation streams (chunk/process independent) or the global RNG
+    args.gen_streams = rng.Counter_streams(seed=args.gen_seed) if args.gen_seed >= 0 else None
    
     # get data
     train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
@@ -933,13 +1035,51 @@ if __name__ == '__main__':
     args.max_seq_len = max_seq_len 
     
     # get model
-    PL_model = ProtWaveVAE.get_model(
+    model = ProtWaveVAE.get_SS_model(
                             args=args,
                             protein_len=protein_len
     ).to(args.DEVICE)
-    model = PL_model.model
-    model.load_state_dict(torch.load(args.output_model_path))
+    model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
     
+    if args.quantize:
+        os.makedirs(args.save_dir, exist_ok=True)
+        model = quant.calibrate_and_quantize(
+                                args=args,
+                                model=model,
+                                X_train=train_dataset[0:][0],
+                                num_calib=args.num_calib
+        )
+    elif args.bf16:
+        prec.enable_bf16(model) # bfloat16 autocast on the model blocks
+
+    # per-phase timing (the submodule forwards of the generation loops are timed by hooks)
+    if args.profile:
+        telemetry.enable()
+    telemetry.instrument(model)
+
+    # largest latent-inference batch and generation chunk within the memory budget (with --gen_seed the designs do
+    # not depend on the chunking)
+    if args.auto_batch_size:
+        import protwavevae.batch_probe as batch_probe
+        with telemetry.phase('probe/batch_size'):
+            safe, records = batch_probe.probe_phases(
+                                        model=model,
+                                        protein_len=protein_len,
+                                        aa_labels=args.aa_labels,
+                                        DEVICE=args.DEVICE,
+                                        max_batches={
+                                            'infer': args.batch_size,
+                                            'generate': args.gen_chunk_size if args.gen_chunk_size > 0 else batch_probe.MAX_BATCH
+                                        },
+                                        budget_mb=args.mem_budget_mb
+            )
+        batch_probe.write_records(os.path.join(args.save_dir, 'generate_proteins_batch_probe.csv'), records)
+        if min(safe.values()) < 1:
+            raise RuntimeError('not even a batch of one fits into the memory budget (--mem_budget_mb)')
+        args.batch_size, args.gen_chunk_size = safe['infer'], safe['generate']
+        train_dataloader = batch_probe.rebatch(train_dataloader, args.batch_size)
+        valid_dataloader = batch_probe.rebatch(valid_dataloader, args.batch_size)
+
     # infer latent embeddings using pretrained model
     Zpred_train, Ytrain_true_dl, _, _ = infer_latents(
                           args=args,
@@ -988,3 +1128,6 @@ if __name__ == '__main__':
             model=model,
             aniso_dist=latent_func_aniso_dist
     )
+
+    os.makedirs(args.save_dir, exist_ok=True)
+    telemetry.write_summary(os.path.join(args.save_dir, 'generate_proteins.csv'))
@@ -2,26 +2,18 @@
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-# Pytorch lightning
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-
 import source.preprocess as prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_wrapper
+import source.quantize as quant
+import source.fold_bn as fold_bn
 import train_ProtWaveVAE as ProtWaveVAE
 import generate_proteins as gen_tools
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
@@ -92,11 +84,16 @@ def infer_latents(
     z = torch.zeros((data_size, args.z_dim))
     z_mean = torch.zeros((data_size, args.z_dim))
 
+    # only the encoder is needed: BatchNorm-folded copy, checked against the original on the first batch
+    X_check = dataloader.dataset[0:args.batch_size][0]
+    encoder = fold_bn.fold_encoder(model.inference, x_check=X_check.permute(0,2,1).to(args.DEVICE))
+
     for ii, batch in tqdm( enumerate(dataloader) ):
 
         X, _, _, _ = batch
 
-        logits_xrc_temp, _, _, z_temp, z_mean_temp, z_var_temp  = model(X.to(args.DEVICE))
+        z_mean_temp, z_var_temp = encoder(X.permute(0,2,1).to(args.DEVICE))
+        z_temp = model.reparam_trick(z_mean_temp, z_var_temp)
    
         # left and right indexes ... 
         left_idx = ii * args.batch_size
@@ -134,7 +131,10 @@ def save_df(
 if __name__ == '__main__':
 
     args = gen_tools.get_args()
-    ProtWaveVAE.set_GPU() # set GPU
+    if args.quantize:
+        args.DEVICE = 'cpu' # int8 kernels are CPU only
+    else:
+        ProtWaveVAE.set_GPU() # set GPU
     ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
     
     os.makedirs(args.save_dir, exist_ok=True)
@@ -144,13 +144,20 @@ if __name__ == '__main__':
     args.max_seq_len = max_seq_len 
     
     # get model
-    PL_model = ProtWaveVAE.get_model(
+    model = ProtWaveVAE.get_SS_model(
                             args=args,
                             protein_len=max_seq_len
     ).to(args.DEVICE)
-    model = PL_model.model
-    model.load_state_dict(torch.load(args.output_model_path))
+    model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
     
+    if args.quantize:
+        model = quant.calibrate_and_quantize(
+                                args=args,
+                                model=model,
+                                X_train=dataloader.dataset[0:][0],
+                                num_calib=args.num_calib
+        )
+
     print('Start inference')
 
     # infer latent embeddings using pretrained model
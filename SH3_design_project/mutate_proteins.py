@@ -1,28 +1,18 @@
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-# super Pytorch Lightning
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-
 import source.preprocess as prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_wrapper
+import source.rng_streams as rng
 import train_ProtWaveVAE as ProtWaveVAE
-import compute_design_pool_novelty as compute_pool_novelty
 import generate_proteins as gen_proteins
 import utils.tools as util_tools
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
@@ -89,6 +79,9 @@ def get_args() -> any:
     parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
     parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
     parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # reproducible generation
+    parser.add_argument('--gen_seed', default=-1, type=int, help='seed of the per-sequence generation streams (-1: global RNG)')
         
 
     args = parser.parse_args()
@@ -164,7 +157,9 @@ def guided_random_diver_gene(
                                             option='guided',
                                             design_seq_lens=design_seq_lens,
                                             ref_seq_len=seq_len,
-                                            num_gaps=num_gaps
+                                            num_gaps=num_gaps,
+                                            history=False,
+                                            streams=rng.spawn(args.gen_streams, f'guided_random[L={L}]')
     ).cpu()
     
     # include deletion gaps
@@ -230,6 +225,8 @@ if __name__ == '__main__':
 
     ProtWaveVAE.set_GPU() # set GPU
     ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+    # per-sequence generation streams (chunk/process independent) or the global RNG
+    args.gen_streams = rng.Counter_streams(seed=args.gen_seed) if args.gen_seed >= 0 else None
     
     # get data
     train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
@@ -240,14 +237,16 @@ if __name__ == '__main__':
     args.max_seq_len = max_seq_len 
     
     # get model
-    PL_model = ProtWaveVAE.get_model(
+    model = ProtWaveVAE.get_SS_model(
                             args=args,
                             protein_len=protein_len
     ).to(args.DEVICE)
-    model = PL_model.model
     model.load_state_dict(torch.load(args.output_model_path))
     
         
+    # numba-compiled novelty tools are only needed here (ref_seq users, e.g. dms_proteins, skip them)
+    import compute_design_pool_novelty as compute_pool_novelty
+
     filenames = args.filenames.split('|')
     L = [int(l) for l in args.L.split('|')]
     
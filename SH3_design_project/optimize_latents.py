@@ -0,0 +1,189 @@
+import torch
+from torch import nn
+
+import source.latent_opt as latent_opt
+import source.rng_streams as rng
+import source.fold_bn as fold_bn
+import train_ProtWaveVAE as ProtWaveVAE
+import generate_proteins as gen_proteins
+
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+
+
+def get_args() -> any:
+
+    # write output path name
+    parser = argparse.ArgumentParser()
+    
+    # path varibles
+    parser.add_argument('--dataset_path', default='./data/ACS_SynBio_SH3_dataset.csv')
+    parser.add_argument('--output_results_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.csv')
+    parser.add_argument('--output_model_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.pth')
+    parser.add_argument('--save_dir', default='./outputs/SH3_design_pool')
+    
+    # model training variables
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--batch_size', default=512, type=int, help='Size of the batch.')
+    parser.add_argument('--epochs', default=1000, type=int, help='Number of epochs')
+    parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
+    parser.add_argument('--DEVICE', default='cuda', help='Learning rate')
+    parser.add_argument('--dataset_split', default=1, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--N', default=100, type=int, help='Batch size')
+
+    # general architecture variables
+    parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
+    parser.add_argument('--num_classes', default=2, type=int, help='functional/nonfunctional labels')
+    parser.add_argument('--aa_labels', default=21, type=int, help='AA plus pad gap (20+1) labels')
+    
+    # encoder hyperparameters
+    parser.add_argument('--encoder_rates', default=5, type=int, help='dilation convolution depth')
+    parser.add_argument('--C_in', default=21, type=int, help='input feature depth')
+    parser.add_argument('--C_out', default=256, type=int, help='output feature depth')
+    parser.add_argument('--alpha', default=0.1, type=float, help='leaky Relu hyperparameter (optional)')
+    parser.add_argument('--enc_kernel', default=3, type=int, help='kernel filter size')
+    parser.add_argument('--num_fc', default=1, type=int, help='number of fully connect layers')
+      
+    # top model (discriminative decoder) hyperparameters
+    parser.add_argument('--disc_num_layers', default=2, type=int, help='depth of the discrim. top model')
+    parser.add_argument('--hidden_width', default=10, type=int, help='width of top model')
+    parser.add_argument('--p', default=0.3, type=float, help='top model dropout')
+
+    # decoder wavenet hyperparameters
+    parser.add_argument('--wave_hidden_state', default=256, type=int, help='no. filters for the dilated convolutions')
+    parser.add_argument('--head_hidden_state', default=128, type=int, help='no. filters for the WaveNets top model')
+    parser.add_argument('--num_dil_rates', default=8, type=int, help='depth of the WaveNet')
+    parser.add_argument('--dec_kernel_size', default=3, type=int, help='WaveNet kernel size')
+
+    # loss prefactor weights
+    parser.add_argument('--nll_weight', default=1., type=float, help='NLL prefactor weight')
+    parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
+    parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
+    parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # reproducible generation
+    parser.add_argument('--gen_seed', default=-1, type=int, help='seed of the per-sequence generation streams (-1: global RNG)')
+    parser.add_argument('--gen_chunk_size', default=0, type=int, help='no. sequences generated per chunk (0: all at once)')
+
+    # latent optimisation
+    parser.add_argument('--num_starts', default=4096, type=int, help='no. starting codes optimised in parallel')
+    parser.add_argument('--start_dist', default='func', help='prior (N(0, I)) | func (functional anisotropic Gaussian)')
+    parser.add_argument('--opt_steps', default=200, type=int, help='no. gradient ascent steps')
+    parser.add_argument('--opt_lr', default=0.05, type=float, help='gradient ascent (Adam) learning rate')
+    parser.add_argument('--prior_weight', default=1., type=float, help='prior log-density penalty weight')
+    parser.add_argument('--num_designs', default=300, type=int, help='no. optima decoded into the design pool')
+    parser.add_argument('--min_dist', default=0.1, type=float, help='min. latent distance between ranked optima')
+    parser.add_argument('--decode_option', default='categorical', help='categorical | greedy')
+
+    args = parser.parse_args()
+    
+    return args
+
+
+def start_codes(
+        args: any,
+        model: nn.Module,
+        train_dataloader: any,
+        valid_dataloader: any
+    ) -> torch.FloatTensor:
+
+    if args.start_dist == 'prior':
+        dist = torch.distributions.MultivariateNormal(torch.zeros(args.z_dim), torch.eye(args.z_dim))
+
+    elif args.start_dist == 'func':
+        # functional region of the latent space (as in generate_proteins)
+        Zpred_train, Ytrain_true_dl, _, _ = gen_proteins.infer_latents(
+                              args=args,
+                              model=model,
+                              train_dataloader=train_dataloader,
+                              valid_dataloader=valid_dataloader
+        )
+        dist = gen_proteins.create_func_aniso(
+                              Z=Zpred_train,
+                              Y=Ytrain_true_dl
+        )
+
+    else:
+        raise ValueError(f'Unknown start distribution: {args.start_dist}')
+
+    return gen_proteins.sample_latents(
+                    dist=dist,
+                    n=args.num_starts,
+                    streams=rng.spawn(args.gen_streams, 'LatentOpt[starts]')
+    )
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    ProtWaveVAE.set_GPU() # set GPU
+    ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+    # per-sequence generation streams (chunk/process independent) or the global RNG
+    args.gen_streams = rng.Counter_streams(seed=args.gen_seed) if args.gen_seed >= 0 else None
+    os.makedirs(os.path.join(args.save_dir, 'LatentOpt'), exist_ok=True)
+
+    # get data
+    train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
+    Xtrain, _, _, _ = train_dataloader.dataset[0:1]
+    max_seq_len = Xtrain.shape[1] # (B, L, 21)
+    args.max_seq_len = max_seq_len
+
+    # get model
+    model = ProtWaveVAE.get_SS_model(
+                            args=args,
+                            protein_len=protein_len
+    ).to(args.DEVICE)
+    model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
+    model.eval()
+
+    # optimise every start in one batch (discriminator only)
+    Z_start = start_codes(
+                    args=args,
+                    model=model,
+                    train_dataloader=train_dataloader,
+                    valid_dataloader=valid_dataloader
+    ).to(args.DEVICE)
+
+    Z_opt, J_opt, pred_opt = latent_opt.gradient_ascent(
+                    discriminator=model.discriminator,
+                    z_init=Z_start,
+                    steps=args.opt_steps,
+                    lr=args.opt_lr,
+                    prior_weight=args.prior_weight
+    )
+
+    top_idx = latent_opt.rank_optima(
+                    z=Z_opt,
+                    J=J_opt,
+                    num_designs=args.num_designs,
+                    min_dist=args.min_dist
+    )
+    Z_top, J_top, pred_top = Z_opt[top_idx], J_opt[top_idx], pred_opt[top_idx]
+
+    # decode the ranked optima only
+    X_designs = gen_proteins.generate_in_chunks(
+                    args=args,
+                    generate_func=model.sample,
+                    batch_tensors={'X_context': torch.zeros((Z_top.shape[0], max_seq_len, 21)), 'z': Z_top},
+                    streams=rng.spawn(args.gen_streams, f'LatentOpt[{args.decode_option}]'),
+                    option=args.decode_option
+    )
+    aa_seqs = gen_proteins.create_seqs(X=X_designs)
+
+    # discriminator at the re-encoded designs
+    X_decoded = gen_proteins.convert_list_to_tensor(aa_seqs, max_seq_len).permute(0,2,1).to(args.DEVICE)
+    encoder = fold_bn.fold_encoder(model.inference, x_check=X_decoded)
+    with torch.no_grad():
+        pred_decoded = model.discriminator.reg_forward(encoder(X_decoded)[0]).squeeze(-1)
+
+    design_df = latent_opt.design_pool_df(
+                    aa_seqs=aa_seqs,
+                    z=Z_top,
+                    J=J_top,
+                    pred=pred_top,
+                    pred_decoded=pred_decoded
+    )
+    design_df.to_csv(os.path.join(args.save_dir, f'LatentOpt/LatentOpt_Sho1Designs[{args.decode_option}].csv'), index=False)
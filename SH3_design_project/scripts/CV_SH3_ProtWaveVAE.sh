@@ -52,6 +52,8 @@ export gamma_weight=1.0
 
 # cross-validation
 export K=5
+export CV_workers=1 # >1: train folds in parallel processes
+export CV_threads=0 # threads per fold process (0: cores / CV_workers)
 
 python3 ../CV_ProtWaveVAE.py \
 		--dataset_path ${dataset_path} \
@@ -84,6 +86,8 @@ python3 ../CV_ProtWaveVAE.py \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
 		--K ${K} \
+		--CV_workers ${CV_workers} \
+		--CV_threads ${CV_threads} \
 
 
 
@@ -51,6 +51,17 @@ export MI_weight=0.99
 export lambda_weight=10.0
 export gamma_weight=1.0
 
+# inference precision (1: int8 quantized CPU inference)
+export quantize=0
+export num_calib=512
+
+# reproducible generation (gen_seed=-1: global RNG, gen_chunk_size=0: one batch)
+export gen_seed=-1
+export gen_chunk_size=0
+
+# mixed precision (1: bfloat16 autocast, 0: float32)
+export bf16=0
+
 
 python ../generate_proteins.py \
 		--dataset_path ${dataset_path} \
@@ -83,6 +94,11 @@ python ../generate_proteins.py \
                 --MI_weight ${MI_weight} \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
+                --quantize ${quantize} \
+                --num_calib ${num_calib} \
+                --gen_seed ${gen_seed} \
+                --gen_chunk_size ${gen_chunk_size} \
+                --bf16 ${bf16} \
 
 
 
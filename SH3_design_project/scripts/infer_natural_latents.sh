@@ -51,6 +51,10 @@ export MI_weight=0.99
 export lambda_weight=10.0
 export gamma_weight=1.0
 
+# inference precision (1: int8 quantized CPU inference)
+export quantize=0
+export num_calib=512
+
 
 python ../infer_latents.py \
 		--dataset_path ${dataset_path} \
@@ -83,6 +87,8 @@ python ../infer_latents.py \
                 --MI_weight ${MI_weight} \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
+                --quantize ${quantize} \
+                --num_calib ${num_calib} \
 
 
 
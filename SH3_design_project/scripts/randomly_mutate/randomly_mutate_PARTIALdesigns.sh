@@ -58,6 +58,9 @@ export MI_weight=0.99
 export lambda_weight=10.0
 export gamma_weight=1.0
 
+# per-sequence generation streams (-1: global RNG)
+export gen_seed=-1
+
 
 python ../../mutate_proteins.py \
 		--dataset_path ${dataset_path} \
@@ -96,6 +99,7 @@ python ../../mutate_proteins.py \
                 --MI_weight ${MI_weight} \
                 --lambda_weight ${lambda_weight} \
                 --gamma_weight ${gamma_weight} \
+                --gen_seed ${gen_seed} \
 
 
 
@@ -0,0 +1,124 @@
+import torch
+from torch import nn
+
+import source.serving as serving
+import train_ProtWaveVAE as ProtWaveVAE
+
+import argparse
+
+
+
+def get_args() -> any:
+
+    # write output path name
+    parser = argparse.ArgumentParser()
+    
+    # path varibles
+    parser.add_argument('--dataset_path', default='./data/ACS_SynBio_SH3_dataset.csv')
+    parser.add_argument('--output_results_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.csv')
+    parser.add_argument('--output_model_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.pth')
+    
+    # model training variables
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--batch_size', default=512, type=int, help='Size of the batch.')
+    parser.add_argument('--epochs', default=1000, type=int, help='Number of epochs')
+    parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
+    parser.add_argument('--DEVICE', default='cuda', help='Learning rate')
+    parser.add_argument('--dataset_split', default=1, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--N', default=100, type=int, help='Batch size')
+
+    # general architecture variables
+    parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
+    parser.add_argument('--num_classes', default=2, type=int, help='functional/nonfunctional labels')
+    parser.add_argument('--aa_labels', default=21, type=int, help='AA plus pad gap (20+1) labels')
+    
+    # encoder hyperparameters
+    parser.add_argument('--encoder_rates', default=5, type=int, help='dilation convolution depth')
+    parser.add_argument('--C_in', default=21, type=int, help='input feature depth')
+    parser.add_argument('--C_out', default=256, type=int, help='output feature depth')
+    parser.add_argument('--alpha', default=0.1, type=float, help='leaky Relu hyperparameter (optional)')
+    parser.add_argument('--enc_kernel', default=3, type=int, help='kernel filter size')
+    parser.add_argument('--num_fc', default=1, type=int, help='number of fully connect layers')
+      
+    # top model (discriminative decoder) hyperparameters
+    parser.add_argument('--disc_num_layers', default=2, type=int, help='depth of the discrim. top model')
+    parser.add_argument('--hidden_width', default=10, type=int, help='width of top model')
+    parser.add_argument('--p', default=0.3, type=float, help='top model dropout')
+
+    # decoder wavenet hyperparameters
+    parser.add_argument('--wave_hidden_state', default=256, type=int, help='no. filters for the dilated convolutions')
+    parser.add_argument('--head_hidden_state', default=128, type=int, help='no. filters for the WaveNets top model')
+    parser.add_argument('--num_dil_rates', default=8, type=int, help='depth of the WaveNet')
+    parser.add_argument('--dec_kernel_size', default=3, type=int, help='WaveNet kernel size')
+
+    # loss prefactor weights
+    parser.add_argument('--nll_weight', default=1., type=float, help='NLL prefactor weight')
+    parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
+    parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
+    parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # serving variables
+    parser.add_argument('--checkpoints', default='', help='name=path pairs split by | (default: output_model_path)')
+    parser.add_argument('--host', default='127.0.0.1', help='localhost address of the HTTP server')
+    parser.add_argument('--port', default=8765, type=int, help='port of the HTTP server')
+    parser.add_argument('--socket_path', default='', help='serve on this Unix socket instead of HTTP')
+    parser.add_argument('--max_batch_rows', default=256, type=int, help='max. no. sequences/codes per micro-batch')
+    parser.add_argument('--max_wait_ms', default=10., type=float, help='max. time a request waits for others to batch with')
+
+    args = parser.parse_args()
+    
+    return args
+
+
+def load_checkpoints(
+        args: any,
+        protein_len: int
+    ) -> dict:
+
+    checkpoints = args.checkpoints.split('|') if args.checkpoints != '' else [f'default={args.output_model_path}']
+
+    models = {}
+    for checkpoint in checkpoints:
+        name, path = checkpoint.split('=', 1)
+        model = ProtWaveVAE.get_SS_model(
+                                args=args,
+                                protein_len=protein_len
+        ).to(args.DEVICE)
+        model.load_state_dict(torch.load(path, map_location=args.DEVICE))
+        models[name] = model.eval()
+
+    return models
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    if args.DEVICE == 'cuda':
+        ProtWaveVAE.set_GPU() # set GPU
+    ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+
+    # sequence length and model sizes come from the training data (as in the other entry points)
+    train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
+    Xtrain, _, _, _ = train_dataloader.dataset[0:1]
+    max_seq_len = Xtrain.shape[1] # (B, L, 21)
+    args.max_seq_len = max_seq_len
+
+    model_server = serving.ModelServer(
+                        args=args,
+                        models=load_checkpoints(args=args, protein_len=protein_len),
+                        max_seq_len=max_seq_len,
+                        max_batch_rows=args.max_batch_rows,
+                        max_wait_ms=args.max_wait_ms
+    )
+
+    server = serving.make_server(
+                        model_server=model_server,
+                        host=args.host,
+                        port=args.port,
+                        socket_path=args.socket_path
+    )
+    print(f'Serving {list(model_server.models)} on {args.socket_path or f"http://{args.host}:{args.port}"}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,204 @@
+"""
+@summary: in-silico deep mutational scan around a reference sequence. Every single (and optionally double) mutant is
+scored with
+    - the latent discriminator: Decoder_re.reg_forward on the mutant's posterior mean (BatchNorm-folded encoder),
+    - the decoder log-likelihood ratio log p(x_mut|z_ref) - log p(x_ref|z_ref) under the reference latent code.
+Because the WaveNet is causal with a finite receptive field R, a mutation at position i only changes the
+log-probabilities of positions i..i+R. The reference log-probabilities are cached once and a single mutant only
+decodes a window of 2R+1 positions around i (the shared prefix and the suffix are reused from the cache).
+"""
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+import numpy as np
+import pandas as pd
+
+import source.fold_bn as fold_bn
+
+
+AA_ALPHABET = 'ACDEFGHIKLMNPQRSTVWY-' # token 20: pad
+
+
+def receptive_field(generator: nn.Module) -> int:
+    # no. previous positions seen by the WaveNet logits (every causal layer reaches back `padding` positions)
+    return sum(conv.padding[0] for conv in generator.wave_head.signal_convs)
+
+
+def token_log_probs(logits: torch.FloatTensor, tokens: torch.LongTensor) -> torch.FloatTensor:
+    # log p(x_t|x_<t, z) of the given tokens: logits [B, 21, L], tokens [B, L] -> [B, L]
+    return -F.cross_entropy(logits, tokens, reduction = 'none')
+
+
+class DMS_scanner:
+    """
+    class description: scores the mutants of one reference sequence (padded to max_seq_len) in batches.
+    """
+    def __init__(
+            self,
+            args: any,
+            model: nn.Module,
+            ref_seq: str,
+            max_seq_len: int,
+            batch_size: int=256
+        ):
+
+        self.args = args
+        self.model = model.eval()
+        self.ref_seq = ref_seq
+        self.L = max_seq_len
+        self.batch_size = batch_size
+        self.DEVICE = args.DEVICE
+
+        # reference tokens and latent code
+        ref_padded = ref_seq + '-' * (max_seq_len - len(ref_seq))
+        self.ref_tokens = torch.tensor([AA_ALPHABET.index(aa) for aa in ref_padded], device = self.DEVICE)
+        self.encoder = fold_bn.fold_encoder(model.inference, x_check=self.onehot(self.ref_tokens.unsqueeze(0)))
+        with torch.no_grad():
+            self.z_ref = self.encoder(self.onehot(self.ref_tokens.unsqueeze(0)))[0] # posterior mean [1, z_dim]
+            self.z_context = model.cond_mapper(self.z_ref) # [1, 1, L]
+
+            # cached reference log-probabilities [L, 21] and per-position terms [L]
+            logits = model.generator(self.onehot(self.ref_tokens.unsqueeze(0)), self.z_context)
+            self.ref_log_probs = logits.log_softmax(dim = 1)[0].T
+            self.ref_terms = self.ref_log_probs.gather(1, self.ref_tokens.unsqueeze(1)).squeeze(1)
+            self.ref_pheno = model.discriminator.reg_forward(self.z_ref).item()
+
+        # decoding window of a single mutant
+        self.R = receptive_field(model.generator)
+        self.W = min(self.L, 2 * self.R + 1)
+
+    def onehot(self, tokens: torch.LongTensor) -> torch.FloatTensor:
+        # [B, L] -> [B, 21, L] (channels first, as the encoder/generator expect)
+        return F.one_hot(tokens, num_classes = len(AA_ALPHABET)).float().permute(0, 2, 1)
+
+    def single_mutants(self) -> list:
+        # every substitution of the unpadded reference by one of the 20 amino acids
+        return [
+                (pos, aa)
+                for pos in range(len(self.ref_seq))
+                for aa in range(len(AA_ALPHABET) - 1)
+                if aa != self.ref_tokens[pos].item()
+        ]
+
+    @torch.no_grad()
+    def pheno_scores(self, tokens: torch.LongTensor) -> torch.FloatTensor:
+        # discriminator prediction at the mutants' posterior means
+        z_mu, _ = self.encoder(self.onehot(tokens))
+        return self.model.discriminator.reg_forward(z_mu).squeeze(-1)
+
+    @torch.no_grad()
+    def single_loglik(
+            self,
+            positions: torch.LongTensor,
+            aas: torch.LongTensor
+        ) -> torch.FloatTensor:
+        """
+        function description: log-likelihood ratios of single mutants, decoding only the [s, s+W) window
+        that contains i-R..i+R (every position the mutation can change, with its full receptive field).
+        """
+        B = positions.shape[0]
+        starts = (positions + 1 - self.R).clamp(min = 0, max = self.L - self.W)
+        window = starts.unsqueeze(1) + torch.arange(self.W, device = self.DEVICE) # [B, W]
+
+        tokens = self.ref_tokens[window].clone()
+        tokens[torch.arange(B, device = self.DEVICE), positions - starts] = aas
+        z_context = self.z_context[0, 0][window].unsqueeze(1) # [B, 1, W]
+        new_terms = token_log_probs(self.model.generator(self.onehot(tokens), z_context), tokens)
+
+        # positions i+1..i+R are re-scored; position i keeps its cached logits with the new target
+        changed = (window > positions.unsqueeze(1)) & (window <= positions.unsqueeze(1) + self.R)
+        delta = ((new_terms - self.ref_terms[window]) * changed).sum(dim = 1)
+        return delta + self.ref_log_probs[positions, aas] - self.ref_terms[positions]
+
+    @torch.no_grad()
+    def full_loglik(self, tokens: torch.LongTensor) -> torch.FloatTensor:
+        # log-likelihood ratios with a full decoder pass (used for the double mutants)
+        logits = self.model.generator(self.onehot(tokens), self.z_context.expand(tokens.shape[0], -1, -1))
+        return token_log_probs(logits, tokens).sum(dim = 1) - self.ref_terms.sum()
+
+    def mutate(self, mutations: list) -> torch.LongTensor:
+        # reference tokens with the (pos, aa) substitutions applied: one row per mutant
+        tokens = self.ref_tokens.unsqueeze(0).repeat(len(mutations), 1)
+        for row, mutant in enumerate(mutations):
+            for pos, aa in mutant:
+                tokens[row, pos] = aa
+        return tokens
+
+    def scan_singles(
+            self,
+            loglik_path: str=None,
+            pheno_path: str=None
+        ) -> pd.DataFrame:
+        """
+        function description: scores every single mutant. The position x residue matrices ([L, 21], NaN for the
+        reference residue) are streamed into .npy memmaps batch by batch when paths are given.
+        """
+        mutants = self.single_mutants()
+        shape = (len(self.ref_seq), len(AA_ALPHABET))
+        loglik_matrix = np.lib.format.open_memmap(loglik_path, mode = 'w+', dtype = np.float32, shape = shape) if loglik_path else np.zeros(shape, dtype = np.float32)
+        pheno_matrix = np.lib.format.open_memmap(pheno_path, mode = 'w+', dtype = np.float32, shape = shape) if pheno_path else np.zeros(shape, dtype = np.float32)
+        loglik_matrix[:], pheno_matrix[:] = np.nan, np.nan
+
+        rows = []
+        for start in range(0, len(mutants), self.batch_size):
+            batch = mutants[start:start+self.batch_size]
+            positions = torch.tensor([pos for pos, _ in batch], device = self.DEVICE)
+            aas = torch.tensor([aa for _, aa in batch], device = self.DEVICE)
+
+            loglik = self.single_loglik(positions, aas).cpu().numpy()
+            pheno = self.pheno_scores(self.mutate([[mutant] for mutant in batch])).cpu().numpy()
+
+            loglik_matrix[positions.cpu().numpy(), aas.cpu().numpy()] = loglik
+            pheno_matrix[positions.cpu().numpy(), aas.cpu().numpy()] = pheno
+            for (pos, aa), ll, y in zip(batch, loglik, pheno):
+                rows.append(
+                        {
+                            'mutation': f'{self.ref_seq[pos]}{pos+1}{AA_ALPHABET[aa]}',
+                            'position': pos + 1,
+                            'ref_aa': self.ref_seq[pos],
+                            'mut_aa': AA_ALPHABET[aa],
+                            'delta_loglik': ll,
+                            'pheno_pred': y,
+                            'delta_pheno': y - self.ref_pheno
+                        }
+                )
+
+            if isinstance(loglik_matrix, np.memmap):
+                loglik_matrix.flush()
+            if isinstance(pheno_matrix, np.memmap):
+                pheno_matrix.flush()
+
+        return pd.DataFrame(rows)
+
+    def scan_doubles(self, positions: list) -> pd.DataFrame:
+        """
+        function description: scores every double mutant over pairs of the given (0-indexed) positions.
+        """
+        mutants = [
+                ((p1, a1), (p2, a2))
+                for ii, p1 in enumerate(positions)
+                for p2 in positions[ii+1:]
+                for a1 in range(len(AA_ALPHABET) - 1) if a1 != self.ref_tokens[p1].item()
+                for a2 in range(len(AA_ALPHABET) - 1) if a2 != self.ref_tokens[p2].item()
+        ]
+
+        rows = []
+        for start in range(0, len(mutants), self.batch_size):
+            batch = mutants[start:start+self.batch_size]
+            tokens = self.mutate(batch)
+            loglik = self.full_loglik(tokens).cpu().numpy()
+            pheno = self.pheno_scores(tokens).cpu().numpy()
+
+            for ((p1, a1), (p2, a2)), ll, y in zip(batch, loglik, pheno):
+                rows.append(
+                        {
+                            'mutation': f'{self.ref_seq[p1]}{p1+1}{AA_ALPHABET[a1]}:{self.ref_seq[p2]}{p2+1}{AA_ALPHABET[a2]}',
+                            'delta_loglik': ll,
+                            'pheno_pred': y,
+                            'delta_pheno': y - self.ref_pheno
+                        }
+                )
+
+        return pd.DataFrame(rows)
@@ -0,0 +1,42 @@
+"""
+@summary: adapter around the shared BatchNorm folding (protwavevae.fold_bn). The SH3 encoder feeds the gated
+features straight to the heads in forward and uses the fc layers only in mode_prediction, so its folded copy does
+the same.
+"""
+
+import torch
+
+import source.model_components as model_comps
+from protwavevae.fold_bn import (
+        FOLDED_CLASSES,
+        encoder_drift,
+        is_foldable,
+        fold_encoder
+)
+import protwavevae.fold_bn as core
+
+
+class Folded_GatedCNN_encoder(core.Folded_GatedCNN_encoder):
+
+    def forward(
+            self,
+            x: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+        # GatedCNN_encoder.forward feeds the gated features straight to the heads (its fc outputs are unused)
+        enc_out = self.gated_features(x)
+        return (
+                self.q_z_mean(enc_out),
+                self.q_z_var(enc_out)
+        )
+
+    def mode_prediction(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        enc_out = self.gated_features(x)
+        for ii in range(self.num_fc):
+            enc_out = self.lrelu(self.encoder_fully_connected[ii](enc_out))
+        return self.q_z_mean(enc_out)
+
+
+FOLDED_CLASSES[model_comps.GatedCNN_encoder] = Folded_GatedCNN_encoder
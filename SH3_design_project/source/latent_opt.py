@@ -0,0 +1,133 @@
+"""
+@summary: latent-space optimisation for design. Thousands of starting codes are optimised together as one [N, z_dim]
+tensor by gradient ascent (Adam) on
+    J(z) = Decoder_re.reg_forward(z) + prior_weight * log N(z; 0, I)
+i.e. the differentiable discriminator's prediction with a prior-density penalty that keeps the optima in regions the
+decoder has seen. Only the discriminator is evaluated during the search; the generator decodes the final optima.
+"""
+
+import math
+
+import torch
+from torch import nn
+
+import pandas as pd
+
+
+def prior_log_density(z: torch.FloatTensor) -> torch.FloatTensor:
+    # log N(z; 0, I) per code: [N, z_dim] -> [N]
+    return -0.5 * (z ** 2).sum(dim = -1) - 0.5 * z.shape[-1] * math.log(2 * math.pi)
+
+
+def objective(
+        discriminator: nn.Module,
+        z: torch.FloatTensor,
+        prior_weight: float=1.
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    # penalised objective and the raw discriminator prediction, both [N]
+    pred = discriminator.reg_forward(z).squeeze(-1)
+    return (
+            pred + prior_weight * prior_log_density(z),
+            pred
+    )
+
+
+def gradient_ascent(
+        discriminator: nn.Module,
+        z_init: torch.FloatTensor,
+        steps: int=200,
+        lr: float=0.05,
+        prior_weight: float=1.
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    """
+    function description: multi-start gradient ascent of every row of z_init at once. Only z is updated (the
+    discriminator weights are frozen and get no gradients). Returns the best code of every start with its
+    objective and discriminator prediction.
+    """
+    discriminator.eval()
+    z = z_init.detach().clone().requires_grad_(True)
+    optimizer = torch.optim.Adam([z], lr = lr)
+
+    z_best = z.detach().clone()
+    J_best = torch.full((z.shape[0],), -float('inf'), device = z.device)
+    pred_best = torch.zeros(z.shape[0], device = z.device)
+
+    for _ in range(steps + 1):
+        with torch.enable_grad():
+            J, pred = objective(discriminator, z, prior_weight)
+            grad, = torch.autograd.grad(J.sum(), z)
+
+        # keep the best iterate of every start
+        improved = J.detach() > J_best
+        z_best[improved] = z.detach()[improved]
+        J_best[improved] = J.detach()[improved]
+        pred_best[improved] = pred.detach()[improved]
+
+        # ascent step (Adam minimises)
+        optimizer.zero_grad()
+        z.grad = -grad
+        optimizer.step()
+
+    return (
+            z_best,
+            J_best,
+            pred_best
+    )
+
+
+def rank_optima(
+        z: torch.FloatTensor,
+        J: torch.FloatTensor,
+        num_designs: int,
+        min_dist: float=0.
+    ) -> torch.LongTensor:
+    """
+    function description: indices of the num_designs best optima by objective. Starts that converged to the same
+    optimum are dropped greedily: an optimum closer than min_dist to a better one is skipped.
+    """
+    order = torch.argsort(J, descending = True)
+    if min_dist <= 0:
+        return order[:num_designs]
+
+    keep = []
+    for idx in order.tolist():
+        if keep and torch.cdist(z[idx].unsqueeze(0), z[keep]).min() < min_dist:
+            continue
+        keep.append(idx)
+        if len(keep) == num_designs:
+            break
+    return torch.tensor(keep, dtype = torch.long, device = z.device)
+
+
+def design_pool_df(
+        aa_seqs: list,
+        z: torch.FloatTensor,
+        J: torch.FloatTensor,
+        pred: torch.FloatTensor,
+        pred_decoded: torch.FloatTensor
+    ) -> pd.DataFrame:
+    """
+    function description: ranked design pool; pred is the discriminator at the optimised code, pred_decoded the
+    discriminator at the re-encoded design (a check that the decoded sequence keeps the predicted phenotype).
+    """
+    design_df = pd.DataFrame(
+            {
+                'header': [f'seq_{ii}' for ii in range(len(aa_seqs))],
+                'unaligned_sequence': aa_seqs,
+                'rank': list(range(1, len(aa_seqs) + 1)),
+                'objective': J.cpu().numpy(),
+                'pheno_pred[z]': pred.cpu().numpy(),
+                'pheno_pred[decoded]': pred_decoded.cpu().numpy(),
+                'prior_log_density': prior_log_density(z).cpu().numpy()
+            }
+    )
+    for ii in range(z.shape[-1]):
+        design_df[f'z_{ii}'] = z[:, ii].cpu().numpy()
+    return design_df
@@ -0,0 +1,218 @@
+"""
+@summary: batched latent-space sweeps for a trained SS_InfoVAE. A sweep is a set of z points (grid, straight line
+or slerp interpolation, or samples from a region such as the functional anisotropic Gaussian); the points are
+de-duplicated, decoded in batches sized to a memory budget and cached on disk keyed by
+(checkpoint, z, seed, decoding options), so that repeated explorations reuse the earlier decodes.
+"""
+
+import hashlib
+import os
+
+import torch
+from torch import nn
+
+import numpy as np
+
+import source.rng_streams as rng
+
+
+# bumped whenever model.sample decodes differently, so that stale cache entries are not reused
+# (2: the decoding option applies to every position, not only the first one)
+DECODE_VERSION = 2
+
+
+def grid_points(
+        z_dim: int,
+        dims: list,
+        lower: float=-3.,
+        upper: float=3.,
+        num_points: int=11,
+        anchor: torch.FloatTensor=None
+    ) -> torch.FloatTensor:
+    """
+    function description: regular grid over the latent dimensions in dims (num_points per dimension between lower and
+    upper); the remaining dimensions are held at the anchor (origin by default). A single dimension is an axis traversal.
+    """
+    anchor = torch.zeros(z_dim) if anchor is None else anchor.float().cpu()
+    axis = torch.linspace(lower, upper, num_points)
+
+    # cartesian product of the swept axes
+    mesh = torch.meshgrid(*[axis for _ in dims]) if len(dims) > 1 else (axis,)
+    Z = anchor.unsqueeze(0).repeat(num_points ** len(dims), 1)
+    for dim, coords in zip(dims, mesh):
+        Z[:, dim] = coords.reshape(-1)
+
+    return Z
+
+
+def line_points(
+        z_start: torch.FloatTensor,
+        z_end: torch.FloatTensor,
+        num_points: int=11
+    ) -> torch.FloatTensor:
+    """
+    function description: straight-line interpolation between two latent codes (end points included).
+    """
+    t = torch.linspace(0., 1., num_points).unsqueeze(-1)
+    return (1 - t) * z_start.float().cpu() + t * z_end.float().cpu()
+
+
+def slerp_points(
+        z_start: torch.FloatTensor,
+        z_end: torch.FloatTensor,
+        num_points: int=11,
+        eps: float=1e-6
+    ) -> torch.FloatTensor:
+    """
+    function description: spherical interpolation between two latent codes, which keeps the path at a typical
+    prior radius instead of cutting through the low-density origin. Falls back to a line for (anti)parallel codes.
+    """
+    z_start, z_end = z_start.float().cpu(), z_end.float().cpu()
+
+    cos_omega = torch.dot(z_start, z_end) / (z_start.norm() * z_end.norm()).clamp(min = eps)
+    omega = torch.acos(cos_omega.clamp(-1., 1.))
+    if torch.sin(omega).abs() < eps:
+        return line_points(z_start, z_end, num_points)
+
+    t = torch.linspace(0., 1., num_points).unsqueeze(-1)
+    return (torch.sin((1 - t) * omega) * z_start + torch.sin(t * omega) * z_end) / torch.sin(omega)
+
+
+def region_points(
+        dist: torch.distributions.Distribution,
+        num_points: int=100
+    ) -> torch.FloatTensor:
+    """
+    function description: random points from a latent region, e.g. the functional anisotropic Gaussian.
+    """
+    return dist.sample((num_points,)).float().cpu()
+
+
+def checkpoint_fingerprint(
+        checkpoint_path: str=None,
+        model: nn.Module=None
+    ) -> str:
+    """
+    function description: content hash of the checkpoint file (or of the in-memory weights when no file is given).
+    """
+    sha = hashlib.sha1()
+    if checkpoint_path is not None:
+        with open(checkpoint_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+    else:
+        for name, tensor in model.state_dict().items():
+            sha.update(name.encode())
+            sha.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return sha.hexdigest()
+
+
+class LatentSweep:
+    """
+    class description: decodes z points with model.sample and keeps the final tokens in a cache shared across sweeps.
+    Rows are rounded to `decimals` before hashing so that numerically identical points are decoded once. Each point
+    draws from its own counter-based stream (derived from its cache key), so a decode does not depend on the batch.
+    """
+    def __init__(
+            self,
+            args: any,
+            model: nn.Module,
+            max_seq_len: int,
+            checkpoint_path: str=None,
+            cache_dir: str=None,
+            memory_budget: int=1 << 30,
+            option: str='categorical',
+            seed: int=42,
+            decimals: int=5
+        ):
+
+        self.args = args
+        self.model = model
+        self.max_seq_len = max_seq_len
+        self.memory_budget = memory_budget
+        self.option = option
+        self.seed = seed
+        self.decimals = decimals
+        self.fingerprint = checkpoint_fingerprint(checkpoint_path = checkpoint_path, model = model)
+        self.streams = rng.Counter_streams(seed = seed)
+
+        # decode cache: key -> uint8 token tensor [L]
+        self.cache = {}
+        self.cache_path = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok = True)
+            self.cache_path = os.path.join(cache_dir, f'latent_sweep_{self.fingerprint[:16]}.pt')
+            if os.path.exists(self.cache_path):
+                self.cache = torch.load(self.cache_path)
+
+    def bytes_per_sequence(self) -> int:
+        # model.sample keeps the [L+1, L, 21] history per sequence plus the WaveNet activations of one forward pass
+        L, aa_labels = self.max_seq_len, self.args.aa_labels
+        wave_activations = L * (2 * self.args.wave_hidden_state * self.args.num_dil_rates + self.args.head_hidden_state)
+        return 4 * ((L + 1) * L * aa_labels + 3 * L * aa_labels + wave_activations)
+
+    def batch_size(self) -> int:
+        return max(1, int(self.memory_budget // self.bytes_per_sequence()))
+
+    def key(self, z: torch.FloatTensor) -> str:
+        sha = hashlib.sha1()
+        sha.update(self.fingerprint.encode())
+        sha.update(z.numpy().astype(np.float32).tobytes())
+        sha.update(f'{self.seed}|{self.option}|{self.max_seq_len}|v{DECODE_VERSION}'.encode())
+        return sha.hexdigest()
+
+    @torch.no_grad()
+    def decode(
+            self,
+            Z: torch.FloatTensor,
+            seq_ids: torch.LongTensor
+        ) -> torch.ByteTensor:
+        """
+        function description: decode z points (no cache lookup) in memory-budgeted batches; returns tokens [n, L].
+        """
+        tokens = []
+        for Z_batch, ids_batch in zip(torch.split(Z, self.batch_size()), torch.split(seq_ids, self.batch_size())):
+            X_context = torch.zeros((Z_batch.shape[0], self.max_seq_len, self.args.aa_labels)).to(self.args.DEVICE)
+            X_samples = self.model.sample(
+                        args = self.args,
+                        X_context = X_context,
+                        z = Z_batch.to(self.args.DEVICE),
+                        option = self.option,
+                        streams = self.streams,
+                        seq_ids = ids_batch
+            )
+            tokens.append(X_samples[:, -1].argmax(dim = -1).to(torch.uint8).cpu())
+        return torch.cat(tokens)
+
+    def save_cache(self) -> None:
+        if self.cache_path is None:
+            return
+        tmp_path = self.cache_path + '.tmp'
+        torch.save(self.cache, tmp_path)
+        os.replace(tmp_path, self.cache_path) # atomic: an interrupted save keeps the previous cache
+
+    def run(self, Z: torch.FloatTensor) -> torch.ByteTensor:
+        """
+        function description: tokens [n, L] for every row of Z; unique, uncached points are the only ones decoded.
+        """
+        Z = torch.round(Z.float().cpu() * 10 ** self.decimals) / 10 ** self.decimals
+        Z_unique, inverse = torch.unique(Z, dim = 0, return_inverse = True)
+        keys = [self.key(z) for z in Z_unique]
+
+        missing = [ii for ii, key in enumerate(keys) if key not in self.cache]
+        print(f'Latent sweep: {Z.shape[0]} points, {Z_unique.shape[0]} unique, {len(missing)} to decode')
+
+        if len(missing) > 0:
+            # stream id of a point: leading 60 bits of its cache key
+            seq_ids = torch.tensor([int(keys[ii][:15], 16) for ii in missing], dtype = torch.long)
+            new_tokens = self.decode(Z_unique[missing], seq_ids)
+            for ii, tokens in zip(missing, new_tokens):
+                self.cache[keys[ii]] = tokens.clone()
+            self.save_cache()
+
+        tokens_unique = torch.stack([self.cache[key] for key in keys])
+        return tokens_unique[inverse]
+
+    def run_onehot(self, Z: torch.FloatTensor) -> torch.FloatTensor:
+        # one-hot tensors [n, 1, L, 21] (same last-index layout as model.sample, e.g. for create_seqs)
+        return torch.eye(self.args.aa_labels)[self.run(Z).long()].unsqueeze(1)
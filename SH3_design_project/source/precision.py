@@ -0,0 +1,9 @@
+"""
+@summary: adapter around the shared bfloat16 mixed precision (protwavevae.precision).
+"""
+
+from protwavevae.precision import (
+        bf16_available,
+        bf16_flag,
+        enable_bf16
+)
@@ -0,0 +1,32 @@
+"""
+@summary: adapter around the shared int8 quantization (protwavevae.quantize); the drift report is written into
+args.save_dir.
+"""
+
+import torch
+from torch import nn
+
+from protwavevae.quantize import (
+        Conv1x1_linear,
+        is_pointwise_conv,
+        convert_pointwise_convs,
+        quantize_model,
+        calibration_scores,
+        quantization_drift
+)
+import protwavevae.quantize as core
+
+
+def calibrate_and_quantize(
+        args: any,
+        model: nn.Module,
+        X_train: torch.FloatTensor,
+        num_calib: int=512
+    ) -> nn.Module:
+
+    return core.calibrate_and_quantize(
+            model = model,
+            X_train = X_train,
+            drift_path = f'{args.save_dir}/quantization_drift.csv',
+            num_calib = num_calib
+    )
@@ -0,0 +1,126 @@
+"""
+@summary: counter-based random streams for reproducible generation. Every random number used to generate a
+sequence is a hash of (key, sequence id, stream, counter), so a sequence only depends on its own id and not on
+how the run was split into batches, chunks or processes: a chunked/parallel run reproduces the serial designs.
+"""
+
+import hashlib
+
+import torch
+import numpy as np
+
+
+# stream ids (one independent stream per use)
+TOKEN_STREAM = 1 # amino acid draws (one counter per position)
+POSITION_STREAM = 2 # positions picked for mutation
+LATENT_STREAM = 3 # latent codes drawn from a prior/region
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer (uint64 arithmetic wraps around)
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+def _tag_hash(tag: str) -> np.uint64:
+    return np.uint64(int(hashlib.sha1(tag.encode()).hexdigest()[:16], 16))
+
+
+class Counter_streams:
+    """
+    class description: per-sequence random streams derived from one key. The key comes from an integer seed or is
+    drawn once from an explicit np.random.Generator / torch.Generator; pass the same object to every chunk/worker.
+    """
+    def __init__(
+            self,
+            seed: int=None,
+            generator: any=None
+        ):
+
+        if isinstance(generator, np.random.Generator):
+            seed = int(generator.integers(0, 2**63))
+        elif isinstance(generator, torch.Generator):
+            seed = int(torch.randint(0, 2**62, (1,), generator = generator).item())
+        elif seed is None:
+            raise ValueError('Counter_streams needs a seed or a generator')
+
+        with np.errstate(over = 'ignore'):
+            self.key = _mix(np.array([seed], dtype = np.uint64))[0]
+
+    def spawn(self, tag: str) -> 'Counter_streams':
+        """
+        function description: independent streams for another use of the same run (e.g. f'WT[L={L}]').
+        """
+        child = Counter_streams(seed = 0)
+        with np.errstate(over = 'ignore'):
+            child.key = _mix(np.array([self.key ^ _tag_hash(tag)], dtype = np.uint64))[0]
+        return child
+
+    def uniform(
+            self,
+            seq_ids: torch.LongTensor,
+            counters: torch.LongTensor,
+            stream: int=TOKEN_STREAM
+        ) -> torch.DoubleTensor:
+        """
+        function description: uniforms in [0, 1) of shape [len(seq_ids), len(counters)].
+        """
+        seq_ids = np.asarray(torch.as_tensor(seq_ids).cpu(), dtype = np.uint64).reshape(-1, 1)
+        counters = np.asarray(torch.as_tensor(counters).cpu(), dtype = np.uint64).reshape(1, -1)
+
+        with np.errstate(over = 'ignore'):
+            h = _mix(self.key + seq_ids * _GOLDEN)
+            h = _mix(h + np.uint64(stream) * _GOLDEN)
+            h = _mix(h + counters * _GOLDEN)
+
+        # top 53 bits -> double in [0, 1)
+        return torch.from_numpy((h >> np.uint64(11)).astype(np.float64) * 2.**-53)
+
+    def normal(
+            self,
+            seq_ids: torch.LongTensor,
+            dim: int,
+            stream: int=LATENT_STREAM
+        ) -> torch.DoubleTensor:
+        # Box-Muller on two uniforms per coordinate
+        u = self.uniform(seq_ids, torch.arange(2 * dim), stream = stream)
+        u1, u2 = 1. - u[:, :dim], u[:, dim:] # u1 in (0, 1]
+        return torch.sqrt(-2. * torch.log(u1)) * torch.cos(2. * np.pi * u2)
+
+    def token_uniforms(self, seq_ids: torch.LongTensor, length: int) -> torch.DoubleTensor:
+        return self.uniform(seq_ids, torch.arange(length), stream = TOKEN_STREAM)
+
+    def position_uniforms(self, seq_ids: torch.LongTensor, length: int) -> torch.DoubleTensor:
+        return self.uniform(seq_ids, torch.arange(length), stream = POSITION_STREAM)
+
+    def torch_generator(self, seq_id: int) -> torch.Generator:
+        """
+        function description: a torch.Generator owned by a single sequence (for code that needs a Generator object).
+        """
+        seed = int(self.uniform(torch.tensor([seq_id]), torch.tensor([0]), stream = 0).item() * 2**53)
+        return torch.Generator().manual_seed(seed)
+
+
+def sample_mvn(
+        dist: torch.distributions.multivariate_normal.MultivariateNormal,
+        streams: Counter_streams,
+        seq_ids: torch.LongTensor
+    ) -> torch.FloatTensor:
+    """
+    function description: one draw of dist per sequence id (reparameterized with the sequence's own normals).
+    """
+    eps = streams.normal(seq_ids, dim = dist.loc.shape[-1]).to(dist.loc.dtype)
+    return dist.loc + eps @ dist.scale_tril.T
+
+
+def spawn(
+        streams: Counter_streams,
+        tag: str
+    ) -> Counter_streams:
+    # child streams, or None when generation runs on the global RNG
+    return None if streams is None else streams.spawn(tag)
@@ -0,0 +1,311 @@
+"""
+@summary: long-running model server. Checkpoints are loaded once and kept warm; concurrent requests are coalesced
+into micro-batches: a request waits at most max_wait_ms for others of the same kind (endpoint + options) and a
+batch holds at most max_batch_rows sequences/codes. Endpoints (JSON over localhost HTTP or a Unix socket):
+    POST /encode    {"sequences": [...]}
+                    -> latent means and variances
+    POST /score     {"sequences": [...]}
+                    -> discriminator prediction at the latent mean and log p(x|z_mean) under the decoder
+    POST /sample    {"z": [[...], ...], "n": 1, "option": "categorical"}
+                    -> sequences
+    POST /diversify {"sequence": "...", "z": [[...], ...], "n": 1, "L": 1, "option": "categorical"}
+                    -> sequences
+    GET  /health    -> loaded checkpoints
+Every POST takes an optional "model" (checkpoint name, default: the first one).
+"""
+
+import collections
+import json
+import os
+import socketserver
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+import source.fold_bn as fold_bn
+
+
+AA_ALPHABET = 'ACDEFGHIKLMNPQRSTVWY-' # token 20: pad
+
+
+class _Request:
+
+    def __init__(self, key: tuple, payload: dict, n_rows: int):
+        self.key = key
+        self.payload = payload
+        self.n_rows = n_rows
+        self.arrival = time.monotonic()
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    class description: one worker thread that runs run_batch(key, payloads) -> results on coalesced requests.
+    The oldest pending key is served first; its batch is closed once max_batch_rows rows are pending or its
+    oldest request has waited max_wait_ms.
+    """
+    def __init__(
+            self,
+            run_batch: any,
+            max_batch_rows: int=256,
+            max_wait_ms: float=10.
+        ):
+
+        self.run_batch = run_batch
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.
+        self.pending = collections.OrderedDict() # key -> list of requests (arrival order)
+        self.cond = threading.Condition()
+
+        self.worker = threading.Thread(target = self._loop, daemon = True)
+        self.worker.start()
+
+    def submit(
+            self,
+            key: tuple,
+            payload: dict,
+            n_rows: int
+        ) -> Future:
+        request = _Request(key, payload, n_rows)
+        with self.cond:
+            self.pending.setdefault(key, []).append(request)
+            self.cond.notify()
+        return request.future
+
+    def _next_batch(self) -> list:
+        with self.cond:
+            while True:
+                while not self.pending:
+                    self.cond.wait()
+
+                # oldest request first
+                key = min(self.pending, key = lambda k: self.pending[k][0].arrival)
+                queue = self.pending[key]
+                deadline = queue[0].arrival + self.max_wait
+                remaining = deadline - time.monotonic()
+                if sum(request.n_rows for request in queue) >= self.max_batch_rows or remaining <= 0:
+                    break
+                self.cond.wait(timeout = remaining)
+
+            # take requests up to max_batch_rows (at least one)
+            batch, rows = [], 0
+            while queue and (not batch or rows + queue[0].n_rows <= self.max_batch_rows):
+                rows += queue[0].n_rows
+                batch.append(queue.pop(0))
+            if not queue:
+                del self.pending[key]
+            return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self.run_batch(batch[0].key, [request.payload for request in batch])
+                for request, result in zip(batch, results):
+                    request.future.set_result(result)
+            except Exception as error:
+                for request in batch:
+                    request.future.set_exception(error)
+
+
+class ModelServer:
+    """
+    class description: warm checkpoints (name -> SS_InfoVAE with the same architecture) behind one MicroBatcher.
+    """
+    def __init__(
+            self,
+            args: any,
+            models: dict,
+            max_seq_len: int,
+            max_batch_rows: int=256,
+            max_wait_ms: float=10.,
+            timeout: float=300.
+        ):
+
+        self.args = args
+        self.models = models
+        self.max_seq_len = max_seq_len
+        self.timeout = timeout
+
+        # BatchNorm-folded encoders for the encode/score endpoints
+        self.encoders = {}
+        for name, model in models.items():
+            model.eval()
+            self.encoders[name] = fold_bn.fold_encoder(model.inference)
+
+        self.batcher = MicroBatcher(self.run_batch, max_batch_rows, max_wait_ms)
+
+    # request parsing
+
+    def tokens(self, sequences: list) -> torch.LongTensor:
+        # unaligned sequences -> padded tokens [N, L]
+        rows = []
+        for seq in sequences:
+            if len(seq) > self.max_seq_len or any(aa not in AA_ALPHABET for aa in seq):
+                raise ValueError(f'Invalid sequence (max. length {self.max_seq_len}, alphabet {AA_ALPHABET}): {seq}')
+            rows.append([AA_ALPHABET.index(aa) for aa in seq.ljust(self.max_seq_len, '-')])
+        return torch.tensor(rows, dtype = torch.long)
+
+    def codes(self, request: dict) -> torch.FloatTensor:
+        # latent codes [N, z_dim]; a single code with "n" is repeated n times
+        z = torch.tensor(request['z'], dtype = torch.float).view(-1, self.args.z_dim)
+        return z.repeat(int(request.get('n', 1)), 1)
+
+    def model_name(self, request: dict) -> str:
+        name = request.get('model', next(iter(self.models)))
+        if name not in self.models:
+            raise ValueError(f'Unknown model: {name} (loaded: {list(self.models)})')
+        return name
+
+    def submit(self, endpoint: str, request: dict) -> dict:
+        """
+        function description: parses one request, queues it and blocks until its micro-batch has run.
+        """
+        name = self.model_name(request)
+        option = request.get('option', 'categorical')
+
+        if endpoint in ['encode', 'score']:
+            tokens = self.tokens(request['sequences'])
+            key, payload, n_rows = (endpoint, name), {'tokens': tokens}, tokens.shape[0]
+
+        elif endpoint == 'sample':
+            z = self.codes(request)
+            key, payload, n_rows = (endpoint, name, option), {'z': z}, z.shape[0]
+
+        elif endpoint == 'diversify':
+            z = self.codes(request)
+            tokens = self.tokens([request['sequence']]).repeat(z.shape[0], 1)
+            L = int(request.get('L', 1))
+            key, payload, n_rows = (endpoint, name, option, L), {'tokens': tokens, 'z': z}, z.shape[0]
+
+        else:
+            raise ValueError(f'Unknown endpoint: {endpoint}')
+
+        return self.batcher.submit(key, payload, n_rows).result(timeout = self.timeout)
+
+    # batched model calls (worker thread)
+
+    def onehot(self, tokens: torch.LongTensor) -> torch.FloatTensor:
+        return F.one_hot(tokens, num_classes = len(AA_ALPHABET)).float().to(self.args.DEVICE) # [N, L, 21]
+
+    def decode_seqs(self, X: torch.FloatTensor) -> list:
+        # final generation step [N, L+1, L, 21] -> unaligned sequences
+        return [''.join(AA_ALPHABET[t] for t in seq).replace('-', '') for seq in X[:, -1].argmax(dim = -1).tolist()]
+
+    @torch.no_grad()
+    def run_batch(self, key: tuple, payloads: list) -> list:
+        endpoint, name = key[0], key[1]
+        model = self.models[name]
+        sizes = [next(iter(payload.values())).shape[0] for payload in payloads]
+        batch = {field: torch.cat([payload[field] for payload in payloads]) for field in payloads[0]}
+
+        if endpoint in ['encode', 'score']:
+            X = self.onehot(batch['tokens'])
+            z_mu, z_var = self.encoders[name](X.permute(0, 2, 1))
+
+            if endpoint == 'encode':
+                outputs = [{'z_mean': mu, 'z_var': var} for mu, var in zip(z_mu.tolist(), z_var.tolist())]
+            else:
+                pheno = model.discriminator.reg_forward(z_mu).squeeze(-1)
+                logits = model.generator(X.permute(0, 2, 1), model.cond_mapper(z_mu))
+                loglik = -F.cross_entropy(logits, batch['tokens'].to(self.args.DEVICE), reduction = 'none').sum(dim = 1)
+                outputs = [{'pheno_pred': y, 'log_likelihood': ll} for y, ll in zip(pheno.tolist(), loglik.tolist())]
+
+        elif endpoint == 'sample':
+            z = batch['z'].to(self.args.DEVICE)
+            X_context = torch.zeros((z.shape[0], self.max_seq_len, len(AA_ALPHABET)), device = self.args.DEVICE)
+            outputs = self.decode_seqs(model.sample(args = self.args, X_context = X_context, z = z, option = key[2]))
+
+        elif endpoint == 'diversify':
+            z = batch['z'].to(self.args.DEVICE)
+            X = model.diversify(args = self.args, X_context = self.onehot(batch['tokens']), z = z, L = key[3], option = key[2])
+            outputs = self.decode_seqs(X)
+
+        # split the batch back into the requests
+        results, start = [], 0
+        for size in sizes:
+            results.append({'results': outputs[start:start+size]})
+            start += size
+        return results
+
+
+class Request_handler(BaseHTTPRequestHandler):
+
+    def address_string(self) -> str:
+        # Unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.strip('/') == 'health':
+            self.reply(200, {'models': list(self.server.model_server.models), 'max_seq_len': self.server.model_server.max_seq_len})
+        else:
+            self.reply(404, {'error': f'Unknown path: {self.path}'})
+
+    def do_POST(self) -> None:
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            self.reply(200, self.server.model_server.submit(self.path.strip('/'), request))
+        except (ValueError, KeyError) as error:
+            self.reply(400, {'error': str(error)})
+        except Exception as error:
+            self.reply(500, {'error': repr(error)})
+
+    def log_message(self, format: str, *args: any) -> None:
+        pass # one line per request is too noisy for micro-batched traffic
+
+
+class Threading_HTTP_server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Threading_Unix_server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(
+        model_server: ModelServer,
+        host: str='127.0.0.1',
+        port: int=8765,
+        socket_path: str=''
+    ) -> socketserver.BaseServer:
+    """
+    function description: threaded HTTP server (one thread per connection, so that concurrent requests can meet
+    in the MicroBatcher) on localhost or, with socket_path, on a Unix socket.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = Threading_Unix_server(socket_path, Request_handler)
+    else:
+        server = Threading_HTTP_server((host, port), Request_handler)
+    server.model_server = model_server
+    return server
+
+
+def post(
+        endpoint: str,
+        request: dict,
+        url: str='http://127.0.0.1:8765'
+    ) -> dict:
+    # minimal client for the localhost HTTP server
+    req = urllib.request.Request(
+            f'{url}/{endpoint}',
+            data = json.dumps(request).encode(),
+            headers = {'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())
@@ -0,0 +1,184 @@
+import torch
+from torch import nn
+
+import source.latent_sweep as sweep
+import train_ProtWaveVAE as ProtWaveVAE
+import generate_proteins as gen_proteins
+
+import numpy as np
+import pandas as pd
+import argparse
+import os
+
+
+
+def get_args() -> any:
+
+    # write output path name
+    parser = argparse.ArgumentParser()
+    
+    # path varibles
+    parser.add_argument('--dataset_path', default='./data/ACS_SynBio_SH3_dataset.csv')
+    parser.add_argument('--output_results_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.csv')
+    parser.add_argument('--output_model_path', default='./outputs/SH3_task/ProtWaveVAE_SSTrainingHist.pth')
+    parser.add_argument('--save_dir', default='./outputs/SH3_latent_sweeps')
+    
+    # model training variables
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--batch_size', default=512, type=int, help='Size of the batch.')
+    parser.add_argument('--epochs', default=1000, type=int, help='Number of epochs')
+    parser.add_argument('--lr', default=1e-4, type=float, help='Learning rate')
+    parser.add_argument('--DEVICE', default='cuda', help='Learning rate')
+    parser.add_argument('--dataset_split', default=1, type=int, help='Choose whether to split into train/valid sets')
+    parser.add_argument('--N', default=100, type=int, help='Batch size')
+
+    # general architecture variables
+    parser.add_argument('--z_dim', default=6, type=int, help='Latent space size')
+    parser.add_argument('--num_classes', default=2, type=int, help='functional/nonfunctional labels')
+    parser.add_argument('--aa_labels', default=21, type=int, help='AA plus pad gap (20+1) labels')
+    
+    # encoder hyperparameters
+    parser.add_argument('--encoder_rates', default=5, type=int, help='dilation convolution depth')
+    parser.add_argument('--C_in', default=21, type=int, help='input feature depth')
+    parser.add_argument('--C_out', default=256, type=int, help='output feature depth')
+    parser.add_argument('--alpha', default=0.1, type=float, help='leaky Relu hyperparameter (optional)')
+    parser.add_argument('--enc_kernel', default=3, type=int, help='kernel filter size')
+    parser.add_argument('--num_fc', default=1, type=int, help='number of fully connect layers')
+      
+    # top model (discriminative decoder) hyperparameters
+    parser.add_argument('--disc_num_layers', default=2, type=int, help='depth of the discrim. top model')
+    parser.add_argument('--hidden_width', default=10, type=int, help='width of top model')
+    parser.add_argument('--p', default=0.3, type=float, help='top model dropout')
+
+    # decoder wavenet hyperparameters
+    parser.add_argument('--wave_hidden_state', default=256, type=int, help='no. filters for the dilated convolutions')
+    parser.add_argument('--head_hidden_state', default=128, type=int, help='no. filters for the WaveNets top model')
+    parser.add_argument('--num_dil_rates', default=8, type=int, help='depth of the WaveNet')
+    parser.add_argument('--dec_kernel_size', default=3, type=int, help='WaveNet kernel size')
+
+    # loss prefactor weights
+    parser.add_argument('--nll_weight', default=1., type=float, help='NLL prefactor weight')
+    parser.add_argument('--MI_weight', default=0.95, type=float, help='MI prefactor weight')
+    parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
+    parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
+
+    # latent sweep variables
+    parser.add_argument('--sweep', default='grid', help='grid | line | slerp | region (functional anisotropic Gaussian)')
+    parser.add_argument('--sweep_dims', default='0|1', help='latent dimensions swept by the grid')
+    parser.add_argument('--grid_range', default='-3|3', help='lower|upper grid bound')
+    parser.add_argument('--z_start', default='', help='start code of a line/slerp sweep (z_dim values split by |)')
+    parser.add_argument('--z_end', default='', help='end code of a line/slerp sweep (z_dim values split by |)')
+    parser.add_argument('--num_points', default=11, type=int, help='points per grid axis, along the path or in the region')
+    parser.add_argument('--decode_option', default='categorical', help='categorical | greedy')
+    parser.add_argument('--memory_budget', default=1024, type=int, help='decoding memory budget (MB) used to size the batches')
+    parser.add_argument('--cache_dir', default='./outputs/SH3_latent_sweeps/cache', help='decode cache shared across sweeps')
+
+    args = parser.parse_args()
+    
+    return args
+
+
+def parse_code(code: str, z_dim: int) -> torch.FloatTensor:
+
+    values = [float(value) for value in code.split('|')] if code != '' else [0.] * z_dim
+    return torch.tensor(values)
+
+
+def create_sweep_points(
+        args: any,
+        Z_train: torch.FloatTensor=None,
+        Y_train: torch.FloatTensor=None
+    ) -> torch.FloatTensor:
+
+    if args.sweep == 'grid':
+        lower, upper = [float(bound) for bound in args.grid_range.split('|')]
+        Z = sweep.grid_points(
+                    z_dim=args.z_dim,
+                    dims=[int(dim) for dim in args.sweep_dims.split('|')],
+                    lower=lower,
+                    upper=upper,
+                    num_points=args.num_points
+        )
+
+    elif args.sweep in ['line', 'slerp']:
+        path_func = sweep.line_points if args.sweep == 'line' else sweep.slerp_points
+        Z = path_func(
+                    z_start=parse_code(args.z_start, args.z_dim),
+                    z_end=parse_code(args.z_end, args.z_dim),
+                    num_points=args.num_points
+        )
+
+    elif args.sweep == 'region':
+        # functional region of the latent space (as in generate_proteins)
+        latent_func_aniso_dist = gen_proteins.create_func_aniso(
+                                            Z=Z_train,
+                                            Y=Y_train
+        )
+        Z = sweep.region_points(
+                    dist=latent_func_aniso_dist,
+                    num_points=args.num_points
+        )
+
+    else:
+        raise ValueError(f'Unknown sweep: {args.sweep}')
+
+    return Z
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+    if args.DEVICE == 'cuda':
+        ProtWaveVAE.set_GPU() # set GPU
+    ProtWaveVAE.set_SEED(args=args) # set SEED (reproducibility)
+    os.makedirs(args.save_dir, exist_ok=True)
+
+    # get data
+    train_dataloader, valid_dataloader, protein_len = ProtWaveVAE.get_data(args=args)
+    Xtrain, _, _, _ = train_dataloader.dataset[0:1]
+    max_seq_len = Xtrain.shape[1] # (B, L, 21)
+    args.max_seq_len = max_seq_len
+
+    # get model
+    model = ProtWaveVAE.get_SS_model(
+                            args=args,
+                            protein_len=protein_len
+    ).to(args.DEVICE)
+    model.load_state_dict(torch.load(args.output_model_path, map_location=args.DEVICE))
+
+    # latent embeddings are only needed for the functional region
+    Zpred_train, Ytrain_true_dl = None, None
+    if args.sweep == 'region':
+        Zpred_train, Ytrain_true_dl, _, _ = gen_proteins.infer_latents(
+                              args=args,
+                              model=model,
+                              train_dataloader=train_dataloader,
+                              valid_dataloader=valid_dataloader
+        )
+
+    Z_sweep = create_sweep_points(
+                        args=args,
+                        Z_train=Zpred_train,
+                        Y_train=Ytrain_true_dl
+    )
+
+    latent_sweep = sweep.LatentSweep(
+                        args=args,
+                        model=model,
+                        max_seq_len=max_seq_len,
+                        checkpoint_path=args.output_model_path,
+                        cache_dir=args.cache_dir,
+                        memory_budget=args.memory_budget * (1 << 20),
+                        option=args.decode_option,
+                        seed=args.SEED
+    )
+
+    # decode (cached points are reused)
+    X_sweep = latent_sweep.run_onehot(Z=Z_sweep)
+
+    sweep_df = gen_proteins.create_df(
+                        args=args,
+                        aa_seqs=gen_proteins.create_seqs(X=X_sweep),
+                        z=Z_sweep
+    )
+    sweep_df.to_csv(os.path.join(args.save_dir, f'latent_sweep[{args.sweep}].csv'), index=False)
@@ -5,33 +5,25 @@ author: Niksa Praljak
 import torch
 from torch import nn, optim
 from torch.utils.data import DataLoader, Dataset
-from torchvision import datasets, transforms
-from torchvision.utils import save_image
-from torch.autograd import Variable
 from torch.nn import functional as F
 
-# super Pytorch Lightning
-import pytorch_lightning as pl
-from pytorch_lightning import Trainer, seed_everything
-from pytorch_lightning.callbacks import EarlyStopping
-
 import source.preprocess as prep
 import source.wavenet_decoder as wavenet
 import source.model_components as model_comps
-import source.PL_wrapper as PL_wrapper
+import source.precision as prec
+import protwavevae.telemetry as telemetry
 
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
 import sys
 import argparse
 from tqdm import tqdm
 import random
-from sklearn.metrics import mean_squared_error
-from sklearn.model_selection import train_test_split
-from scipy.stats import pearsonr, spearmanr
+
+# pytorch_lightning (and source.PL_wrapper) and sklearn are imported in the functions that use them, so that scripts
+# importing this module for get_data/get_model do not pay for them at startup
 
 """
 Summary: train model session
@@ -87,6 +79,26 @@ def get_args() -> any:
     parser.add_argument('--lambda_weight', default=2., type=float, help='MMD prefactor weight')
     parser.add_argument('--gamma_weight', default=1., type=float, help='discriminative prefactor weight')
 
+    # checkpointing
+    parser.add_argument('--ckpt_every', default=0, type=int, help='save a resumable checkpoint every n epochs (0: off)')
+    parser.add_argument('--ckpt_path', default='', help='checkpoint path (default: output_model_path with its extension replaced by _last.ckpt)')
+    parser.add_argument('--resume', default=0, type=int, help='resume training from ckpt_path (1) or start from scratch (0)')
+
+    # distributed CPU training
+    parser.add_argument('--num_processes', default=1, type=int, help='no. CPU DDP processes (gloo); 1: single process')
+
+    # mixed precision
+    parser.add_argument('--bf16', default=0, type=prec.bf16_flag, help='bfloat16 autocast for conv/linear layers (1; needs torch >= 1.10) or float32 (0)')
+
+    # memory budget
+    parser.add_argument('--micro_batches', default=1, type=int, help='split every batch into micro-batches with gradient accumulation (MMD still over the whole batch)')
+    parser.add_argument('--auto_batch_size', default=0, type=int, help='probe the largest batch within --mem_budget_mb (1); larger batches become accumulated micro-batches')
+    parser.add_argument('--mem_budget_mb', default=0., type=float, help='memory budget of the batch-size probe (0: RSS + 80%% of the available memory; CUDA: 80%% of the device memory)')
+
+    # telemetry
+    parser.add_argument('--profile', default=0, type=int, help='Flag: per-phase timing summary next to the results CSV (also: PROTWAVEVAE_PROFILE=1)')
+    parser.add_argument('--profile_steps', default=0, type=int, help='no. training steps captured by torch.profiler (0: off; needs --profile)')
+
     args = parser.parse_args()
     
     return args
@@ -105,7 +117,14 @@ def set_GPU() -> None:
     return
 
 def set_SEED(args: any) -> None:
-    seed_everything(args.SEED, workers = True)
+    # seed_everything(args.SEED, workers = True) without importing pytorch_lightning: the exported seed is picked up
+    # by the Trainer to seed the DataLoader workers
+    os.environ['PL_GLOBAL_SEED'] = str(args.SEED)
+    os.environ['PL_SEED_WORKERS'] = '1'
+    random.seed(args.SEED)
+    np.random.seed(args.SEED)
+    torch.manual_seed(args.SEED)
+    torch.cuda.manual_seed_all(args.SEED)
     return 
 
 def get_data(args: any) -> (
@@ -114,6 +133,8 @@ def get_data(args: any) -> (
         int
     ):
 
+    from sklearn.model_selection import train_test_split
+
     df = pd.read_csv(args.dataset_path)
 
     max_seq_len = max([len(seq) for seq in df.Sequences_unaligned.values])
@@ -182,13 +203,13 @@ def get_data(args: any) -> (
     )
 
 
-def get_model(
+def get_SS_model(
         args: any,
         protein_len: int
-    ) -> any:
-
-        
-
+    ) -> nn.Module:
+    """
+    function description: bare SS_InfoVAE (no Lightning wrapper), e.g. to load a trained state_dict for inference.
+    """
     # define inference model:
     encoder = model_comps.GatedCNN_encoder(
                                   protein_len=protein_len,
@@ -237,11 +258,21 @@ def get_model(
                              decoder_pheno=decoder_re,
                              z_dim=args.z_dim
     )
-    
+
+    return SS_model
+
+
+def get_model(
+        args: any,
+        protein_len: int
+    ) -> any:
+
+    import source.PL_wrapper as PL_wrapper
+
     # pytorch model
     PL_model = PL_wrapper.Lit_SSInfoVAE(
                             DEVICE=args.DEVICE,
-                            SS_InfoVAE=SS_model,
+                            SS_InfoVAE=get_SS_model(args=args, protein_len=protein_len),
                             xi_weight=args.nll_weight,
                             alpha_weight=args.MI_weight,
                             lambda_weight=args.lambda_weight,
@@ -255,6 +286,23 @@ def get_model(
 
 
 
+def get_trainer_kwargs(args: any) -> dict:
+    """
+    function description: device/strategy arguments of pl.Trainer. With num_processes > 1 training runs as CPU
+    data-parallel DDP over the gloo backend, each rank using its share of the cores.
+    """
+    if args.num_processes > 1:
+        from pytorch_lightning.strategies import DDPStrategy
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.num_processes))
+        return {
+                'accelerator': 'cpu',
+                'devices': args.num_processes,
+                'strategy': DDPStrategy(process_group_backend='gloo', find_unused_parameters=True)
+        }
+
+    return {'gpus': 1 if torch.cuda.is_available() else None}
+
+
 def train_model(
         args: any,
         PL_model: any
@@ -263,19 +311,25 @@ def train_model(
             pd.Series
     ):
         
+        import pytorch_lightning as pl
+        import protwavevae.checkpointing as ckpt
+        import protwavevae.telemetry_callback as telemetry_cb
+
+        callbacks, resume_path = ckpt.get_checkpointing(args=args, model_path=args.output_model_path)
+        callbacks += telemetry_cb.get_callbacks(args=args, PL_model=PL_model)
         trainer = pl.Trainer(
          logger=False,
-         callbacks=None,
+         callbacks=callbacks,
          max_epochs=args.epochs,
-         gpus = 1 if torch.cuda.is_available() else None,
+         **get_trainer_kwargs(args=args)
          )      
         
         if args.dataset_split == 1:
             print('\nTrain/Valid split training\n')
-            trainer.fit(PL_model, train_dataloaders=train_dataloader, val_dataloaders=valid_dataloader)  
+            trainer.fit(PL_model, train_dataloaders=train_dataloader, val_dataloaders=valid_dataloader, ckpt_path=resume_path)
         else:
             print('\nTrain on the whole data\n')
-            trainer.fit(PL_model, train_dataloader)
+            trainer.fit(PL_model, train_dataloader, ckpt_path=resume_path)
 
         train_L = trainer.callback_metrics['L_train_epoch'].item()
         train_NLL = trainer.callback_metrics['L_nll_train_epoch'].item()
@@ -326,6 +380,7 @@ def train_model(
         )
 
 
+@telemetry.timed('io/save_results')
 def save_results(
         args: any,
         PL_model: any,
@@ -367,10 +422,15 @@ if __name__ == '__main__':
 
     # inpurt parameters, variables, and paths
     args = get_args()
+    if args.profile:
+        telemetry.enable()
     # make output folder directory
     os.makedirs(args.output_folder_path, exist_ok=True)
-    # set GPU
-    set_GPU()
+    # set GPU (CPU DDP ranks run on the CPU)
+    if args.num_processes > 1:
+        args.DEVICE = 'cpu'
+    else:
+        set_GPU()
     # set seed for reproducibility 
     set_SEED(args=args)
     # acquire data
@@ -380,6 +440,22 @@ if __name__ == '__main__':
                   args=args,
                   protein_len=protein_len
     )
+    # bfloat16 autocast (losses and BatchNorm statistics stay in float32)
+    if args.bf16:
+        PL_model.enable_bf16()
+    # largest batches within the memory budget (single process: DDP ranks must agree on the accumulation)
+    if args.auto_batch_size and args.num_processes == 1:
+        import protwavevae.batch_probe as batch_probe
+        with telemetry.phase('probe/batch_size'):
+            valid_dataloader = batch_probe.fit_training_batches(
+                                            args=args,
+                                            model=PL_model.model,
+                                            valid_dataloader=valid_dataloader,
+                                            protein_len=protein_len
+            )
+    # gradient accumulation over micro-batches (the MMD is still estimated on the whole batch)
+    if args.micro_batches > 1:
+        PL_model.enable_micro_batching(args.micro_batches)
     print('Start training !')
     # train model
     PL_model, final_epoch_results, all_epochs_losses = train_model(
@@ -388,11 +464,14 @@ if __name__ == '__main__':
     )
     print('Finished training !')
 
-    # save models and spreadsheet
-    save_results(
-        args=args,
-        PL_model=PL_model,
-        final_epoch_results=final_epoch_results,
-        all_epochs_losses=all_epochs_losses
-    )
-    print("Save model ...") 
+    # save models and spreadsheet (only once: DDP rank 0)
+    if PL_model.global_rank == 0:
+        save_results(
+            args=args,
+            PL_model=PL_model,
+            final_epoch_results=final_epoch_results,
+            all_epochs_losses=all_epochs_losses
+        )
+        print("Save model ...")
+        # per-phase timing summary next to the results CSV (--profile)
+        telemetry.write_summary(args.output_results_path) 
@@ -0,0 +1,358 @@
+"""
+@summary: CPU benchmark suite for the model hot paths of the shared core (protwavevae) on synthetic data:
+    - encoder_forward / generator_forward: GatedCNN_encoder.forward and Wave_generator.forward (one training batch),
+    - sample: full autoregressive SS_InfoVAE.sample at the SH3 length (82) and a Pfam-size length,
+    - mmd: InfoVAE.compute_mmd at several batch sizes,
+    - tokenize: padding + tokenization + one-hot encoding of sequences (protwavevae.preprocess),
+    - novelty: minimum Levenshtein distances of designs to a training pool (Pfam utils/levenshtein_tools).
+Every case runs in a fresh interpreter (seeded, fixed no. threads) and reports its throughput (items/s), peak RSS
+and Python heap allocations of one call (tracemalloc peak and the blocks still alive afterwards). The run fails
+(exit code 1) when a case crashed, has no baseline entry, or got slower or grew its peak RSS beyond the tolerance of
+the saved baseline. Throughput and RSS depend on the machine, so the baseline is not part of the repository: it is
+recorded once per reference machine (CI runner) with --update_baseline 1 and kept next to this script there.
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+AA_ALPHABET = 'ACDEFGHIKLMNPQRSTVWY-' # token 20: pad
+SH3_LEN = 82
+
+# SH3 defaults of train_ProtWaveVAE.get_args
+HPARAMS = {
+        'z_dim': 6,
+        'aa_labels': 21,
+        'encoder_rates': 5,
+        'C_out': 256,
+        'enc_kernel': 3,
+        'num_fc': 1,
+        'disc_num_layers': 2,
+        'hidden_width': 10,
+        'num_classes': 2,
+        'p': 0.3,
+        'wave_hidden_state': 256,
+        'head_hidden_state': 128,
+        'num_dil_rates': 8,
+        'dec_kernel_size': 3
+}
+
+
+def get_args() -> any:
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--cases', default='', help='comma-separated case names (default: every case)')
+    parser.add_argument('--repeats', default=5, type=int, help='timed calls per case (the median is kept)')
+    parser.add_argument('--warmup', default=1, type=int, help='untimed calls per case')
+    parser.add_argument('--num_threads', default=1, type=int, help='no. torch CPU threads (fixed for reproducible timings)')
+    parser.add_argument('--SEED', default=42, type=int, help='Random seed')
+    parser.add_argument('--pfam_len', default=256, type=int, help='padded length of the Pfam-size cases')
+    parser.add_argument('--baseline_path', default=os.path.join(REPO_DIR, 'hotpaths_baseline.json'), help='saved results per case')
+    parser.add_argument('--update_baseline', default=0, type=int, help='Flag: write the measured results as the new baseline')
+    parser.add_argument('--tolerance', default=0.25, type=float, help='allowed relative throughput loss / peak RSS growth against the baseline')
+    parser.add_argument('--min_slack_mb', default=50., type=float, help='allowed absolute peak RSS growth (MB) against the baseline')
+    parser.add_argument('--output_path', default=os.path.join(REPO_DIR, 'hotpaths_results.csv'))
+    parser.add_argument('--run_case', default='', help='internal: run one case in this interpreter and print its results')
+
+    args = parser.parse_args()
+
+    return args
+
+
+# synthetic inputs and models
+
+def random_seqs(n: int, min_len: int, max_len: int, rng: any) -> list:
+    # unaligned amino acid sequences of random length
+    return [''.join(rng.choice(AA_ALPHABET[:-1]) for _ in range(rng.randint(min_len, max_len))) for _ in range(n)]
+
+
+def onehot_batch(n: int, protein_len: int) -> any:
+    # random one-hot sequences [n, L, 21] with a pad tail
+    import torch
+
+    tokens = torch.randint(0, len(AA_ALPHABET) - 1, (n, protein_len))
+    seq_lens = torch.randint(protein_len // 2, protein_len + 1, (n, 1))
+    tokens[torch.arange(protein_len).unsqueeze(0) >= seq_lens] = len(AA_ALPHABET) - 1
+    return torch.eye(len(AA_ALPHABET))[tokens]
+
+
+def build_model(protein_len: int) -> any:
+    """
+    function description: freshly initialized core SS_InfoVAE with the SH3 architecture (eval mode, CPU).
+    """
+    import protwavevae.model_components as model_comps
+    import protwavevae.wavenet_decoder as wavenet
+
+    encoder = model_comps.GatedCNN_encoder(
+            protein_len=protein_len,
+            class_labels=HPARAMS['aa_labels'],
+            z_dim=HPARAMS['z_dim'],
+            num_rates=HPARAMS['encoder_rates'],
+            C_in=HPARAMS['aa_labels'],
+            C_out=HPARAMS['C_out'],
+            kernel=HPARAMS['enc_kernel'],
+            num_fc=HPARAMS['num_fc']
+    )
+    decoder_re = model_comps.Decoder_re(
+            num_layers=HPARAMS['disc_num_layers'],
+            hidden_width=HPARAMS['hidden_width'],
+            z_dim=HPARAMS['z_dim'],
+            num_classes=HPARAMS['num_classes'],
+            p=HPARAMS['p']
+    )
+    decoder_wave = wavenet.Wave_generator(
+            protein_len=protein_len,
+            class_labels=HPARAMS['aa_labels'],
+            DEVICE='cpu',
+            wave_hidden_state=HPARAMS['wave_hidden_state'],
+            head_hidden_state=HPARAMS['head_hidden_state'],
+            num_dil_rates=HPARAMS['num_dil_rates'],
+            kernel_size=HPARAMS['dec_kernel_size']
+    )
+    cond_mapper = wavenet.CondNet(
+            z_dim=HPARAMS['z_dim'],
+            output_shape=(1, protein_len)
+    )
+    model = model_comps.SS_InfoVAE(
+            DEVICE='cpu',
+            encoder=encoder,
+            decoder_recon=decoder_wave,
+            cond_mapper=cond_mapper,
+            decoder_pheno=decoder_re,
+            z_dim=HPARAMS['z_dim']
+    )
+    return model.eval()
+
+
+# cases: name -> setup(args) returning (call, items per call)
+
+def case_encoder_forward(args: any, protein_len: int=SH3_LEN, batch_size: int=512) -> tuple:
+    import torch
+
+    model = build_model(protein_len)
+    x = onehot_batch(batch_size, protein_len).permute(0, 2, 1)
+
+    @torch.no_grad()
+    def call():
+        model.inference(x)
+    return call, batch_size
+
+
+def case_generator_forward(args: any, protein_len: int=SH3_LEN, batch_size: int=512) -> tuple:
+    import torch
+
+    model = build_model(protein_len)
+    x = onehot_batch(batch_size, protein_len).permute(0, 2, 1)
+    z_context = model.cond_mapper(torch.randn(batch_size, HPARAMS['z_dim'])).detach()
+
+    @torch.no_grad()
+    def call():
+        model.generator(x, z_context)
+    return call, batch_size
+
+
+def case_sample(args: any, protein_len: int=SH3_LEN, num_seqs: int=64) -> tuple:
+    import torch
+
+    model = build_model(protein_len)
+    X_context = torch.zeros((num_seqs, protein_len, HPARAMS['aa_labels']))
+    z = torch.randn(num_seqs, HPARAMS['z_dim'])
+    sample_args = argparse.Namespace(DEVICE='cpu')
+
+    def call():
+        model.sample(args=sample_args, X_context=X_context, z=z, option='categorical')
+    return call, num_seqs
+
+
+def case_mmd(args: any, batch_size: int=512) -> tuple:
+    import torch
+    import protwavevae.model_components as model_comps
+
+    z_prior = torch.randn(batch_size, HPARAMS['z_dim'])
+    z_post = torch.randn(batch_size, HPARAMS['z_dim'])
+
+    @torch.no_grad()
+    def call():
+        model_comps.InfoVAE.compute_mmd(z_prior, z_post)
+    return call, batch_size
+
+
+def case_tokenize(args: any, num_seqs: int=10000, protein_len: int=SH3_LEN) -> tuple:
+    import random
+    import torch
+    import protwavevae.preprocess as prep
+
+    seqs = random_seqs(num_seqs, protein_len // 2, protein_len, random.Random(args.SEED))
+
+    def call():
+        padded_seqs = prep.pad_ends(seqs=list(seqs), max_seq_length=protein_len)
+        torch.eye(len(AA_ALPHABET))[prep.create_num_seqs(padded_seqs)]
+    return call, num_seqs
+
+
+def case_novelty(args: any, num_designs: int=20, num_train: int=500) -> tuple:
+    import importlib.util
+    import random
+
+    # Pfam_analysis/utils is not a package of the core: load the module from its path
+    spec = importlib.util.spec_from_file_location('levenshtein_tools', os.path.join(REPO_DIR, 'Pfam_analysis', 'utils', 'levenshtein_tools.py'))
+    leven = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(leven)
+
+    rng = random.Random(args.SEED)
+    design_pool = random_seqs(num_designs, 55, SH3_LEN, rng)
+    train_pool = random_seqs(num_train, 55, SH3_LEN, rng)
+
+    def call():
+        leven.compute_design_leven(design_pool=design_pool, train_pool=train_pool)
+    return call, num_designs * num_train # pairwise distances
+
+
+def cases(args: any) -> dict:
+    return {
+            'encoder_forward[L=82,B=512]': lambda: case_encoder_forward(args),
+            'generator_forward[L=82,B=512]': lambda: case_generator_forward(args),
+            'sample[L=82,B=64]': lambda: case_sample(args),
+            f'sample[L={args.pfam_len},B=16]': lambda: case_sample(args, protein_len=args.pfam_len, num_seqs=16),
+            'mmd[B=128]': lambda: case_mmd(args, batch_size=128),
+            'mmd[B=512]': lambda: case_mmd(args, batch_size=512),
+            'mmd[B=2048]': lambda: case_mmd(args, batch_size=2048),
+            'tokenize[N=10000,L=82]': lambda: case_tokenize(args),
+            'novelty[20x500]': lambda: case_novelty(args)
+    }
+
+
+def run_case(args: any, name: str) -> dict:
+    """
+    function description: times one case in this interpreter (called in a fresh child by the suite).
+    """
+    import importlib.util
+    import random
+
+    random.seed(args.SEED)
+    if importlib.util.find_spec('torch') is not None: # the novelty case is torch-free
+        import torch
+        torch.manual_seed(args.SEED)
+        torch.set_num_threads(args.num_threads)
+
+    call, items = cases(args)[name]()
+    for _ in range(args.warmup):
+        call()
+
+    seconds = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        call()
+        seconds.append(time.perf_counter() - start)
+
+    # Python heap of one extra call (tensor storage shows up in the peak RSS)
+    tracemalloc.start()
+    blocks_before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    call()
+    _, py_peak = tracemalloc.get_traced_memory()
+    blocks_after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    median = statistics.median(seconds)
+    return {
+            'case': name,
+            'items': items,
+            'median_s': median,
+            'min_s': min(seconds),
+            'throughput': items / median,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024., # KB on Linux
+            'py_peak_kb': py_peak / 1024.,
+            'py_blocks_retained': blocks_after - blocks_before
+    }
+
+
+def run_in_child(args: any, name: str) -> dict:
+    # fresh interpreter per case: the peak RSS and the allocator state are not shared between cases
+    command = [sys.executable, os.path.abspath(__file__), '--run_case', name]
+    for flag in ['repeats', 'warmup', 'num_threads', 'SEED', 'pfam_len']:
+        command += [f'--{flag}', str(getattr(args, flag))]
+
+    output = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True)
+    if output.returncode != 0:
+        return {'case': name, 'status': output.stderr.strip().splitlines()[-1] if output.stderr.strip() else f'exit code {output.returncode}'}
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result['status'] = 'ok'
+    return result
+
+
+def violations(
+        result: dict,
+        baseline: dict,
+        args: any
+    ) -> list:
+
+    if result['status'] != 'ok':
+        return [f'crashed: {result["status"]}']
+    if result['case'] not in baseline:
+        return [] if args.update_baseline else ['no baseline entry (record one with --update_baseline 1)']
+
+    reference = baseline[result['case']]
+    problems = []
+    min_throughput = reference['throughput'] / (1 + args.tolerance)
+    if result['throughput'] < min_throughput:
+        problems.append(f'{result["throughput"]:.1f}/s < {min_throughput:.1f}/s (baseline {reference["throughput"]:.1f}/s)')
+    max_rss = reference['peak_rss_mb'] * (1 + args.tolerance) + args.min_slack_mb
+    if result['peak_rss_mb'] > max_rss:
+        problems.append(f'peak RSS {result["peak_rss_mb"]:.0f}MB > {max_rss:.0f}MB (baseline {reference["peak_rss_mb"]:.0f}MB)')
+    return problems
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args, args.run_case)))
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(args.baseline_path):
+        with open(args.baseline_path) as f:
+            baseline = json.load(f)
+
+    names = list(cases(args))
+    if args.cases:
+        names = [name for name in names if name.split('[')[0] in args.cases.split(',') or name in args.cases.split(',')]
+
+    fieldnames = ['case', 'items', 'median_s', 'min_s', 'throughput', 'peak_rss_mb', 'py_peak_kb', 'py_blocks_retained', 'status', 'problems']
+    rows, failed = [], False
+    for name in names:
+        result = run_in_child(args, name)
+        problems = violations(result, baseline, args)
+        failed = failed or bool(problems)
+        result['problems'] = '; '.join(problems)
+        rows.append(result)
+
+        if result['status'] == 'ok':
+            print(f'{name:32s} {result["throughput"]:12.1f}/s  {result["median_s"]*1e3:10.2f}ms  {result["peak_rss_mb"]:8.0f}MB  {result["problems"]}')
+        else:
+            print(f'{name:32s} {result["problems"]}')
+
+    with open(args.output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    if args.update_baseline:
+        # only the measured cases are replaced
+        baseline.update({row['case']: {'throughput': row['throughput'], 'peak_rss_mb': row['peak_rss_mb']} for row in rows if row['status'] == 'ok'})
+        with open(args.baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,193 @@
+"""
+@summary: startup-time benchmark of the entry-point scripts of the three projects. Every script is imported in a
+fresh interpreter (its __main__ block does not run) from its project directory; the import time and the heavy
+libraries it pulled in are recorded. The startup path of the inference scripts (seeding + building the bare model,
+RUNTIME_PATHS) is timed the same way. The run fails (exit code 1) when
+    - a script imports a library it must not load at startup (e.g. torch in the novelty/TMalign/similarity scripts,
+      pytorch_lightning outside the training entry points, torchvision/matplotlib anywhere),
+    - a script (or runtime path) fails to import, e.g. because of a missing dependency,
+    - a script has no baseline entry or got slower than the saved baseline by more than the tolerance.
+Import times depend on the machine, so the baseline is not part of the repository: it is recorded once per reference
+machine (CI runner) with --update_baseline 1 and kept next to this script there.
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_LIBS = ['torch', 'torchvision', 'pytorch_lightning', 'matplotlib', 'sklearn', 'scipy', 'numba', 'optuna']
+
+# never needed at startup
+FORBIDDEN_ALL = ['torchvision', 'matplotlib']
+# scripts that only train (or tune) load Lightning at import time
+TRAINING_ENTRY_POINTS = [
+        'Benchmark_project/HPoptim_benchmark_ProtWaveVAE.py',
+        'SH3_design_project/CV_ProtWaveVAE.py',
+        'SH3_design_project/HPoptim_SH3_ProtWaveVAE.py'
+]
+# torch-free scripts
+LEAN_ENTRY_POINTS = [
+        'SH3_design_project/compute_dataset_novelty.py',
+        'SH3_design_project/compute_design_pool_novelty.py',
+        'Pfam_analysis/compute_min_levenshtein.py',
+        'Pfam_analysis/compute_min_levenshtein_CM.py',
+        'Pfam_analysis/compute_min_sim_CtermCM.py',
+        'Pfam_analysis/TMalign/run_TMalign.py',
+        'Pfam_analysis/TMalign/extract_results.py'
+]
+
+# runtime paths of the inference scripts: import + the calls they make before any real work (checked like scripts)
+RUNTIME_PATHS = {
+        'SH3_design_project/train_ProtWaveVAE.py::set_SEED+get_SS_model': (
+            'SH3_design_project/train_ProtWaveVAE.py',
+            "args = module.get_args(); args.DEVICE = 'cpu'; module.set_SEED(args=args); "
+            "module.get_SS_model(args=args, protein_len=100)"
+        )
+}
+
+# run in the child interpreter: import the script as a module (not as __main__), run the optional calls and report
+IMPORT_SNIPPET = """
+import importlib.util, json, sys, time
+path, libs, calls = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3]
+sys.argv = [path] # the script's argparse sees no arguments (defaults)
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('startup_benchmark_target', path)
+module = importlib.util.module_from_spec(spec)
+status = 'ok'
+try:
+    spec.loader.exec_module(module)
+    exec(calls)
+except Exception as error:
+    status = f'{type(error).__name__}: {error}'
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'status': status, 'libs': [lib for lib in libs if lib in sys.modules]}))
+"""
+
+
+def get_args() -> any:
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--repeats', default=3, type=int, help='fresh interpreters per script (the fastest run is kept)')
+    parser.add_argument('--baseline_path', default=os.path.join(REPO_DIR, 'startup_baseline.json'), help='saved import times (seconds per script)')
+    parser.add_argument('--update_baseline', default=0, type=int, help='Flag: write the measured times as the new baseline')
+    parser.add_argument('--tolerance', default=0.5, type=float, help='allowed relative slowdown against the baseline')
+    parser.add_argument('--min_slack', default=0.2, type=float, help='allowed absolute slowdown (seconds) against the baseline')
+    parser.add_argument('--output_path', default=os.path.join(REPO_DIR, 'startup_times.csv'))
+
+    args = parser.parse_args()
+
+    return args
+
+
+def entry_points() -> list:
+    # top-level scripts of every project (+ the TMalign/util scripts), source/ modules excluded
+    scripts = []
+    for project in ['Benchmark_project', 'Pfam_analysis', 'SH3_design_project']:
+        for subdir in ['', 'TMalign', 'utils']:
+            folder = os.path.join(REPO_DIR, project, subdir)
+            if not os.path.isdir(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                if filename.endswith('.py') and filename != '__init__.py':
+                    scripts.append(os.path.relpath(os.path.join(folder, filename), REPO_DIR))
+    return scripts
+
+
+def import_time(
+        script: str,
+        repeats: int,
+        calls: str=''
+    ) -> dict:
+    """
+    function description: fastest import of script (+ calls) over fresh interpreters (PYTHONPATH and cwd: its
+    project folder).
+    """
+    project_dir = os.path.join(REPO_DIR, script.split(os.sep)[0])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([project_dir, os.environ.get('PYTHONPATH', '')]))
+
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run(
+                [sys.executable, '-c', IMPORT_SNIPPET, os.path.join(REPO_DIR, script), json.dumps(HEAVY_LIBS), calls],
+                cwd=project_dir,
+                env=env,
+                capture_output=True,
+                text=True
+        )
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def violations(
+        script: str,
+        result: dict,
+        baseline: dict,
+        args: any
+    ) -> list:
+
+    forbidden = list(FORBIDDEN_ALL)
+    if script in LEAN_ENTRY_POINTS:
+        forbidden += ['torch']
+    if script not in TRAINING_ENTRY_POINTS:
+        forbidden += ['pytorch_lightning']
+
+    problems = [f'imports {lib}' for lib in forbidden if lib in result['libs']]
+
+    # time regressions are only checked for scripts that import cleanly
+    if result['status'] != 'ok':
+        problems.append(f'import failed: {result["status"]}')
+    elif script in baseline:
+        budget = baseline[script] * (1 + args.tolerance) + args.min_slack
+        if result['seconds'] > budget:
+            problems.append(f'{result["seconds"]:.2f}s > {budget:.2f}s budget (baseline {baseline[script]:.2f}s)')
+    elif not args.update_baseline:
+        problems.append('no baseline entry (record one with --update_baseline 1)')
+    return problems
+
+
+if __name__ == '__main__':
+
+    args = get_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline_path):
+        with open(args.baseline_path) as f:
+            baseline = json.load(f)
+
+    rows, failed = [], False
+    cases = [(script, script, '') for script in entry_points()]
+    cases += [(name, script, calls) for name, (script, calls) in RUNTIME_PATHS.items()]
+    for script, path, calls in cases:
+        result = import_time(path, args.repeats, calls)
+        problems = violations(script, result, baseline, args)
+        failed = failed or bool(problems)
+        rows.append(
+                {
+                    'script': script,
+                    'seconds': result['seconds'],
+                    'status': result['status'],
+                    'heavy_libs': '|'.join(result['libs']),
+                    'problems': '; '.join(problems)
+                }
+        )
+        print(f'{script:60s} {result["seconds"]:6.2f}s  {"|".join(result["libs"]):40s} {"; ".join(problems)}')
+
+    with open(args.output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    if args.update_baseline:
+        with open(args.baseline_path, 'w') as f:
+            json.dump({row['script']: row['seconds'] for row in rows if row['status'] == 'ok'}, f, indent=2)
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,10 @@
+"""
+@summary: ProtWaveVAE core shared by the Benchmark, Pfam and SH3 projects:
+    - protwavevae.wavenet_decoder: WaveNet generator and latent conditioning nets,
+    - protwavevae.model_components: gated-CNN encoders, discriminator, InfoVAE/SS-InfoVAE and their sampling engines,
+    - protwavevae.preprocess: sequence padding/tokenization and the SH3 dataset.
+Each project's source/ package keeps its module names as thin adapters around these (project-specific variants are
+subclasses there). The submodules are not imported here, so `import protwavevae` does not load torch.
+"""
+
+__version__ = '0.1.0'
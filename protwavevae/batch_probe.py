@@ -0,0 +1,404 @@
+"""
+@summary: memory-budgeted batch-size probe. Memory use grows with C_out, wave_hidden_state, num_dil_rates and the
+sequence length, so a fixed batch size that fits one configuration gets another one OOM-killed. For a built model the
+largest batch within a budget (peak RSS on CPU, peak allocation on CUDA) is searched for each phase on random one-hot
+batches:
+    - train: forward, losses (incl. the B x B MMD kernels), backward and an Adam step,
+    - eval: no-grad forward of the full model (validation),
+    - infer: no-grad encoder pass (latent inference),
+    - generate: the context buffer of model.sample plus one generator pass.
+Batch sizes are doubled from a small start. Before each trial the peak is extrapolated (linearly) from the measured
+trials and a trial predicted over budget is not run, so the probe itself does not get killed; an out-of-memory error
+ends the search. The last fitting size is refined once by linear interpolation. The model (weights, BatchNorm
+statistics, training mode) and the RNG states are restored afterwards.
+A requested training batch larger than the safe one is trained as micro-batches with gradient accumulation (the
+micro-batch mode of the Lightning wrappers, which keeps the MMD of the whole batch: protwavevae.micro_batching).
+"""
+
+import contextlib
+import csv
+import gc
+import math
+import os
+
+import torch
+from torch.nn import functional as F
+from torch.utils.data import BatchSampler, DataLoader
+
+import protwavevae.memory as memory
+
+
+PHASES = ['train', 'eval', 'infer', 'generate']
+
+# upper end of the search when the caller has no natural maximum (e.g. generation chunks)
+MAX_BATCH = 4096
+
+# messages of the CPU/CUDA allocators when an allocation fails
+OOM_MESSAGES = ['out of memory', "can't allocate memory", 'not enough memory']
+
+
+def default_budget_mb(DEVICE: str, fraction: float=0.8) -> float:
+    """
+    function description: CUDA: fraction of the device memory; CPU: current RSS + fraction of the available memory.
+    """
+    if str(DEVICE).startswith('cuda') and torch.cuda.is_available():
+        return fraction * torch.cuda.get_device_properties(torch.device(DEVICE)).total_memory / 2**20
+
+    available_mb = memory.available_mb()
+    if available_mb is None:
+        raise RuntimeError('available memory unknown (no /proc/meminfo): set the memory budget explicitly')
+    return memory.current_rss_mb() + fraction * available_mb
+
+
+def random_onehot(
+        batch_size: int,
+        protein_len: int,
+        aa_labels: int,
+        DEVICE: str
+    ) -> torch.FloatTensor:
+
+    tokens = torch.randint(aa_labels, (batch_size, protein_len), device = DEVICE)
+    return F.one_hot(tokens, aa_labels).float()
+
+
+# one step per phase, as a function of the batch size
+
+def train_step(
+        model: torch.nn.Module,
+        protein_len: int,
+        aa_labels: int,
+        DEVICE: str
+    ) -> any:
+    """
+    function description: forward, a surrogate loss touching every output plus the MMD of the real loss, backward
+    and an Adam step (lr=0: the weights do not move, but the optimizer state is allocated as in training).
+    """
+    optimizer = torch.optim.Adam(model.parameters(), lr = 0.)
+
+    def step(batch_size: int) -> None:
+        model.train()
+        x = random_onehot(batch_size, protein_len, aa_labels, DEVICE)
+        outputs = model(x)
+        z = outputs[-3] # (..., z, z_mu, z_var) for InfoVAE and SS_InfoVAE
+        loss = sum(output.float().mean() for output in outputs) + model.compute_mmd(z, torch.randn_like(z))
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none = True)
+
+    return step
+
+
+def eval_step(
+        model: torch.nn.Module,
+        protein_len: int,
+        aa_labels: int,
+        DEVICE: str
+    ) -> any:
+
+    @torch.no_grad()
+    def step(batch_size: int) -> None:
+        model.eval()
+        model(random_onehot(batch_size, protein_len, aa_labels, DEVICE))
+
+    return step
+
+
+def infer_step(
+        model: torch.nn.Module,
+        protein_len: int,
+        aa_labels: int,
+        DEVICE: str
+    ) -> any:
+
+    @torch.no_grad()
+    def step(batch_size: int) -> None:
+        model.eval()
+        model.inference(random_onehot(batch_size, protein_len, aa_labels, DEVICE).permute(0, 2, 1))
+
+    return step
+
+
+def generate_step(
+        model: torch.nn.Module,
+        protein_len: int,
+        aa_labels: int,
+        DEVICE: str
+    ) -> any:
+    """
+    function description: peak memory of model.sample for one chunk: its [B, L+1, L, 21] context buffer and one
+    generator pass (the autoregressive loop repeats that pass L times without holding more memory).
+    """
+    @torch.no_grad()
+    def step(batch_size: int) -> None:
+        model.eval()
+        x = random_onehot(batch_size, protein_len, aa_labels, DEVICE)
+        X_context = torch.zeros_like(x).unsqueeze(1).repeat(1, protein_len+1, 1, 1)
+        z_context = model.cond_mapper(torch.randn(batch_size, model.z_dim, device = DEVICE), seq_len = protein_len)
+        X_context[:,0,:,:] = model.generator(x.permute(0,2,1), z_context).permute(0,2,1).softmax(dim = -1)
+
+    return step
+
+
+STEPS = {'train': train_step, 'eval': eval_step, 'infer': infer_step, 'generate': generate_step}
+
+
+@contextlib.contextmanager
+def preserved_state(model: torch.nn.Module) -> any:
+    """
+    function description: restores the weights/buffers, the training mode and the RNG states after the probe.
+    """
+    state = {name: value.detach().clone() if torch.is_tensor(value) else value for name, value in model.state_dict().items()}
+    training = model.training
+    cpu_rng = torch.get_rng_state()
+    cuda_rng = torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+    try:
+        yield
+    finally:
+        model.load_state_dict(state)
+        model.zero_grad(set_to_none = True)
+        model.train(training)
+        torch.set_rng_state(cpu_rng)
+        if cuda_rng is not None:
+            torch.cuda.set_rng_state_all(cuda_rng)
+
+
+def is_oom(error: Exception) -> bool:
+    return any(message in str(error) for message in OOM_MESSAGES)
+
+
+def measure_mb(
+        step: any,
+        batch_size: int,
+        DEVICE: str
+    ) -> float:
+
+    gc.collect()
+    if str(DEVICE).startswith('cuda'):
+        torch.cuda.empty_cache()
+
+    with memory.Peak_sampler() as sampler:
+        step(batch_size)
+    return sampler.cuda_peak_mb if str(DEVICE).startswith('cuda') else sampler.peak_mb
+
+
+def extrapolate_mb(measured: list, batch_size: int) -> float:
+    # line through the two largest measured trials
+    (b0, m0), (b1, m1) = sorted((record['batch_size'], record['peak_mb']) for record in measured)[-2:]
+    slope = max(m1 - m0, 0.) / (b1 - b0)
+    return m1 + slope * (batch_size - b1)
+
+
+def probe_batch_size(
+        step: any,
+        budget_mb: float,
+        DEVICE: str,
+        max_batch: int,
+        start: int=8,
+        phase: str=''
+    ) -> (
+            int,
+            list
+    ):
+    """
+    function description: largest batch size <= max_batch whose peak memory stays within budget_mb (0 if not even
+    a batch of one fits) and the trial records (phase, batch_size, peak_mb, status).
+    """
+    records = []
+
+    def trial(batch_size: int) -> bool:
+        measured = [record for record in records if record['status'] in ['ok', 'over budget']]
+        if len(measured) >= 2 and extrapolate_mb(measured, batch_size) > budget_mb:
+            records.append({'phase': phase, 'batch_size': batch_size, 'peak_mb': extrapolate_mb(measured, batch_size), 'status': 'skipped (predicted over budget)'})
+            return False
+        try:
+            peak_mb = measure_mb(step, batch_size, DEVICE)
+        except RuntimeError as error:
+            if not is_oom(error):
+                raise
+            records.append({'phase': phase, 'batch_size': batch_size, 'peak_mb': float('nan'), 'status': 'oom'})
+            return False
+        records.append({'phase': phase, 'batch_size': batch_size, 'peak_mb': peak_mb, 'status': 'ok' if peak_mb <= budget_mb else 'over budget'})
+        return peak_mb <= budget_mb
+
+    # smallest trial: halve until a batch fits
+    best, failed = 0, max_batch + 1
+    batch_size = min(start, max_batch)
+    while batch_size >= 1:
+        if trial(batch_size):
+            best = batch_size
+            break
+        failed, batch_size = batch_size, batch_size // 2
+    if best == 0:
+        return 0, records
+
+    # double up to the first failure (or max_batch)
+    while best < max_batch and min(2 * best, max_batch) < failed:
+        batch_size = min(2 * best, max_batch)
+        if not trial(batch_size):
+            failed = batch_size
+            break
+        best = batch_size
+
+    # refine between the last fitting and the first failing size (multiple of 8 where possible; not after an
+    # out-of-memory error, where the allocator and not the budget was the limit)
+    measured = [record for record in records if record['status'] in ['ok', 'over budget']]
+    if best < max_batch and len(measured) >= 2 and records[-1]['status'] != 'oom':
+        (b0, m0), (b1, m1) = sorted((record['batch_size'], record['peak_mb']) for record in measured)[-2:]
+        if m1 > m0:
+            candidate = min(b0 + int((budget_mb - m0) * (b1 - b0) / (m1 - m0)), failed - 1, max_batch)
+            candidate = candidate - candidate % 8 if candidate >= 16 else candidate
+            if candidate > best and trial(candidate):
+                best = candidate
+
+    return best, records
+
+
+def probe_phases(
+        model: torch.nn.Module,
+        protein_len: int,
+        aa_labels: int,
+        DEVICE: str,
+        max_batches: dict,
+        budget_mb: float=0.
+    ) -> (
+            dict,
+            list
+    ):
+    """
+    function description: safe batch size per phase (keys of max_batches, see PHASES) and all trial records;
+    budget_mb=0 uses default_budget_mb.
+    """
+    budget_mb = budget_mb if budget_mb > 0 else default_budget_mb(DEVICE)
+    print(f'Batch-size probe: budget {budget_mb:.0f} MB ({"CUDA allocation" if str(DEVICE).startswith("cuda") else "peak RSS"})')
+
+    safe, records = {}, []
+    model = model.to(DEVICE)
+    with preserved_state(model):
+        for phase, max_batch in max_batches.items():
+            step = STEPS[phase](model, protein_len, aa_labels, DEVICE)
+            safe[phase], phase_records = probe_batch_size(step, budget_mb, DEVICE, max_batch = max_batch, phase = phase)
+            records += phase_records
+            print(f'  {phase:8s}: {safe[phase]} (max. {max_batch})')
+            del step
+            gc.collect()
+
+    return (
+            safe,
+            records
+    )
+
+
+def plan_accumulation(requested: int, safe: int) -> (
+        int,
+        int
+    ):
+    """
+    function description: (micro-batch size, accumulation steps) for a requested batch size: the requested batch
+    if it fits, otherwise the fewest accumulation steps of equal micro-batches within the safe size.
+    """
+    if safe < 1:
+        raise RuntimeError('not even a batch of one fits into the memory budget')
+    if requested <= safe:
+        return requested, 1
+
+    accumulate = math.ceil(requested / safe)
+    return math.ceil(requested / accumulate), accumulate
+
+
+def loader_batch_size(dataloader: DataLoader) -> int:
+    # batch size of a regular loader or of its batch/block sampler (batch_size=None loaders)
+    if dataloader.batch_size is not None:
+        return dataloader.batch_size
+    sampler = dataloader.batch_sampler if dataloader.batch_sampler is not None else dataloader.sampler
+    return getattr(sampler, 'batch_size', None)
+
+
+def rebatch(dataloader: DataLoader, batch_size: int) -> DataLoader:
+    """
+    function description: the same loader with another batch size: same dataset, sampler (shuffling, seed,
+    sharding), collate_fn, pinning and worker settings. Regular loaders keep their sampler; custom batch samplers
+    (LengthBucket_sampler) and the block samplers of the tensor loaders (batch_size=None, Block_sampler) are rebuilt
+    with their with_batch_size method. Other loaders raise a TypeError.
+    """
+    if loader_batch_size(dataloader) == batch_size:
+        return dataloader
+
+    settings = dict(
+            num_workers = dataloader.num_workers,
+            collate_fn = dataloader.collate_fn,
+            pin_memory = dataloader.pin_memory,
+            timeout = dataloader.timeout,
+            worker_init_fn = dataloader.worker_init_fn,
+            multiprocessing_context = dataloader.multiprocessing_context,
+            generator = dataloader.generator,
+            prefetch_factor = dataloader.prefetch_factor,
+            persistent_workers = dataloader.persistent_workers
+    )
+
+    if type(dataloader.batch_sampler) is BatchSampler:
+        # regular loader: the sampler is kept, the batches are cut to the new size
+        return DataLoader(
+                dataloader.dataset,
+                batch_size = batch_size,
+                sampler = dataloader.sampler,
+                drop_last = dataloader.drop_last,
+                **settings
+        )
+
+    if dataloader.batch_sampler is not None and hasattr(dataloader.batch_sampler, 'with_batch_size'):
+        return DataLoader(
+                dataloader.dataset,
+                batch_sampler = dataloader.batch_sampler.with_batch_size(batch_size),
+                **settings
+        )
+
+    if dataloader.batch_size is None and hasattr(dataloader.sampler, 'with_batch_size'):
+        # the sampler yields whole batches of indexes
+        return DataLoader(
+                dataloader.dataset,
+                sampler = dataloader.sampler.with_batch_size(batch_size),
+                batch_size = None,
+                **settings
+        )
+
+    sampler = dataloader.batch_sampler if dataloader.batch_sampler is not None else dataloader.sampler
+    raise TypeError(f'cannot rebatch a dataloader with a {type(sampler).__name__} (no with_batch_size method)')
+
+
+def write_records(path: str, records: list) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+    with open(path, 'w', newline = '') as f:
+        writer = csv.DictWriter(f, fieldnames = ['phase', 'batch_size', 'peak_mb', 'status'])
+        writer.writeheader()
+        writer.writerows(records)
+    print(f'Batch-size probe records: {path}')
+
+
+def fit_training_batches(
+        args: any,
+        model: torch.nn.Module,
+        valid_dataloader: DataLoader,
+        protein_len: int
+    ) -> DataLoader:
+    """
+    function description: probes the train/eval batch sizes of model within args.mem_budget_mb. A training batch
+    above the safe size is split into args.micro_batches micro-batches (the training dataloader keeps
+    args.batch_size; see enable_micro_batching of the Lightning wrappers); the validation dataloader is rebatched.
+    The records are written next to the results CSV (<results>_batch_probe.csv).
+    """
+    safe, records = probe_phases(
+            model = model,
+            protein_len = protein_len,
+            aa_labels = args.aa_labels,
+            DEVICE = args.DEVICE,
+            max_batches = {'train': args.batch_size, 'eval': args.batch_size},
+            budget_mb = args.mem_budget_mb
+    )
+    write_records(os.path.splitext(args.output_results_path)[0] + '_batch_probe.csv', records)
+
+    micro_batch, micro_batches = plan_accumulation(args.batch_size, safe['train'])
+    if micro_batches > args.micro_batches:
+        args.micro_batches = micro_batches
+        print(f'Batch size {args.batch_size} over the memory budget: {micro_batches} accumulated micro-batches of {micro_batch}')
+
+    return rebatch(valid_dataloader, max(1, min(args.batch_size, safe['eval'])))
@@ -0,0 +1,73 @@
+"""
+@summary: resumable checkpointing of the Lightning wrappers of the three projects: a periodic full checkpoint
+(model, optimizer, loop state and the per-epoch loss histories) written atomically, and the --ckpt_every/--ckpt_path/
+--resume handling of the training scripts (imported in their train functions, so inference scripts do not load
+Lightning).
+"""
+
+import os
+
+import pytorch_lightning as pl
+
+
+class PeriodicCheckpoint(pl.Callback):
+    """
+    class description: every `every_n_epochs` epochs, write a full Lightning checkpoint (model, optimizer, epoch/loop
+    state and the *_list loss histories) to ckpt_path. The file is written next to the target and moved into place
+    with os.replace, so a job killed mid-save still leaves the previous checkpoint intact.
+    """
+    def __init__(
+            self,
+            ckpt_path: str,
+            every_n_epochs: int=10
+        ):
+        super().__init__()
+        self.ckpt_path = ckpt_path
+        self.every_n_epochs = every_n_epochs
+
+    def on_train_epoch_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        if (trainer.current_epoch + 1) % self.every_n_epochs != 0:
+            return
+        tmp_path = self.ckpt_path + '.tmp'
+        trainer.save_checkpoint(tmp_path)
+        if trainer.is_global_zero:
+            os.replace(tmp_path, self.ckpt_path)
+
+
+def save_loss_histories(module: pl.LightningModule, checkpoint: dict) -> None:
+    # per-epoch histories (L_train_list, val_f1_list, ...) only live on the LightningModule
+    checkpoint['loss_histories'] = {
+            name: list(values) for name, values in vars(module).items() if name.endswith('_list')
+    }
+
+
+def load_loss_histories(module: pl.LightningModule, checkpoint: dict) -> None:
+    for name, values in checkpoint.get('loss_histories', {}).items():
+        setattr(module, name, list(values))
+
+
+def default_ckpt_path(model_path: str) -> str:
+    # model path with its extension (if any) replaced by _last.ckpt, e.g. model.pth -> model_last.ckpt
+    return os.path.splitext(model_path)[0] + '_last.ckpt'
+
+
+def get_checkpointing(
+        args: any,
+        model_path: str
+    ) -> (
+        list,
+        str
+    ):
+    """
+    function description: periodic checkpoint callback and, with --resume, the checkpoint to restart from
+    (args.ckpt_path, by default next to the saved model at model_path).
+    """
+    ckpt_path = args.ckpt_path if args.ckpt_path != '' else default_ckpt_path(model_path)
+    callbacks = [PeriodicCheckpoint(ckpt_path=ckpt_path, every_n_epochs=args.ckpt_every)] if args.ckpt_every > 0 else []
+    resume_path = ckpt_path if args.resume and os.path.exists(ckpt_path) else None
+    if args.resume and resume_path is None:
+        print(f'No checkpoint found at {ckpt_path}, training from scratch')
+    return (
+            callbacks,
+            resume_path
+    )
@@ -0,0 +1,172 @@
+"""
+@summary: BatchNorm folding for an eval-mode GatedCNN_encoder. In eval() every BatchNorm1d is a per-channel affine
+map y = s * x + t with s = gamma / sqrt(running_var + eps) and t = beta - s * running_mean:
+    - initial 1x1 conv -> BN: s and t are folded into the conv weight and bias,
+    - gated layers (signal * sigm(gate) -> BN) and the final gate: s is folded into the bias-free signal conv
+      (the gate is unchanged) and t is added to the gated output in the same op (addcmul).
+The folded encoder removes every BatchNorm pass and gives the same outputs up to float rounding.
+"""
+
+import copy
+
+import torch
+from torch import nn
+
+import protwavevae.model_components as model_comps
+
+
+def bn_affine(bn: nn.BatchNorm1d) -> (
+        torch.FloatTensor,
+        torch.FloatTensor
+    ):
+    # eval-mode BatchNorm as y = scale * x + shift
+    scale = bn.running_var.add(bn.eps).rsqrt()
+    if bn.affine:
+        scale = scale * bn.weight
+        shift = bn.bias - scale * bn.running_mean
+    else:
+        shift = -scale * bn.running_mean
+    return (
+            scale.detach(),
+            shift.detach()
+    )
+
+
+def fold_conv_bn(conv: nn.Conv1d, bn: nn.BatchNorm1d) -> nn.Conv1d:
+    """
+    function description: conv followed by BN -> single conv with a bias.
+    """
+    scale, shift = bn_affine(bn)
+    folded = copy.deepcopy(conv)
+    folded.weight.data = conv.weight.data * scale.view(-1, 1, 1)
+    bias = conv.bias.data if conv.bias is not None else torch.zeros_like(scale)
+    folded.bias = nn.Parameter(bias * scale + shift)
+    return folded
+
+
+def scale_conv(conv: nn.Conv1d, scale: torch.FloatTensor) -> nn.Conv1d:
+    # bias-free conv whose output channels are multiplied by scale
+    scaled = copy.deepcopy(conv)
+    scaled.weight.data = conv.weight.data * scale.view(-1, 1, 1)
+    return scaled
+
+
+class Folded_GatedCNN_encoder(nn.Module):
+    """
+    class description: inference-only GatedCNN_encoder with its BatchNorms folded away (see module summary).
+    The fully connected heads are copied from the source encoder and applied exactly as in its forward/mode_prediction.
+    """
+    def __init__(self, encoder: model_comps.GatedCNN_encoder):
+        super(Folded_GatedCNN_encoder, self).__init__()
+
+        self.protein_len = encoder.protein_len
+        self.num_rates = encoder.num_rates
+        self.num_fc = encoder.num_fc
+
+        # initial embedding (1x1 conv + BN -> conv)
+        self.initial_conv = fold_conv_bn(encoder.initial_conv_blocks[0], encoder.batch_norms[0])
+
+        # gated layers: BN scale in the signal conv, BN shift added to the gated output
+        self.signal_convs, self.gate_convs = nn.ModuleList(), nn.ModuleList()
+        shifts = []
+        for ii in range(self.num_rates):
+            scale, shift = bn_affine(encoder.batch_norms[ii+1])
+            self.signal_convs.append(scale_conv(encoder.signal_convs[ii], scale))
+            self.gate_convs.append(copy.deepcopy(encoder.gate_convs[ii]))
+            shifts.append(shift.view(-1, 1))
+        self.register_buffer('gated_shifts', torch.stack(shifts) if shifts else torch.zeros(0, encoder.C_out, 1))
+
+        # final gate (1 channel)
+        scale, shift = bn_affine(encoder.batch_norms[-1])
+        self.final_conv_signal = scale_conv(encoder.final_conv_signal, scale)
+        self.final_conv_gate = copy.deepcopy(encoder.final_conv_gate)
+        self.register_buffer('final_shift', shift.view(-1, 1))
+
+        # heads
+        self.encoder_fully_connected = copy.deepcopy(encoder.encoder_fully_connected)
+        self.q_z_mean = copy.deepcopy(encoder.q_z_mean)
+        self.q_z_var = copy.deepcopy(encoder.q_z_var)
+
+        self.sigm = nn.Sigmoid()
+        self.lrelu = nn.LeakyReLU(negative_slope = 0.1)
+        self.eval()
+
+    def gated_features(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        x = self.initial_conv(x)
+
+        for ii in range(self.num_rates):
+            # signal * sigm(gate) + shift
+            x = torch.addcmul(self.gated_shifts[ii], self.signal_convs[ii](x), self.sigm(self.gate_convs[ii](x)))
+
+        conv_out = torch.addcmul(self.final_shift, self.final_conv_signal(x), self.sigm(self.final_conv_gate(x)))
+        return conv_out.squeeze(1) # shape: (batch_size, output_length)
+
+    def forward(
+            self,
+            x: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+        enc_out = self.gated_features(x)
+        for ii in range(self.num_fc):
+            enc_out = self.lrelu(self.encoder_fully_connected[ii](enc_out))
+        return (
+                self.q_z_mean(enc_out),
+                self.q_z_var(enc_out)
+        )
+
+    def mode_prediction(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        # GatedCNN_encoder.mode_prediction feeds the gated features straight to the mean head (its fc outputs are unused)
+        return self.q_z_mean(self.gated_features(x))
+
+
+@torch.no_grad()
+def encoder_drift(
+        encoder: nn.Module,
+        folded: nn.Module,
+        x: torch.FloatTensor
+    ) -> float:
+    # max. absolute difference of the mean, variance and mode outputs
+    mu, var = encoder(x)
+    mu_fold, var_fold = folded(x)
+    mode_diff = (encoder.mode_prediction(x) - folded.mode_prediction(x)).abs().max()
+    return max((mu - mu_fold).abs().max().item(), (var - var_fold).abs().max().item(), mode_diff.item())
+
+
+# encoder class -> its folded counterpart (project variants of the encoder register theirs, e.g. the SH3 adapter)
+FOLDED_CLASSES = {model_comps.GatedCNN_encoder: Folded_GatedCNN_encoder}
+
+
+def is_foldable(encoder: nn.Module) -> bool:
+    # float GatedCNN_encoder (e.g. not the int8 copy, whose 1x1 convs are swapped for linear layers)
+    return (
+            type(encoder) in FOLDED_CLASSES
+            and type(encoder.initial_conv_blocks[0]) == nn.Conv1d
+            and type(encoder.final_conv_signal) == nn.Conv1d
+    )
+
+
+def fold_encoder(
+        encoder: nn.Module,
+        x_check: torch.FloatTensor=None,
+        atol: float=1e-4
+    ) -> nn.Module:
+    """
+    function description: folded copy of an encoder for latent inference. Encoders that cannot be folded (e.g. other
+    architectures) are returned as they are; with x_check ([B, C_in, L]) the folded encoder is only used when it
+    matches the original within atol.
+    """
+    if not is_foldable(encoder):
+        return encoder
+
+    encoder.eval()
+    folded = FOLDED_CLASSES[type(encoder)](encoder).to(encoder.initial_conv_blocks[0].weight.device)
+
+    if x_check is not None:
+        drift = encoder_drift(encoder, folded, x_check)
+        if drift > atol:
+            print(f'BatchNorm folding drift {drift:.2e} > {atol:.0e}: using the unfolded encoder')
+            return encoder
+
+    return folded
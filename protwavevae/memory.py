@@ -0,0 +1,90 @@
+"""
+@summary: torch-free memory readings of this process: current and peak resident set size (RSS), the memory still
+available on the node and a background sampler catching the RSS peak of a code block (plus the CUDA peak allocation
+when CUDA is in use). Used by the per-phase telemetry and by the batch-size probe.
+"""
+
+import os
+import resource
+import sys
+import threading
+
+
+_PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 2**20
+# ru_maxrss is reported in kB on Linux and in bytes on macOS
+_MAXRSS_MB = 1 / 2**20 if sys.platform == 'darwin' else 1 / 2**10
+
+
+def peak_rss_mb() -> float:
+    # high-water mark of the process RSS (never decreases)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_MB
+
+
+def current_rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except OSError: # no procfs: the peak is the closest upper bound
+        return peak_rss_mb()
+
+
+def available_mb() -> float:
+    """
+    function description: MemAvailable of the node (None if /proc/meminfo cannot be read).
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return None
+
+
+def _cuda() -> any:
+    # torch.cuda only if torch is already loaded and CUDA in use (never imports torch)
+    torch = sys.modules.get('torch')
+    return torch.cuda if torch is not None and torch.cuda.is_initialized() else None
+
+
+def cuda_peak_mb() -> float:
+    cuda = _cuda()
+    return cuda.max_memory_allocated() / 2**20 if cuda is not None else 0.
+
+
+class Peak_sampler:
+    """
+    class description: context manager reading the current RSS every interval seconds in a background thread;
+    peak_mb is the largest reading, corrected by the process high-water mark if the block raised it (so short
+    spikes between two readings are not missed). cuda_peak_mb is the peak CUDA allocation within the block.
+    """
+    def __init__(self, interval: float=0.002):
+        self.interval = interval
+        self.peak_mb = 0.
+        self.cuda_peak_mb = 0.
+
+    def __enter__(self) -> any:
+        cuda = _cuda()
+        if cuda is not None:
+            cuda.reset_peak_memory_stats()
+
+        self.start_peak_mb = peak_rss_mb()
+        self.peak_mb = current_rss_mb()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+        return self
+
+    def run(self) -> None:
+        while not self.done.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __exit__(self, *exc: any) -> None:
+        self.done.set()
+        self.thread.join()
+
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        if peak_rss_mb() > self.start_peak_mb:
+            self.peak_mb = max(self.peak_mb, peak_rss_mb())
+        self.cuda_peak_mb = cuda_peak_mb()
@@ -0,0 +1,156 @@
+"""
+@summary: micro-batch mode of the Lightning wrappers (Lit_InfoVAE / Lit_SSInfoVAE). A batch of B sequences is trained
+as K micro-batches with gradient accumulation, but the MMD term stays the estimator of the whole batch (the MMD of
+each micro-batch alone is a different, noisier estimator; the kernel of the whole batch with gradients would need the
+activations of all micro-batches at once). One optimizer step takes two passes:
+    1. no-grad encoder pass over the micro-batches: the latents of the whole batch (B x z_dim), the prior samples and
+       the whole-batch MMD are cached,
+    2. per micro-batch: the usual training step (forward with gradients, losses, logging) with the MMD replaced by
+       InfoVAE.compute_mmd_rows (value: the whole-batch MMD; gradient: the exact whole-batch MMD gradient of the
+       micro-batch latents), backpropagated with the other loss terms weighted by the micro-batch share.
+Each micro-batch draws from its own forked RNG stream in both passes, so the second pass reproduces the cached
+latents (same dropout masks and reparameterization noise); BatchNorm statistics are only updated by the second pass.
+Only the activations of one micro-batch are alive at a time.
+With telemetry on, the forward + loss and backward phases of all micro-batches are summed into one call per optimizer
+step (the forward + loss phase of the first micro-batch also holds the latent-cache pass, timed as train/latent_cache).
+"""
+
+import contextlib
+
+import torch
+
+import protwavevae.telemetry as telemetry
+from protwavevae.telemetry import TIMER
+
+
+def split_batch(batch: list, micro_batches: int) -> list:
+    # [(x_1, y_1, ...), ..., (x_K, y_K, ...)] along the batch dimension
+    return list(zip(*[torch.tensor_split(tensor, micro_batches) for tensor in batch]))
+
+
+class Latent_cache:
+    """
+    class description: latents of the whole batch (all micro-batches; all DDP ranks with gather), the prior samples
+    and the whole-batch MMD, from a no-grad encoder pass. index is the micro-batch of the current training step.
+    """
+    def __init__(
+            self,
+            model: torch.nn.Module,
+            xs: list,
+            gather: any=None,
+            world_size: int=1
+        ):
+
+        self.model = model
+        self.world_size = world_size
+        self.sizes = [x.shape[0] for x in xs]
+        self.seeds = torch.randint(2**62, (len(xs),)).tolist() # global RNG: reproducible under seed_everything
+        self.index = 0
+
+        # the encoder runs in training mode: keep its BatchNorm statistics for the second pass
+        buffers = [(buffer, buffer.clone()) for buffer in model.inference.buffers()]
+        with torch.no_grad():
+            z_batch = []
+            for ii, x in enumerate(xs):
+                with self.replay(ii):
+                    z_batch.append(model.sample_latent(x).float())
+            for buffer, value in buffers:
+                buffer.copy_(value)
+
+        z_batch = torch.cat(z_batch)
+        true_samples = torch.randn(z_batch.shape, device = z_batch.device)
+        if gather is not None: # DDP: the MMD of the global batch
+            z_batch, true_samples = gather(z_batch), gather(true_samples)
+
+        self.z_batch = z_batch
+        self.true_samples = true_samples
+        with torch.no_grad(), telemetry.phase('loss/mmd'):
+            self.mmd_batch = model.compute_mmd(true_samples, z_batch)
+
+    @contextlib.contextmanager
+    def replay(self, index: int) -> any:
+        # forked RNG stream of micro-batch index (the global RNG state is left untouched)
+        devices = [torch.cuda.current_device()] if torch.cuda.is_initialized() else []
+        with torch.random.fork_rng(devices = devices):
+            torch.manual_seed(self.seeds[index])
+            self.index = index
+            yield
+
+    def weight(self, index: int=None) -> float:
+        # share of the micro-batch in the batch
+        return self.sizes[self.index if index is None else index] / sum(self.sizes)
+
+    def mmd(self, z_rows: torch.FloatTensor) -> torch.FloatTensor:
+        """
+        function description: whole-batch MMD for the latents of the current micro-batch. The gradient is divided
+        by the micro-batch weight, which the caller applies to the whole loss before the backward pass, and
+        multiplied by the world size: each rank only holds the gradient of its own rows and DDP averages over the
+        ranks (the non-micro path sums them with all_gather(sync_grads=True) before that average).
+        """
+        with telemetry.phase('loss/mmd'):
+            return self.model.compute_mmd_rows(
+                    z_rows.float(),
+                    self.z_batch,
+                    self.true_samples,
+                    self.mmd_batch,
+                    grad_scale = self.world_size / self.weight()
+            )
+
+
+def merge_outputs(outputs: list, weights: list) -> dict:
+    # one output per batch for training_epoch_end: weighted loss, concatenated predictions
+    merged = {'loss': sum(weight * output['loss'].detach() for weight, output in zip(weights, outputs))}
+    for key in outputs[0]:
+        if key != 'loss':
+            merged[key] = torch.cat([output[key].detach() for output in outputs])
+    return merged
+
+
+def no_sync(module: any, last: bool) -> any:
+    # DDP: all-reduce the gradients once per optimizer step (after the last micro-batch) instead of every backward
+    ddp_model = getattr(module.trainer, 'model', None) if module.trainer is not None else None
+    if last or not hasattr(ddp_model, 'no_sync'):
+        return contextlib.nullcontext()
+    return ddp_model.no_sync()
+
+
+def micro_batch_step(
+        module: any,
+        batch: list,
+        batch_idx: int,
+        x_index: int=0,
+        gather: any=None
+    ) -> dict:
+    """
+    function description: one optimizer step of a Lightning wrapper in manual optimization (see its
+    enable_micro_batching) over module.micro_batches micro-batches of batch (batch[x_index]: the one-hot sequences).
+    The wrapper's training_step runs once per micro-batch while module.latent_cache is set.
+    """
+    micro_batches = split_batch(batch, min(module.micro_batches, len(batch[x_index])))
+    optimizer = module.optimizers()
+    optimizer.zero_grad()
+
+    with telemetry.phase('train/latent_cache'):
+        module.latent_cache = Latent_cache(
+                module.model,
+                [micro_batch[x_index] for micro_batch in micro_batches],
+                gather = gather,
+                world_size = module.trainer.world_size if module.trainer is not None else 1
+        )
+
+    outputs, weights = [], []
+    try:
+        for ii, micro_batch in enumerate(micro_batches):
+            if ii > 0: # the telemetry callback opens the phase of the first micro-batch at the start of the batch
+                TIMER.start('train/forward_loss', same_call = True)
+            with no_sync(module, last = ii == len(micro_batches) - 1):
+                with module.latent_cache.replay(ii):
+                    output = module.training_step(micro_batch, batch_idx)
+                weights.append(module.latent_cache.weight(ii))
+                module.manual_backward(output['loss'] * weights[-1])
+            outputs.append(output)
+    finally:
+        module.latent_cache = None
+
+    optimizer.step()
+    return merge_outputs(outputs, weights)
@@ -0,0 +1,1271 @@
+"""
+@Author: Niksa Praljak
+"""
+
+import torch
+from torch import nn
+
+from tqdm import tqdm
+
+import numpy as np
+
+import protwavevae.telemetry as telemetry
+
+"""
+@summary: shared model components of the three projects: gated-CNN encoders, the latent discriminator, and the
+(SS-)InfoVAE with its sampling engines (autoregressive sampling, diversification and the random baselines).
+Project-specific variants subclass these in each project's source/model_components.py.
+
+"""
+
+
+# encoder component
+
+class GatedCNN_encoder(nn.Module):
+
+    def __init__(
+            self,
+            protein_len: int=100,
+            class_labels: int=21,
+            z_dim: int=6,
+            num_rates: int=0,
+            C_in: int=21,
+            C_out: int=256,
+            alpha: float=0.1,
+            kernel: int=3,
+            num_fc: int=1,
+        ) -> None:
+
+
+
+        super(GatedCNN_encoder, self).__init__()
+
+        # define useful parameters:
+        self.protein_len = protein_len
+        self.aa_labels = class_labels
+        self.z_dim = z_dim
+        self.C_in = C_in
+        self.C_out = C_out
+        self.kernel_size = kernel
+        self.num_fc = num_fc
+
+        if num_rates == 0:
+            self.num_rates = self.compute_max_enc_rate()
+        else:
+            self.num_rates = num_rates
+   
+        # initial embedding: convert from one-hot encodings to conv filter features
+        self.initial_conv_blocks = nn.ModuleList()
+        # signal and gate for the input sequences
+        self.signal_convs = nn.ModuleList()
+        self.gate_convs = nn.ModuleList()
+
+        # initial convolutional feature embedding
+        self.initial_conv_blocks.append(nn.Conv1d(self.C_in, self.C_out, kernel_size = 1, padding = 0, bias = True))
+        nn.init.xavier_uniform_(self.initial_conv_blocks[0].weight)
+
+        # batch norm
+        self.batch_norms = nn.ModuleList()
+        self.batch_norms.append(nn.BatchNorm1d(C_out))
+
+
+        # dilation rates: 1, 2, 4, 8, 16, ... , 2^(num_rates - 1)
+        dilation_rates = [2**ii for ii in range(self.num_rates)] # grow by power by 2
+
+
+        for ii, dilation_rate in enumerate(dilation_rates):
+
+            # signal and gate for the input sequences
+            self.signal_convs.append(nn.Conv1d(self.C_out, self.C_out,
+                                               kernel_size = 3,
+                                               padding = 0,
+                                               bias = False,
+                                               dilation = dilation_rate)
+                                    )
+
+            nn.init.xavier_uniform_(self.signal_convs[ii].weight)
+            # add batch norm after the signal operations
+
+            self.gate_convs.append(nn.Conv1d(self.C_out, self.C_out,
+                                               kernel_size = 3,
+                                               padding = 0,
+                                               bias = False,
+                                               dilation = dilation_rate)
+                                    )
+            nn.init.xavier_uniform_(self.gate_convs[ii].weight)
+
+            # add batch norm after the gated-conv
+            self.batch_norms.append(nn.BatchNorm1d(C_out))
+
+        # final conv operation
+        self.final_conv_signal = nn.Conv1d(self.C_out, 1, kernel_size = 1, padding = 0, bias = False)
+        nn.init.xavier_uniform_(self.final_conv_signal.weight)
+
+        self.final_conv_gate = nn.Conv1d(self.C_out, 1, kernel_size = 1, padding = 0, bias = False)
+        nn.init.xavier_uniform_(self.final_conv_gate.weight)
+
+
+        # num of features outputted by the gated convolutional block
+        output_size = (self.protein_len - 2**(self.num_rates-1) * 2 * ( self.kernel_size-1 ) ) + 2
+
+        # add batch norm to the final conv gate
+        self.batch_norms.append(nn.BatchNorm1d(1))
+
+        
+        # final fully connected layers       
+        self.encoder_fully_connected = nn.ModuleList()
+        
+        for ii in range(self.num_fc):
+           
+           self.encoder_fully_connected.append( nn.Linear(output_size, output_size))
+        
+		
+	# mean and variance of the amoritzed varitional approximation
+        self.q_z_mean = nn.Linear(output_size, z_dim)
+        self.q_z_var = nn.Sequential( 
+                nn.Linear(output_size, z_dim),
+                nn.Softplus()
+        )
+
+        # create nonlinear activation functions
+        self.sigm = nn.Sigmoid()
+        self.lrelu = nn.LeakyReLU(negative_slope = 0.1)
+    
+    @staticmethod
+    def compute_Lout(
+               L_in: int,
+               dilation: int,
+               kernel_size: int,
+               padding: int=0,
+               stride: int=1
+        ) -> int:
+        return (L_in + 2 * padding - dilation * (kernel_size - 1) - 1) / stride + 1
+                 
+
+    def compute_max_enc_rate(self,)-> int:
+ 
+        # loop over all possible hyperparameter options
+        for max_enc_dilation in range(1, 100):
+            
+            dilations = [2**ii for ii in range(max_enc_dilation)]
+            L = self.protein_len # set the intial input sequence length
+            
+       
+            try:
+              for dil in dilations:
+
+                 # output sequence length af ter convolution operation
+                 L = GatedCNN_encoder.compute_Lout(
+                                             L_in = L,
+                                             dilation = dil,
+                                             kernel_size = self.kernel_size
+                 )
+
+                 if L <= 0:
+                    raise StopIteration
+
+                 else:
+                    pass
+            
+            except StopIteration:
+              return max_enc_dilation - 1 
+             
+        return max_enc_dilation
+
+
+    def gated_features(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        """
+        function description: gated-conv features before the fully connected layers: (batch_size, aa_labels, L) -> (batch_size, Lout)
+        """
+        # initial embedding
+        x = self.initial_conv_blocks[0](x)
+        x = self.batch_norms[0](x) # apply batch norm
+
+        for ii in range(self.num_rates):
+            # convolutional operation for the signal: tanh(W*X)
+            signal = self.signal_convs[ii](x)
+
+            # convolutional operation for the gate: sigm(W*X)
+            gate = self.gate_convs[ii](x)
+
+            # gated conv operation
+            x = signal * self.sigm( gate )
+            x = self.batch_norms[ii+1](x) # apply batch norm
+
+        # signal + gate for the final output of the gated-convolution block
+        signal = self.final_conv_signal(x)
+        gate = self.final_conv_gate(x)
+        conv_out = signal * self.sigm(gate) # shape: (batch_size, 1, output_length)
+        return self.batch_norms[-1](conv_out).squeeze(1) # apply batch norm
+
+    def forward(
+            self,
+            x: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+            enc_out = self.gated_features(x)
+
+            for ii in range(self.num_fc):
+                h = self.encoder_fully_connected[ii](enc_out)
+                enc_out = self.lrelu(h)
+
+            mu = self.q_z_mean(enc_out) # mean for the latent embedding
+            var = self.q_z_var(enc_out) # variance for the latent embedding
+
+            return (
+                    mu,
+                    var
+            )
+
+    def mode_prediction(self, x: torch.FloatTensor) -> (torch.FloatTensor):
+        """
+        equivalent to doing inf. samples from the encoder model since reparam uses a N(0,I) dist. 
+        """
+        # the fc outputs are not used for the mode prediction (as the Benchmark and Pfam checkpoints were evaluated)
+        mu = self.q_z_mean(self.gated_features(x)) # mean for the latent embedding
+        
+        return mu
+
+
+
+# length-agnostic encoder component
+
+class Masked_BatchNorm1d(nn.BatchNorm1d):
+    """
+    class description: BatchNorm1d whose batch statistics are taken over the unmasked positions only (mask == 1),
+    so the length of the pad tail does not shift the normalization of the residues. Same parameters and buffers
+    as nn.BatchNorm1d; in eval mode the running statistics are used as usual.
+    """
+    def forward(
+            self,
+            x: torch.FloatTensor,
+            mask: torch.FloatTensor
+        ) -> torch.FloatTensor:
+
+        if not self.training and self.track_running_stats:
+            return super(Masked_BatchNorm1d, self).forward(x)
+
+        # x --> (batch_size, C, L), mask --> (batch_size, 1, L)
+        num_positions = mask.sum().clamp(min = 1)
+        mean = torch.sum(x * mask, dim = (0, 2)) / num_positions
+        var = torch.sum((x - mean[None,:,None])**2 * mask, dim = (0, 2)) / num_positions
+
+        if self.training and self.track_running_stats:
+            self.num_batches_tracked += 1
+            factor = 1. / float(self.num_batches_tracked) if self.momentum is None else self.momentum
+            with torch.no_grad():
+                unbiased_var = var * num_positions / (num_positions - 1).clamp(min = 1)
+                self.running_mean.mul_(1 - factor).add_(factor * mean)
+                self.running_var.mul_(1 - factor).add_(factor * unbiased_var)
+
+        x = (x - mean[None,:,None]) / torch.sqrt(var[None,:,None] + self.eps)
+        if self.affine:
+            x = x * self.weight[None,:,None] + self.bias[None,:,None]
+        return x
+
+
+class GatedCNN_varlen_encoder(nn.Module):
+    """
+    class description: gated-CNN encoder that does not depend on the protein length. The dilated gated convs
+    keep the sequence length ('same' padding, odd kernels only), the positions after the last residue are masked
+    out (also from the BatchNorm statistics), and the features are pooled into a fixed size vector with either
+    masked attention pooling or global gated pooling.
+    """
+    def __init__(
+            self,
+            class_labels: int=21,
+            z_dim: int=6,
+            num_rates: int=5,
+            C_in: int=21,
+            C_out: int=256,
+            alpha: float=0.1,
+            kernel: int=3,
+            num_fc: int=1,
+            pooling: str='attention'
+        ) -> None:
+
+        super(GatedCNN_varlen_encoder, self).__init__()
+
+        if kernel % 2 == 0:
+            raise ValueError(f"the length-agnostic encoder needs an odd kernel size for 'same' padding, got {kernel}")
+
+        # define useful parameters:
+        self.protein_len = None # length-agnostic (no re-padding of trimmed batches)
+        self.aa_labels = class_labels
+        self.z_dim = z_dim
+        self.C_in = C_in
+        self.C_out = C_out
+        self.kernel_size = kernel
+        self.num_fc = num_fc
+        self.num_rates = num_rates if num_rates > 0 else 5
+        self.pooling = pooling
+
+        # initial convolutional feature embedding
+        self.initial_conv_blocks = nn.ModuleList()
+        self.initial_conv_blocks.append(nn.Conv1d(self.C_in, self.C_out, kernel_size = 1, padding = 0, bias = True))
+        nn.init.xavier_uniform_(self.initial_conv_blocks[0].weight)
+
+        # batch norm (statistics over the residues, see Masked_BatchNorm1d)
+        self.batch_norms = nn.ModuleList()
+        self.batch_norms.append(Masked_BatchNorm1d(C_out))
+
+        # signal and gate for the input sequences
+        self.signal_convs = nn.ModuleList()
+        self.gate_convs = nn.ModuleList()
+
+        # dilation rates: 1, 2, 4, 8, 16, ... , 2^(num_rates - 1)
+        dilation_rates = [2**ii for ii in range(self.num_rates)]
+
+        for ii, dilation_rate in enumerate(dilation_rates):
+
+            # 'same' padding: output length equals the input length
+            padding = dilation_rate * (self.kernel_size - 1) // 2
+
+            self.signal_convs.append(nn.Conv1d(self.C_out, self.C_out,
+                                               kernel_size = self.kernel_size,
+                                               padding = padding,
+                                               bias = False,
+                                               dilation = dilation_rate)
+                                    )
+            nn.init.xavier_uniform_(self.signal_convs[ii].weight)
+
+            self.gate_convs.append(nn.Conv1d(self.C_out, self.C_out,
+                                               kernel_size = self.kernel_size,
+                                               padding = padding,
+                                               bias = False,
+                                               dilation = dilation_rate)
+                                    )
+            nn.init.xavier_uniform_(self.gate_convs[ii].weight)
+
+            # add batch norm after the gated-conv
+            self.batch_norms.append(Masked_BatchNorm1d(C_out))
+
+        if self.pooling == 'attention':
+            # masked attention pooling: one score per position
+            self.attention_score = nn.Conv1d(self.C_out, 1, kernel_size = 1, bias = True)
+            nn.init.xavier_uniform_(self.attention_score.weight)
+
+        elif self.pooling == 'gated':
+            # global gated pooling: masked average of a final gated conv
+            self.final_conv_signal = nn.Conv1d(self.C_out, self.C_out, kernel_size = 1, padding = 0, bias = False)
+            nn.init.xavier_uniform_(self.final_conv_signal.weight)
+            self.final_conv_gate = nn.Conv1d(self.C_out, self.C_out, kernel_size = 1, padding = 0, bias = False)
+            nn.init.xavier_uniform_(self.final_conv_gate.weight)
+
+        else:
+            raise ValueError(f'Unknown pooling option: {pooling}')
+
+        # final fully connected layers
+        self.encoder_fully_connected = nn.ModuleList()
+
+        for ii in range(self.num_fc):
+           self.encoder_fully_connected.append(nn.Linear(self.C_out, self.C_out))
+
+        # mean and variance of the amoritzed varitional approximation
+        self.q_z_mean = nn.Linear(self.C_out, z_dim)
+        self.q_z_var = nn.Sequential(
+                nn.Linear(self.C_out, z_dim),
+                nn.Softplus()
+        )
+
+        # create nonlinear activation functions
+        self.sigm = nn.Sigmoid()
+        self.lrelu = nn.LeakyReLU(negative_slope = 0.1)
+
+    @staticmethod
+    def compute_mask(x: torch.FloatTensor) -> torch.FloatTensor:
+        """
+        function description: 1 for every position up to the last residue, 0 for the pad tail.
+        x --> (batch_size, aa_labels, L), mask --> (batch_size, 1, L)
+        """
+        residue = x[:,-1,:] < 0.5 # pad token is the last label
+        mask = torch.flip(torch.cummax(torch.flip(residue.long(), dims = [-1]), dim = -1)[0], dims = [-1])
+        return mask.unsqueeze(1).to(x.dtype)
+
+    def pool(self, x: torch.FloatTensor) -> torch.FloatTensor:
+
+        mask = GatedCNN_varlen_encoder.compute_mask(x)
+
+        # initial embedding
+        x = self.batch_norms[0](self.initial_conv_blocks[0](x), mask) * mask
+
+        for ii in range(self.num_rates):
+            # gated conv operation
+            x = self.signal_convs[ii](x) * self.sigm(self.gate_convs[ii](x))
+            x = self.batch_norms[ii+1](x, mask) * mask # apply batch norm and zero the pad tail
+
+        if self.pooling == 'attention':
+            # the mask is a prefix: all-pad rows attend to their (zeroed) first position instead of giving NaN
+            attend = mask.clone()
+            attend[:,:,0] = 1
+            scores = self.attention_score(x).masked_fill(attend == 0, float('-inf'))
+            weights = scores.softmax(dim = -1) # (batch_size, 1, L)
+            return torch.sum(x * weights, dim = -1)
+
+        x = self.final_conv_signal(x) * self.sigm(self.final_conv_gate(x))
+        return torch.sum(x * mask, dim = -1) / mask.sum(dim = -1).clamp(min = 1)
+
+    def forward(
+            self,
+            x: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+
+        enc_out = self.pool(x) # shape: (batch_size, C_out)
+
+        for ii in range(self.num_fc):
+            enc_out = self.lrelu(self.encoder_fully_connected[ii](enc_out))
+
+        mu = self.q_z_mean(enc_out) # mean for the latent embedding
+        var = self.q_z_var(enc_out) # variance for the latent embedding
+
+        return (
+                mu,
+                var
+        )
+
+    def mode_prediction(self, x: torch.FloatTensor) -> (torch.FloatTensor):
+        mu, _ = self.forward(x)
+        return mu
+
+
+# decoder for regression: p(y|z)
+
+class TopModel_layer(nn.Module):
+
+    def __init__(
+            self,
+            in_width: int,
+            out_width: int,
+            p: float = 0.1
+    ):
+
+        super(TopModel_layer,self).__init__()
+
+        self.in_width = in_width
+        self.out_width = out_width
+        self.p = p
+        self.hidden_layer = nn.Sequential(
+                nn.Linear(self.in_width,self.out_width),
+                nn.LayerNorm(self.out_width),
+                nn.SiLU(),
+                nn.Dropout(p = self.p)
+        )
+
+    def forward(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        return self.hidden_layer(x)
+
+
+class Decoder_re(nn.Module):
+
+    def __init__(
+            self,
+            num_layers: int,
+            hidden_width: int,
+            z_dim: int,
+            num_classes: int,
+            p: float=0.1
+        ):
+        super(Decoder_re,self).__init__()
+
+        self.num_layers = num_layers
+        self.hidden_width = hidden_width
+        self.z_dim = z_dim
+        self.num_classes = num_classes
+        self.p = p
+
+        self.reg_model_layers = nn.ModuleList()
+        self.class_model_layers = nn.ModuleList()
+
+        for ii in range(num_layers):
+
+            if ii == 0:
+                
+                # regression model
+                self.reg_model_layers.append(
+                        TopModel_layer(
+                            in_width=self.z_dim,
+                            out_width=self.hidden_width,
+                            p=self.p
+                        )
+                )
+                
+            
+            else:
+ 
+                # regression model
+                self.reg_model_layers.append(
+                        TopModel_layer(
+                            in_width=self.hidden_width,
+                            out_width=self.hidden_width,
+                            p=self.p
+                        )
+                )
+                
+        
+
+        self.output_reg_layer = nn.Linear(self.hidden_width, 1)
+
+
+
+    def reg_forward(self, z: torch.FloatTensor) -> torch.FloatTensor:
+
+        for layer in self.reg_model_layers:
+            z = layer(z)
+        return self.output_reg_layer(z)
+
+
+    def forward(self, z: torch.FloatTensor) -> (
+            torch.FloatTensor,
+        ):
+
+        reg_z = self.reg_forward(z)
+
+        return reg_z
+
+
+# unsupervised InfoVAE (also the base of the SS-InfoVAE and home of the sampling engines)
+
+class InfoVAE(nn.Module):
+    """
+    class description: This is the InfoVAE model. 
+
+    """
+    def __init__(
+            self,
+            DEVICE: str,
+            encoder: any,
+            decoder_recon: any,
+            cond_mapper: any,
+            z_dim: int = 6
+        ):
+        super(InfoVAE, self).__init__()
+
+        # model components:
+        self.inference = encoder
+        self.generator = decoder_recon
+        self.cond_mapper = cond_mapper
+        self.DEVICE = DEVICE
+
+        # additional components:
+        self.softmax = nn.Softmax(dim = -1)
+        
+        # hyperparameters
+        self.z_dim = z_dim
+        # training objective of length-bucketed batches (see reduce_nll): off = the full padded NLL
+        self.masked_pad_nll = False
+	
+    def reparam_trick(
+            self,
+            mu: torch.FloatTensor,
+            var: torch.FloatTensor
+        ) -> torch.FloatTensor:
+        """
+        function description: Samples z from a multivariate Gaussian with diagonal covariance matrix
+        using the reparameterization trick.
+        """
+        std = var.sqrt()
+        eps = torch.rand_like(std)
+        z = mu + eps * std # latent code
+        return z
+	
+    def forward(self, x: torch.FloatTensor) -> (
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+        ):
+        """
+        - data shapes -
+        data:
+                x --> (batch_size, protein_len, aa_labels)
+                mu,var --> (batch_size, z_dim), (batch_size, z_dim)
+		z --> (batch_size, z_dim)
+		z_upscale --> (batch_size, 1, protein_len)
+		logits_xrc --> (batch_size, protein_len, aa_labels)
+		y_pred --> (batch_size, 1)
+        """
+        # q(mu, var|x): the encoder always sees the full padded length
+        z_mu, z_var = self.inference(self.pad_to_protein_len(x).permute(0, 2, 1))
+        # q(z|x)
+        z = self.reparam_trick(z_mu, z_var)
+        # upscale latent code (only for the positions in the batch)
+        z_upscale = self.cond_mapper(z, seq_len=x.shape[1])
+        # p(x|z)
+        logits_xrc = self.generator(x.permute(0,2, 1), z_upscale).permute(0,2,1)
+
+        return (
+                logits_xrc,
+                z, 
+                z_mu,
+                z_var
+        )
+
+    def sample_latent(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        # z ~ q(z|x) exactly as in forward (same random draws in the same order: encoder, then reparameterization)
+        z_mu, z_var = self.inference(self.pad_to_protein_len(x).permute(0, 2, 1))
+        return self.reparam_trick(z_mu, z_var)
+
+    def pad_to_protein_len(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        """
+        function description: re-append the pad tail of length-bucketed batches (see pfam_preprocess.trim_pad_collate).
+        The WaveNet decoder is causal, so its logits for the kept positions do not depend on the trimmed tail.
+        """
+        if self.inference.protein_len is None: # length-agnostic encoder
+            return x
+
+        num_pads = self.inference.protein_len - x.shape[1]
+        if num_pads <= 0:
+            return x
+
+        pad_tail = torch.zeros(x.shape[0], num_pads, x.shape[-1], device=x.device, dtype=x.dtype)
+        pad_tail[:,:,-1] = 1 # pad token is the last label
+        return torch.cat((x, pad_tail), dim = 1)
+
+    @staticmethod
+    def compute_kernel(
+            x: torch.FloatTensor,
+            y: torch.FloatTensor
+        ) -> torch.FloatTensor:
+
+        # size of the mini batches
+        x_size, y_size = x.shape[0], y.shape[0]
+
+        # dimension based on z size
+        dim = x.shape[1] # can also be considered as a hyperparameter
+
+        x = x.view(x_size, 1, dim)
+        y = y.view(1, y_size, dim)
+
+        x_core = x.expand(x_size, y_size, dim)
+        y_core = y.expand(x_size, y_size, dim)
+
+        return torch.exp(-(x_core-y_core).pow(2).mean(2)/dim)
+
+    @staticmethod
+    def compute_mmd(
+            x: torch.FloatTensor,
+            y: torch.FloatTensor
+        ) -> torch.FloatTensor:
+        """
+        function description: compute the max-mean discrepancy
+        arg:
+            x --> random distribution z~p(x)
+            y --> embedding distribution z'~q(z)
+        return:
+            MMD_loss --> max-mean discrepancy loss between the sampled noise
+                  and embedded distribution
+        """
+
+        x_kernel = InfoVAE.compute_kernel(x,x)
+        y_kernel = InfoVAE.compute_kernel(y,y)
+        xy_kernel = InfoVAE.compute_kernel(x,y)
+        return x_kernel.mean() + y_kernel.mean() - 2*xy_kernel.mean()
+
+    @staticmethod
+    def compute_mmd_rows(
+            z_rows: torch.FloatTensor,
+            z_batch: torch.FloatTensor,
+            true_samples: torch.FloatTensor,
+            mmd_batch: torch.FloatTensor,
+            grad_scale: float=1.
+        ) -> torch.FloatTensor:
+        """
+        function description: MMD of a batch of which only z_rows (rows of z_batch) carry gradients, e.g. one
+        micro-batch of a cached batch. The value is mmd_batch (compute_mmd(true_samples, z_batch)); the gradient
+        w.r.t. z_rows is their exact gradient of the whole-batch MMD, times grad_scale.
+        """
+        batch_size, num_samples = z_batch.shape[0], true_samples.shape[0]
+        # terms of the whole-batch MMD that depend on z_rows (the z-z kernel is symmetric: factor 2)
+        live = 2 * InfoVAE.compute_kernel(z_rows, z_batch).sum() / batch_size**2 \
+                - 2 * InfoVAE.compute_kernel(z_rows, true_samples).sum() / (batch_size * num_samples)
+        return mmd_batch + grad_scale * (live - live.detach())
+      
+    def compute_loss(
+            self,
+            xr: torch.FloatTensor,
+            x: torch.FloatTensor,
+            z_pred: torch.FloatTensor,
+            true_samples: torch.FloatTensor,
+            z_mu: torch.FloatTensor,
+            z_var: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor,
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+
+        # POSTERIOR KL-DIVERGENCE loss:
+        with telemetry.phase('loss/kld'):
+            loss_kld = torch.mean(-0.5 * torch.sum(1 + z_var.log() - z_mu ** 2 - z_var, dim = 1), dim = 0)
+        # MMD loss: 
+        with telemetry.phase('loss/mmd'):
+            loss_mmd = InfoVAE.compute_mmd(true_samples, z_pred) # mmd (reg.) loss
+        # RECONSTRUCTION loss:
+        with telemetry.phase('loss/nll'):
+            nll = nn.CrossEntropyLoss(reduction = 'none') # reconstruction loss
+            x_nums = torch.argmax(x, dim = -1).long() # convert ground truth from one hot to num. rep.
+            loss_nll = nll(xr.permute(0, 2, 1), x_nums) # nll for reconstruction
+            #loss_nll = torch.sum(loss_nll, dim = -1) # sum nll along protein sequence
+            loss_nll = self.reduce_nll(loss_nll, x_nums) # average nll along protein sequence
+            loss_nll = torch.mean(loss_nll) # average over the batch
+                   
+ 
+        return (
+                loss_nll,
+                loss_kld,
+                loss_mmd,
+        )
+
+    def padded_len(self, x: torch.Tensor) -> int:
+        # full padded length of the data (length-agnostic encoders: the generator's protein length)
+        return self.inference.protein_len or getattr(self.generator, 'protein_len', None) or x.shape[1]
+
+    def reduce_nll(
+            self,
+            loss_nll: torch.FloatTensor,
+            x_nums: torch.LongTensor
+        ) -> torch.FloatTensor:
+        """
+        function description: per-sequence NLL normalized by the full padded length. The default objective scores
+        every position (batches must be padded to the full length). With masked_pad_nll (training mode only, used
+        with length bucketing) each sequence scores its residues and its first pad (end of sequence) and ignores the
+        pad->pad terms after it; this objective does not depend on how far the batch is padded, so trimmed batches
+        (pfam_preprocess.trim_pad_collate) give the same loss as fully padded ones.
+        """
+        padded_len = self.padded_len(x_nums)
+
+        if self.masked_pad_nll and self.training:
+            pad_token = self.generator.class_labels - 1 if hasattr(self.generator, 'class_labels') else 20
+            positions = torch.arange(1, x_nums.shape[1]+1, device = x_nums.device)
+            seq_lens = ((x_nums != pad_token).long() * positions).max(dim = -1, keepdim = True)[0]
+            keep = positions - 1 <= seq_lens # residues + the first pad
+            return torch.sum(loss_nll * keep, dim = -1) / padded_len
+
+        if x_nums.shape[1] < padded_len:
+            raise ValueError(
+                    f'the padded NLL needs batches of length {padded_len}, got {x_nums.shape[1]} '
+                    '(trimmed batches are only supported with masked_pad_nll)'
+            )
+        return torch.sum(loss_nll, dim = -1) / padded_len
+
+    @torch.no_grad()
+    def aa_sample(
+            self,
+            X: torch.FloatTensor,
+            option: str='categorical',
+            u: torch.FloatTensor=None
+        ) -> torch.FloatTensor:
+        onehot_transformer = torch.eye(21)
+
+        if option=='categorical' and u is not None: # inverse-CDF draw with given uniforms (per-sequence streams)
+            cdf = X.cumsum(dim = -1)
+            X = (cdf < u.to(cdf.dtype).unsqueeze(-1) * cdf[...,-1:]).sum(dim = -1).clamp(max = X.shape[-1]-1)
+
+        elif option=='categorical': # sample from a categorical distribution
+            cate = torch.distributions.Categorical(X)
+            X = cate.sample()
+        
+        else: # sample from an argmax distribution
+            X = torch.argmax(X, dim = -1)
+
+        return onehot_transformer[X]
+
+    def token_uniforms(
+            self,
+            args: any,
+            streams: any,
+            seq_ids: torch.LongTensor,
+            n: int,
+            protein_len: int
+        ) -> torch.FloatTensor:
+        # per-sequence uniforms for the amino acid draws (None: use the global torch RNG)
+        if streams is None:
+            return None
+        seq_ids = torch.arange(n) if seq_ids is None else seq_ids
+        return streams.token_uniforms(seq_ids, protein_len).to(args.DEVICE)
+
+    @torch.no_grad()
+    def sample(
+            self,
+            args: any,
+            X_context: torch.FloatTensor,
+            z: torch.FloatTensor,
+            option: str='categorical',
+            streams: any=None,
+            seq_ids: torch.LongTensor=None
+        ) -> torch.FloatTensor:
+        """
+        function description: autoregressive sampling conditioned on z. With streams (e.g. SH3's source.rng_streams.Counter_streams)
+        every sequence draws from its own counter-based stream indexed by seq_ids (default: 0..n-1), so the samples
+        do not depend on how the sequences are batched.
+        """
+
+        # eval model (important, especially with BatchNorms)
+        self.eval()
+
+        # misc helper variables/objects
+        protein_len = X_context.shape[1] # length of the maximum sequence
+        n = X_context.shape[0] # number of sequences to generate
+        U = self.token_uniforms(args, streams, seq_ids, n, protein_len) # [B, L] or None (global RNG)
+
+	# init. placeholder tensors
+        X_temp = torch.zeros_like(X_context).to(args.DEVICE) # [B, L, 21]
+        X_context = torch.zeros_like(X_context).unsqueeze(1).repeat(1,
+                                                               protein_len+1,
+                                                               1,
+                                                               1
+        ).to(args.DEVICE) # [B, L+1, L, 21]
+
+        # upscale latent code
+        z_context = self.cond_mapper(z, seq_len=protein_len) # linear transformation: [B,6] -> [B, L, 21]
+        # generate first index (only latent code conditioning)
+        X_gen_logits = self.generator(
+                                    X_context[:,0,:,:].permute(0,2,1),
+                                    z_context
+        ).permute(0, 2, 1) # [B, L, 21]
+        # insert amino acid label in the first position
+        X_temp[:,0,:] = self.aa_sample(X_gen_logits.softmax(dim=-1), option=option, u=U)[:,0]
+        # first index of the context is the probability prediction with only latent conditional
+        X_context[:,0,:,:] = X_gen_logits.softmax(dim = -1)
+
+        for ii in tqdm(range(1, protein_len)):
+
+            # make logit predictions for the remaining positions
+            X_gen_logits = self.generator(
+                                    X_temp[:,:,:].permute(0,2,1),
+                                    z_context
+            ).permute(0,2,1)
+            # insert amino acid at the next position
+            X_temp[:,ii,:] = self.aa_sample(X_gen_logits.softmax(dim=-1), option=option, u=U)[:,ii]
+            # update the next index of the conditional tensor
+            X_context[:,ii,:,:] = X_gen_logits.softmax(dim=-1)
+            # update the
+            X_context[:,ii,:ii,:] = X_temp[:,:ii,:]
+
+        # last index is the final latent-based AR prediction
+        X_context[:,-1,:,:] = X_temp
+        return X_context
+
+
+    @torch.no_grad()
+    def diversify(
+        self,
+        args: any,
+        X_context: torch.FloatTensor,
+        z: torch.FloatTensor,
+        L: int=1,
+        option: str='categorical',
+        streams: any=None,
+        seq_ids: torch.LongTensor=None
+        ) -> torch.FloatTensor:
+       
+        # copy context sequence to track the conditioned amino acids
+        X_template = X_context.clone()
+
+        # eval mode (important, especially with BatchNorms)
+        self.eval()
+        
+        # misc helper variables/objects
+        protein_len = X_context.shape[1] # length of the maximum sequence
+        n = X_context.shape[0] # number of sequences to generate
+        U = self.token_uniforms(args, streams, seq_ids, n, protein_len) # [B, L] or None (global RNG)
+        
+	# init. placeholder tensors
+        X_temp = torch.zeros_like(X_context).to(args.DEVICE) # [B, L, 21]
+        X_context = torch.zeros_like(X_context).unsqueeze(1).repeat(1,
+                                                                   protein_len+1,
+                                                                   1,
+                                                                   1
+        ).to(args.DEVICE) # [B, L+1, L, 21]
+        
+        # insert the conditioned amino acids
+        X_temp[:,:L,:] = X_template[:,:L,:]
+        X_context[:,:,:L,:] = X_template.unsqueeze(1).repeat(
+                                                        1,
+                                                        protein_len+1,
+                                                        1,
+                                                        1
+        )[:,:,:L,:]
+
+
+        # upscale latent code
+        z_context = self.cond_mapper(z, seq_len=protein_len) # linear transformation: [B,6] -> [B, L, 21]
+       
+        for ii in tqdm(range(L, protein_len)):
+            
+            # make logit predictions for the remaining positions 
+            X_gen_logits = self.generator(
+                                    X_temp[:,:,:].permute(0,2,1),
+                                    z_context
+            ).permute(0,2,1)
+            # insert amino acid at the next position
+            X_temp[:,ii,:] = self.aa_sample(X_gen_logits.softmax(dim=-1), option=option, u=U)[:,ii]
+            # update the next index of the conditional tensor
+            X_context[:,ii,:,:] = X_gen_logits.softmax(dim=-1)
+            # update the 
+            X_context[:,ii,:ii,:] = X_temp[:,:ii,:]
+         
+        # last index is the final latent-based AR prediction
+        X_context[:,-1,:,:] = X_temp
+        
+        return X_context
+
+
+
+    def create_uniform_tensor(
+            self,
+            args: any,
+            X: torch.FloatTensor,
+            option: str='random'
+        ) -> torch.FloatTensor:
+
+        batch_size, seq_length, aa_length = X.shape
+
+        X_temp = torch.ones_like(X)
+
+        if option == 'random':
+            
+
+            X_temp[:,:,-1] = X_temp[:,:,-1]*0 # give no prob to the padded tokens
+            X_temp[:,:,:-1] = X_temp[:,:,:-1] / (aa_length-1)
+
+        elif option == 'guided':
+
+            X[:,:,-1] = X[:,:,-1]*0 # remove padded tokens
+            X_temp = X_temp - X # removev the ground truth labels
+            X_temp[:,:,-1] = X_temp[:,:,-1]*0 # give no prob to the padded tokens
+            X_temp[:,:,:-1] = X_temp[:,:,:-1] / (aa_length-2)
+
+        return X_temp
+
+    @torch.no_grad()
+    def randomly_diversify(
+        self,
+        args: any,
+        X_context: torch.FloatTensor,
+        L: int=1,
+        option: str='categorical',
+        history: bool=True,
+        streams: any=None,
+        seq_ids: torch.LongTensor=None
+        ) -> torch.FloatTensor:
+        """
+        function description: random baseline that fills every position after L with a uniformly drawn amino acid.
+        The positions do not depend on each other, so all of them are sampled in one call. history=True keeps the
+        [B, L+1, L, 21] step-by-step view; history=False only returns the final sequences ([B, 1, L, 21]).
+        """
+
+        # copy context sequence to track the conditioned amino acids
+        X_template = X_context.clone()
+
+        # eval mode (important, especially with BatchNorms)
+        self.eval()
+
+        # misc helper variables/objects
+        protein_len = X_context.shape[1] # length of the maximum sequence
+        n = X_context.shape[0] # number of sequences to generate
+        U = self.token_uniforms(args, streams, seq_ids, n, protein_len) # [B, L] or None (global RNG)
+
+        # the positions are independent: a single uniform tensor for every free position
+        X_probs = self.create_uniform_tensor(
+                    args=args,
+                    X=X_template
+        ).softmax(dim=-1).to(args.DEVICE)
+
+        # insert the conditioned amino acids and sample all free positions in one call
+        X_temp = X_template.clone().to(args.DEVICE) # [B, L, 21]
+        X_temp[:,L:,:] = self.aa_sample(X_probs[:,L:,:], u=None if U is None else U[:,L:]).to(args.DEVICE)
+
+        if not history:
+            # final samples only
+            return X_temp.unsqueeze(1) # [B, 1, L, 21]
+
+        # step ii holds the samples before position ii and the uniform probs from position ii onwards
+        steps = torch.arange(protein_len+1, device = X_temp.device).unsqueeze(-1)
+        positions = torch.arange(protein_len, device = X_temp.device).unsqueeze(0)
+        X_context = torch.where(
+                (positions < steps)[None,:,:,None],
+                X_temp.unsqueeze(1),
+                X_probs.unsqueeze(1)
+        ) # [B, L+1, L, 21]
+
+        # steps before the start only carry the conditioned amino acids
+        X_context[:,:L,:,:] = 0
+        X_context[:,:L,:L,:] = X_template[:,:L,:].unsqueeze(1).to(args.DEVICE)
+
+        # last index is the final sample
+        return X_context
+
+
+    def pick_pos2mut(self, list_pos: list) -> (
+            list,
+            int
+        ):
+
+        position = np.random.choice((list_pos))
+        list_pos.remove(position)
+
+        return (
+                list_pos,
+                position
+        )
+
+    @torch.no_grad()
+    def guided_randomly_diversify(
+            self,
+            args: any,
+            X_context: torch.FloatTensor,
+            X_design: torch.FloatTensor,
+            L: int=1,
+            min_leven_dists: list=[],
+            option: str='categorical',
+            design_seq_lens: list=[],
+            ref_seq_len: int=100,
+            num_gaps: int=0,
+            history: bool=True,
+            streams: any=None,
+            seq_ids: torch.LongTensor=None
+        ) -> torch.FloatTensor:
+        """
+        function description: mutate min_leven_dists[ii] random positions (in [L, ref_seq_len), extended into the
+        gap region when the window is too short) of the reference sequence for every design ii. All positions are
+        drawn at once (per-row random permutation + count mask) and all residues in one batched sampling call.
+        history=False only returns the final sequences ([B, 1, L, 21]) instead of the [B, L+1, L, 21] history.
+        """
+
+        # copy context sequence to track the conditioned amino acids
+        X_template = X_context.clone()
+
+        # eval mode (important, especially with BatchNorms)
+        self.eval()
+
+        # misc helper variables/objects
+        protein_len = X_context.shape[1] # length of the max seq
+        n = len(min_leven_dists) # number of sequences to mutate
+        DEVICE = X_context.device
+
+        # init. placeholder tensors
+        X_temp = X_template.clone() # [B, L, 21]: insert the whole instead of only the conditional info
+        if history:
+            X_context = X_template.unsqueeze(1).repeat(
+                    1,
+                    protein_len+1,
+                    1,
+                    1
+            )[:,:,:,:]
+
+        # number of sites that fit along the length of the reference sequence
+        ref_window_size = (ref_seq_len - L)
+
+        # mutations per design, and window of allowed positions (extended into the gaps if needed)
+        num_muts = torch.tensor([int(min_leven_dist) for min_leven_dist in min_leven_dists], dtype = torch.long)
+        diffs = (num_muts - ref_window_size).clamp(min = 0) # gaps replaced with amino acids
+        windows = (diffs + ref_window_size).clamp(max = protein_len - L)
+        num_muts = torch.minimum(num_muts, windows)
+
+        # random permutation of the allowed positions per design (positions outside the window sort last)
+        max_window = int(windows.max()) if n > 0 else 0
+        if streams is None:
+            keys = torch.rand(n, max_window)
+        else:
+            keys = streams.position_uniforms(torch.arange(n) if seq_ids is None else seq_ids, max_window)
+        keys[torch.arange(max_window).unsqueeze(0) >= windows.unsqueeze(1)] = 2.
+        order = torch.argsort(keys, dim = -1)
+
+        # keep the first num_muts positions of each permutation
+        max_muts = int(num_muts.max()) if n > 0 else 0
+        mut_mask = torch.arange(max_muts).unsqueeze(0) < num_muts.unsqueeze(1) # [n, max_muts]
+        rows, steps = mut_mask.nonzero(as_tuple = True)
+        positions = L + order[rows, steps]
+        rows, steps, positions = rows.to(DEVICE), steps.to(DEVICE), positions.to(DEVICE)
+
+        # uniform over the amino acids that differ from the reference (pad sites: any amino acid)
+        X_logits = self.create_uniform_tensor(
+                            args=args,
+                            X=X_template.clone(),
+                            option='guided'
+        )
+        site_probs = X_logits[rows, positions] # [num. mutations, 21]
+        U = self.token_uniforms(args, streams, seq_ids, n, protein_len)
+        site_samples = self.aa_sample(
+                                site_probs,
+                                u=None if U is None else U.to(DEVICE)[rows, positions]
+        ).to(DEVICE) # one batched sampling call
+
+        # insert amino acids at the mutated positions
+        X_temp[rows, positions] = site_samples
+        if history:
+            # update the conditional tensor of each mutation step
+            X_context[rows, steps, positions] = site_probs
+
+        # fill in gaps (the last num_gaps - diff positions of each design are pads)
+        num_pads = (num_gaps - diffs).clamp(min = 0).to(DEVICE)
+        pad_mask = torch.arange(protein_len, device = DEVICE).unsqueeze(0) >= (protein_len - num_pads).unsqueeze(1)
+        X_temp[:n][pad_mask] = torch.eye(X_temp.shape[-1], device = DEVICE)[-1]
+
+        print(f'Length start {L} and mutation window size:', ref_window_size)
+
+        if not history:
+            return X_temp[:n].unsqueeze(1)
+
+        # last index is the final sample
+        X_context[:n,-1,:,:] = X_temp[:n]
+        return X_context
+
+
+
+# Create SS-InfoVAE arhictecture using components from above:
+
+class SS_InfoVAE(InfoVAE):
+    """
+    class description: This is the semi-supervised InfoVAE model (InfoVAE + discriminator p(y|z)).
+
+    """
+    def __init__(
+            self,
+            DEVICE: str,
+            encoder: any,
+            decoder_recon: any,
+            cond_mapper: any,
+            decoder_pheno: any,
+            z_dim: int = 6
+        ):
+        super(SS_InfoVAE, self).__init__(
+                DEVICE=DEVICE,
+                encoder=encoder,
+                decoder_recon=decoder_recon,
+                cond_mapper=cond_mapper,
+                z_dim=z_dim
+        )
+
+        # model components:
+        self.discriminator = decoder_pheno
+
+    def forward(self, x: torch.FloatTensor) -> (
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor
+        ):
+        """
+        - data shapes -
+        data:
+                x --> (batch_size, protein_len, aa_labels)
+                mu,var --> (batch_size, z_dim), (batch_size, z_dim)
+		z --> (batch_size, z_dim)
+		z_upscale --> (batch_size, 1, protein_len)
+		logits_xrc --> (batch_size, protein_len, aa_labels)
+		y_pred --> (batch_size, 1)
+        """
+        # the semi-supervised model is trained on full-length batches only (no length bucketing)
+        if self.inference.protein_len is not None and x.shape[1] != self.inference.protein_len:
+            raise ValueError(
+                    f'SS_InfoVAE expects sequences padded to protein_len={self.inference.protein_len}, '
+                    f'got length {x.shape[1]} (length-bucketed batches are only supported by InfoVAE)'
+            )
+        # q(mu, var|x)
+        z_mu, z_var = self.inference(x.permute(0, 2, 1))
+        # q(z|x)
+        z = self.reparam_trick(z_mu, z_var)
+        # upscale latent code
+        z_upscale = self.cond_mapper(z, seq_len=x.shape[1])
+        # p(x|z)
+        logits_xrc = self.generator(x.permute(0,2, 1), z_upscale).permute(0,2,1)
+        # p(y|z)
+        y_pred_R = self.discriminator(z)
+
+        return (
+                logits_xrc,
+                y_pred_R,
+                z, 
+                z_mu,
+                z_var
+        )
+
+    def compute_vae_loss(
+            self,
+            xr: torch.FloatTensor,
+            x: torch.FloatTensor,
+            z_pred: torch.FloatTensor,
+            true_samples: torch.FloatTensor,
+            z_mu: torch.FloatTensor,
+            z_var: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+        """
+        function description: reconstruction, KL-divergence and MMD losses (the phenotype-independent part of
+        compute_loss, shared with the SH3 model whose discriminator adds a classification loss).
+        """
+        # POSTERIOR KL-DIVERGENCE loss:
+        with telemetry.phase('loss/kld'):
+            loss_kld = torch.mean(-0.5 * torch.sum(1 + z_var.log() - z_mu ** 2 - z_var, dim = 1), dim = 0)
+        # MMD loss: 
+        with telemetry.phase('loss/mmd'):
+            loss_mmd = InfoVAE.compute_mmd(true_samples, z_pred) # mmd (reg.) loss
+        # RECONSTRUCTION loss:
+        with telemetry.phase('loss/nll'):
+            nll = nn.CrossEntropyLoss(reduction = 'none') # reconstruction loss
+            x_nums = torch.argmax(x, dim = -1).long() # convert ground truth from one hot to num. rep.
+            loss_nll = nll(xr.permute(0, 2, 1), x_nums) # nll for reconstruction
+            #loss_nll = torch.sum(loss_nll, dim = -1) # sum nll along protein sequence
+            loss_nll = torch.mean(loss_nll, dim = -1) # average nll along protein sequence
+            loss_nll = torch.mean(loss_nll) # average over the batch
+
+        return (
+                loss_nll,
+                loss_kld,
+                loss_mmd
+        )
+
+    def compute_loss(
+            self,
+            xr: torch.FloatTensor,
+            x: torch.FloatTensor,
+            y_pred_R: torch.FloatTensor,
+            y_true_R: torch.FloatTensor,
+            z_pred: torch.FloatTensor,
+            true_samples: torch.FloatTensor,
+            z_mu: torch.FloatTensor,
+            z_var: torch.FloatTensor
+        ) -> (
+                torch.FloatTensor,
+                torch.FloatTensor,
+                torch.FloatTensor,
+                torch.FloatTensor
+        ):
+
+        loss_nll, loss_kld, loss_mmd = self.compute_vae_loss(
+                xr=xr,
+                x=x,
+                z_pred=z_pred,
+                true_samples=true_samples,
+                z_mu=z_mu,
+                z_var=z_var
+        )
+        # DISCRIMINATION loss:
+        with telemetry.phase('loss/pheno'):
+            try:
+                # for regression loss
+                loss_pheno_MSE = nn.MSELoss()
+                loss_pheno = loss_pheno_MSE(y_pred_R, y_true_R)
+        
+            except RuntimeError: # if the whole batch didn't have experimental true labels
+                loss_pheno = torch.tensor([0]).to(self.DEVICE)
+                   
+        return (
+                loss_nll,
+                loss_kld,
+                loss_mmd,
+                loss_pheno
+        )
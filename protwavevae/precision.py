@@ -0,0 +1,80 @@
+"""
+@summary: opt-in bfloat16 mixed precision. The top-level blocks of a model (encoder, WaveNet generator, conditioning
+network, discriminative decoder) run their conv/linear layers under bfloat16 autocast and hand float32 tensors back,
+so the KLD/MMD/NLL reductions computed from their outputs stay in float32. BatchNorm layers always see float32
+inputs, which keeps their batch statistics and running buffers in float32.
+"""
+
+import argparse
+
+import torch
+from torch import nn
+
+
+def bf16_available() -> bool:
+    # torch.autocast with a CPU bfloat16 policy exists from torch 1.10 onwards (the pinned version, see requirements.txt)
+    return hasattr(torch, 'autocast')
+
+
+def bf16_flag(value: str) -> int:
+    """
+    function description: argparse type of the --bf16 flags, so that --bf16 1 is rejected at startup on a torch
+    without bfloat16 autocast instead of failing after the data and model are built.
+    """
+    flag = int(value)
+    if flag and not bf16_available():
+        raise argparse.ArgumentTypeError(f'bfloat16 autocast needs torch >= 1.10 (installed: {torch.__version__})')
+    return flag
+
+
+def _to_fp32(outputs: any) -> any:
+    if torch.is_tensor(outputs):
+        return outputs.float() if outputs.is_floating_point() else outputs
+    if isinstance(outputs, (tuple, list)):
+        return type(outputs)(_to_fp32(output) for output in outputs)
+    return outputs
+
+
+def _device_type(inputs: tuple) -> str:
+    for x in inputs:
+        if torch.is_tensor(x):
+            return x.device.type
+    return 'cpu'
+
+
+class Bf16_forward:
+    """
+    class description: instance forward of a block under enable_bf16: the class forward inside a bfloat16 autocast
+    context (left even if the forward raises), with float32 outputs. It only keeps a reference to its block, so the
+    model can still be deep-copied, pickled and saved as a state_dict.
+    """
+    def __init__(self, module: nn.Module):
+        self.module = module
+
+    def __call__(self, *inputs: any, **kwargs: any) -> any:
+        with torch.autocast(device_type = _device_type(inputs), dtype = torch.bfloat16):
+            outputs = type(self.module).forward(self.module, *inputs, **kwargs)
+        return _to_fp32(outputs)
+
+
+def _norm_inputs_fp32(module: nn.Module, inputs: tuple) -> tuple:
+    return tuple(_to_fp32(x) for x in inputs)
+
+
+def enable_bf16(model: nn.Module) -> nn.Module:
+    """
+    function description: run every child block of model under bfloat16 autocast (in place).
+    """
+    if not bf16_available():
+        raise RuntimeError('bfloat16 autocast needs torch >= 1.10')
+
+    for block in model.children():
+        if not isinstance(block.__dict__.get('forward'), Bf16_forward): # enabled once
+            block.forward = Bf16_forward(block)
+
+            # BatchNorm/LayerNorm statistics in float32
+            for module in block.modules():
+                if isinstance(module, (nn.modules.batchnorm._BatchNorm, nn.LayerNorm)):
+                    module.register_forward_pre_hook(_norm_inputs_fp32)
+
+    return model
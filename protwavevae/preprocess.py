@@ -0,0 +1,275 @@
+"""
+@author: Niksa Praljak
+
+@summary: shared sequence preprocessing (padding, tokenization), the SH3 dataset and the block-sliced tensor
+dataloader. The SH3 and Pfam projects use this module as is; the Benchmark task datasets build on pad_ends and
+create_num_seqs, and the Benchmark/Pfam tensor loaders on create_tensor_dataloader.
+"""
+
+
+
+import copy
+
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+
+import numpy as np
+import pandas as pd
+from numba import jit
+
+
+' ___________ Preprocess for Wavenet-based autoregressive decoder ___________'
+
+
+
+
+@jit(nopython=True)
+def pad_ends(
+        seqs:list,
+        max_seq_length:int
+    ) -> list:
+
+    padded_seqs = [] # end padded gaps at the end of each sequence
+    for seq in seqs:
+        
+        seq_length = len(seq)
+        # number of pads needed
+        pad_need = max_seq_length - seq_length
+        # add number of padded tokens to the end
+        seq += '-'*pad_need
+
+        padded_seqs.append(seq)
+
+    return padded_seqs
+
+
+# creatae numerical represented sequences
+def create_num_seqs(seq_list:list) -> list:
+
+    """
+        function description: convert amino acid tokens into numerical values -- preprocess sequences into their corresponding num. reps.
+    """
+
+
+    # tokenizer
+    token2int = {x:ii for ii, x in enumerate('ACDEFGHIKLMNPQRSTVWY-')}
+
+    # empty list to hold num rep. seqs.
+    num_seq_list = []
+
+    # convert aa labels into num labels.
+    for seq in seq_list:
+        num_seq_list.append([token2int[aa] for aa in seq])
+
+
+    return num_seq_list
+
+
+def prepare_SH3_data(
+        df: pd.Series,
+        max_seq_len: int,
+        unaligned: int = 0
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    """
+    function description: preparing sh3 data.
+    """
+
+    annotated_df = df.iloc[df.RE_norm.dropna().index] # drop indexes without any norm R.E.
+
+    # prepare sequences
+    seq_list = [seq.replace('-','') for seq in list(df.Sequences_unaligned)]
+    seq_lens = [len(seq) for seq in seq_list]
+    padded_seq_list = pad_ends(seqs=seq_list, max_seq_length=max_seq_len)
+    num_seq_list = create_num_seqs(padded_seq_list) # numerical representations
+
+    '_______ Create dataset for training ______'
+
+    onehot_transformer = torch.eye(21) # converter for creating  one-hot encodings
+    X_onehot = onehot_transformer[num_seq_list] # create one-hot tensors
+
+    # create torch datasets
+    # --------------------
+    # (1) create numerical represented sequences
+    # num_seq_inputs = torch.tensor(num_seq_list) # do not need this for now...
+    # (2) create one-hot encoded sequences
+    X_onehot = torch.FloatTensor(X_onehot)
+    # (3) create r.e. scores
+    y_RE_reg = torch.FloatTensor(df.RE_norm.values).unsqueeze(1)
+    # (4) create allowed loss terms and predictions
+    accept_loss_samples = (~df.RE_norm.isnull()*1.).values # since some samples do not have exp. assay values, we want to ignore these values for disc loss
+    accept_loss_samples = torch.FloatTensor(accept_loss_samples).unsqueeze(1)
+    # (5) create binary classes
+    y_RE_class = (y_RE_reg > 0.5)*1.0
+    
+    return (
+            X_onehot,
+            y_RE_reg,
+            y_RE_class,
+            accept_loss_samples
+    )
+
+
+
+class SH3_dataset(Dataset):
+    """ 
+    Sequence dataloader
+    """
+
+    def __init__(
+            self,
+            onehot_inputs: torch.FloatTensor,
+            re_inputs: torch.FloatTensor,
+            C_inputs: torch.FloatTensor,
+            accept_inputs: torch.FloatTensor,
+            transform: bool=True
+        ):
+
+
+        if not torch.is_tensor(re_inputs):
+            self.re_inputs = torch.tensor(re_inputs).float()
+        else:
+            self.re_inputs = re_inputs
+
+        if not torch.is_tensor(onehot_inputs):
+            self.onehot_inputs = torch.tensor(onehot_inputs).float()
+        else:
+            self.onehot_inputs = onehot_inputs
+
+        if not torch.is_tensor(accept_inputs):
+            self.accept_inputs = torch.tensor(accept_inputs).float()
+        else:
+            self.accept_inputs = accept_inputs
+
+        if not torch.is_tensor(C_inputs):
+            self.C_inputs = torch.tensor(C_inputs).float()
+        else:
+            self.C_inputs = C_inputs
+
+
+        self.transform = transform
+
+
+
+
+    def __len__(self,):
+        """
+        number of samples total
+        """
+        return len(self.onehot_inputs)
+
+
+    def __getitem__(self, idx:any) -> (
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor
+        ):
+        """
+        extract and return the data batch samples
+        """
+    
+        # convert the tensor to a simple list
+        if torch.is_tensor(idx):
+            idx = idx.tolist()
+
+        # r.e. score:
+        y_re_reg = self.re_inputs[idx]
+        # classification r.e.
+        y_re_class = self.C_inputs[idx]
+        # accept loss predictions
+        accept_loss_preds = self.accept_inputs[idx]
+        # onehot encoded sequences
+        X_onehot = self.onehot_inputs[idx]
+        
+        return (
+                X_onehot,
+                y_re_reg,
+                y_re_class,
+                accept_loss_preds
+        )
+
+
+' ___________ Tensor batch iterator (Benchmark and Pfam tensor loaders): ___________'
+
+class Block_sampler(Sampler):
+    """
+    class description: yields whole blocks of (shuffled) indexes. Used with batch_size=None, so each batch is
+    gathered from the stored tensors with a single indexing op instead of per-sample __getitem__ calls + collate.
+    """
+
+    def __init__(
+            self,
+            data_size: int,
+            batch_size: int,
+            shuffle: bool=True,
+            drop_last: bool=False,
+            seed: int=42
+        ):
+
+        self.data_size = data_size
+        self.batch_size = int(batch_size)
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    def __iter__(self,):
+
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        self.epoch += 1
+
+        order = torch.randperm(self.data_size, generator = generator) if self.shuffle else torch.arange(self.data_size)
+
+        for block in torch.split(order, self.batch_size):
+            if self.drop_last and len(block) < self.batch_size:
+                break
+            yield block
+
+    def __len__(self,) -> int:
+        if self.drop_last:
+            return self.data_size // self.batch_size
+        return -(-self.data_size // self.batch_size)
+
+    def with_batch_size(self, batch_size: int) -> Sampler:
+        # same data, shuffling, seed and epoch with another block size (see batch_probe.rebatch)
+        sampler = copy.copy(self)
+        sampler.batch_size = int(batch_size)
+        return sampler
+
+
+def create_tensor_dataloader(
+        dataset: Dataset,
+        batch_size: int,
+        shuffle: bool=True,
+        DEVICE: str='cpu',
+        pin_memory: bool=False,
+        seed: int=42
+    ) -> DataLoader:
+    """
+    function description: in-memory dataloader that slices index blocks straight out of the dataset tensors.
+    With DEVICE != 'cpu' the tensors are moved to the device once, so batches are already on the device.
+    """
+    if DEVICE != 'cpu':
+        for name, value in list(vars(dataset).items()):
+            if torch.is_tensor(value):
+                setattr(dataset, name, value.to(DEVICE))
+
+    return DataLoader(
+            dataset,
+            sampler = Block_sampler(
+                        data_size = len(dataset),
+                        batch_size = batch_size,
+                        shuffle = shuffle,
+                        seed = seed
+            ),
+            batch_size = None, # the sampler yields whole batches of indexes
+            num_workers = 0,
+            pin_memory = pin_memory and DEVICE == 'cpu'
+    )
@@ -0,0 +1,161 @@
+"""
+@summary: int8 post-training quantization of a trained InfoVAE/SS_InfoVAE for CPU inference. The linear layers
+(encoder heads, Decoder_re) and every 1x1 convolution (encoder embedding/final/attention convs, Wave_generator
+causal/cond/skip/residual/top-head convs) are quantized; the dilated k>1 convolutions stay in float32. The SH3 and
+Pfam projects use it through their source.quantize adapters.
+"""
+
+import copy
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+import numpy as np
+import pandas as pd
+
+
+class Conv1x1_linear(nn.Module):
+    """
+    class description: 1x1 Conv1d written as a nn.Linear over the channel axis, so that dynamic int8
+    quantization (which only covers nn.Linear layers) also reaches the pointwise convolutions.
+    """
+    def __init__(self, conv: nn.Conv1d):
+        super(Conv1x1_linear, self).__init__()
+
+        self.linear = nn.Linear(conv.in_channels, conv.out_channels, bias = conv.bias is not None)
+        self.linear.weight.data.copy_(conv.weight.data.squeeze(-1))
+        if conv.bias is not None:
+            self.linear.bias.data.copy_(conv.bias.data)
+
+    def forward(self, x: torch.FloatTensor) -> torch.FloatTensor:
+        # [B, C_in, L] -> [B, L, C_in] -> [B, L, C_out] -> [B, C_out, L]
+        return self.linear(x.transpose(1, 2)).transpose(1, 2)
+
+
+def is_pointwise_conv(module: nn.Module) -> bool:
+    return (
+            type(module) == nn.Conv1d # excludes Causal_conv1d (masked padding)
+            and module.kernel_size == (1,)
+            and module.stride == (1,)
+            and module.padding == (0,)
+            and module.dilation == (1,)
+            and module.groups == 1
+    )
+
+
+def convert_pointwise_convs(module: nn.Module) -> nn.Module:
+    """
+    function description: recursively swap every 1x1 Conv1d for an equivalent Conv1x1_linear (in place).
+    """
+    for name, child in module.named_children():
+        if is_pointwise_conv(child):
+            setattr(module, name, Conv1x1_linear(child))
+        else:
+            convert_pointwise_convs(child)
+    return module
+
+
+def quantize_model(model: nn.Module) -> nn.Module:
+    """
+    function description: returns an int8 (dynamic, per-tensor activations) copy of a trained model for CPU inference.
+    The float32 model is left untouched so it can still be used as the reference in the drift report.
+    """
+    engines = torch.backends.quantized.supported_engines
+    torch.backends.quantized.engine = 'fbgemm' if 'fbgemm' in engines else 'qnnpack'
+
+    model_int8 = copy.deepcopy(model).cpu().eval()
+    model_int8 = convert_pointwise_convs(model_int8)
+    model_int8 = torch.quantization.quantize_dynamic(
+            model_int8,
+            {nn.Linear},
+            dtype = torch.qint8
+    )
+    model_int8.DEVICE = 'cpu'
+    return model_int8
+
+
+@torch.no_grad()
+def calibration_scores(
+        model: nn.Module,
+        X: torch.FloatTensor,
+        batch_size: int=256
+    ) -> (
+            torch.FloatTensor,
+            torch.FloatTensor,
+            torch.FloatTensor
+    ):
+    """
+    function description: per-sequence NLL (mean over positions, as in compute_loss), discriminator
+    prediction (semi-supervised models, otherwise empty) and latent mean. The posterior mean is used so that both
+    models see the same z noise-free.
+    """
+    model.eval()
+
+    nll, y_pred, z_mu = [], [], []
+    for X_batch in torch.split(X, batch_size):
+
+        X_batch = X_batch.cpu()
+        mu, _ = model.inference(X_batch.permute(0, 2, 1))
+        logits = model.generator(X_batch.permute(0, 2, 1), model.cond_mapper(mu, seq_len = X_batch.shape[1])) # [B, 21, L]
+        nll.append(F.cross_entropy(logits, X_batch.argmax(dim = -1), reduction = 'none').mean(dim = -1))
+        if hasattr(model, 'discriminator'):
+            y_pred.append(model.discriminator.reg_forward(mu).squeeze(-1))
+        z_mu.append(mu)
+
+    return (
+            torch.cat(nll),
+            torch.cat(y_pred) if y_pred else torch.zeros(0),
+            torch.cat(z_mu)
+    )
+
+
+def quantization_drift(
+        model_fp32: nn.Module,
+        model_int8: nn.Module,
+        X_calib: torch.FloatTensor,
+        batch_size: int=256
+    ) -> pd.DataFrame:
+    """
+    function description: likelihood and ranking drift of the int8 model against the float32 reference on a
+    calibration sample of training sequences.
+    """
+    from scipy.stats import spearmanr
+
+    fp32_model = copy.deepcopy(model_fp32).cpu()
+    nll_fp32, y_fp32, z_fp32 = calibration_scores(fp32_model, X_calib, batch_size)
+    nll_int8, y_int8, z_int8 = calibration_scores(model_int8, X_calib, batch_size)
+
+    report = {
+            'num_calib_seqs': X_calib.shape[0],
+            'nll_fp32': nll_fp32.mean().item(),
+            'nll_int8': nll_int8.mean().item(),
+            'nll_abs_drift': (nll_int8 - nll_fp32).abs().mean().item(),
+            'nll_spearman': spearmanr(nll_fp32.numpy(), nll_int8.numpy())[0]
+    }
+    if y_fp32.numel() > 0: # semi-supervised models: drift of the phenotype predictions
+        report['pheno_abs_drift'] = (y_int8 - y_fp32).abs().mean().item()
+        report['pheno_spearman'] = spearmanr(y_fp32.numpy(), y_int8.numpy())[0]
+    report['z_mean_abs_drift'] = (z_int8 - z_fp32).abs().mean().item()
+    return pd.DataFrame([report])
+
+
+def calibrate_and_quantize(
+        model: nn.Module,
+        X_train: torch.FloatTensor,
+        drift_path: str,
+        num_calib: int=512
+    ) -> nn.Module:
+    """
+    function description: quantize the model, check it against float32 on a random sample of the training
+    sequences and write the drift report to drift_path.
+    """
+    calib_idx = np.random.choice(X_train.shape[0], size = min(num_calib, X_train.shape[0]), replace = False)
+    X_calib = X_train[torch.as_tensor(calib_idx)].float()
+
+    model_int8 = quantize_model(model)
+    drift_df = quantization_drift(model, model_int8, X_calib)
+    drift_df.to_csv(drift_path, index = False)
+    print('int8 quantization drift against float32:\n', drift_df.T)
+
+    return model_int8
@@ -0,0 +1,226 @@
+"""
+@summary: low-overhead per-phase timing for training and generation runs. Off by default; switched on by the
+--profile flag of the entry points or by the environment variable PROTWAVEVAE_PROFILE=1. While off, a phase is a
+shared no-op context manager, so the instrumented hot paths only pay for one attribute lookup.
+Phases are named 'group/name' (e.g. 'loss/mmd', 'forward/generator'); nested phases are timed inclusively. The
+per-run summary (calls, total and mean time, share of the wall time) is written next to the results CSV, together
+with the memory of every phase: the largest RSS at the end of a call (rss_mb) and how much the phase raised the
+process peak RSS (peak_rise_mb; the phases with the largest rise are the ones to shrink when a run gets OOM-killed).
+"""
+
+import contextlib
+import csv
+import functools
+import os
+import sys
+import time
+
+from protwavevae.memory import current_rss_mb, peak_rss_mb
+
+
+ENV_VAR = 'PROTWAVEVAE_PROFILE'
+
+# submodules of InfoVAE/SS_InfoVAE timed by instrument()
+SUBMODULES = ['inference', 'cond_mapper', 'generator', 'discriminator']
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class _Phase:
+
+    def __init__(self, timer: any, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.timer.sync()
+        self.start = (time.perf_counter(), peak_rss_mb())
+
+    def __exit__(self, *exc: any) -> None:
+        self.timer.sync()
+        self.timer.add(self.name, *self.start)
+
+
+class Phase_timer:
+    """
+    class description: accumulates (calls, seconds, max. RSS, peak RSS rise) per phase. With sync_cuda, the CUDA stream is synchronized at
+    every phase boundary so that asynchronous kernels are charged to the phase that launched them.
+    """
+    def __init__(
+            self,
+            enabled: bool=False,
+            sync_cuda: bool=True
+        ):
+
+        self.enabled = enabled
+        self.sync_cuda = sync_cuda
+        self.totals = {} # phase -> [calls, seconds, max. RSS (MB), peak RSS rise (MB)]
+        self.open = {} # phase -> (start time, peak RSS, new call) of start/stop pairs (callbacks and hooks)
+        self.wall_start = time.perf_counter()
+        self.wall_peak_mb = peak_rss_mb()
+
+    def enable(self, sync_cuda: bool=True) -> None:
+        if not self.enabled: # enabling twice keeps the phases timed so far
+            self.reset()
+        self.enabled = True
+        self.sync_cuda = sync_cuda
+
+    def reset(self) -> None:
+        self.totals, self.open = {}, {}
+        self.wall_start = time.perf_counter()
+        self.wall_peak_mb = peak_rss_mb()
+
+    def sync(self) -> None:
+        # only if torch is already loaded and CUDA in use (never imports torch)
+        torch = sys.modules.get('torch')
+        if self.sync_cuda and torch is not None and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+
+    def add(self, name: str, start: float, start_peak_mb: float, new_call: bool=True) -> None:
+        total = self.totals.setdefault(name, [0, 0., 0., 0.])
+        total[0] += int(new_call)
+        total[1] += time.perf_counter() - start
+        total[2] = max(total[2], current_rss_mb())
+        total[3] += peak_rss_mb() - start_peak_mb
+
+    def phase(self, name: str) -> any:
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def start(self, name: str, same_call: bool=False) -> None:
+        # same_call: the time is added to the last call of the phase (e.g. the micro-batches of one training step)
+        if self.enabled:
+            self.sync()
+            self.open[name] = (time.perf_counter(), peak_rss_mb(), not same_call)
+
+    def stop(self, name: str) -> None:
+        if self.enabled and name in self.open:
+            self.sync()
+            self.add(name, *self.open.pop(name))
+
+    def summary(self) -> list:
+        wall = time.perf_counter() - self.wall_start
+        rows = [
+                {
+                    'phase': name,
+                    'calls': calls,
+                    'total_s': seconds,
+                    'mean_ms': 1e3 * seconds / calls,
+                    'wall_share': seconds / wall if wall > 0 else 0.,
+                    'rss_mb': rss_mb,
+                    'peak_rise_mb': rise_mb
+                }
+                for name, (calls, seconds, rss_mb, rise_mb) in sorted(self.totals.items(), key = lambda item: -item[1][1])
+        ]
+        rows.append(
+                {
+                    'phase': 'wall',
+                    'calls': 1,
+                    'total_s': wall,
+                    'mean_ms': 1e3 * wall,
+                    'wall_share': 1.,
+                    'rss_mb': peak_rss_mb(), # process peak
+                    'peak_rise_mb': peak_rss_mb() - self.wall_peak_mb
+                }
+        )
+        return rows
+
+
+# process-wide timer (enabled by the environment variable or by enable())
+TIMER = Phase_timer(enabled = os.environ.get(ENV_VAR, '0') not in ['', '0'])
+
+
+def enabled() -> bool:
+    return TIMER.enabled
+
+
+def enable(sync_cuda: bool=True) -> None:
+    TIMER.enable(sync_cuda = sync_cuda)
+
+
+def phase(name: str) -> any:
+    return TIMER.phase(name)
+
+
+def timed(name: str) -> any:
+    """
+    function description: decorator timing every call of a function/method as one phase.
+    """
+    def decorator(func: any) -> any:
+        @functools.wraps(func)
+        def wrapper(*args: any, **kwargs: any) -> any:
+            if not TIMER.enabled:
+                return func(*args, **kwargs)
+            with TIMER.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(model: any, names: list=SUBMODULES) -> list:
+    """
+    function description: times the forward pass of each named submodule ('forward/<name>') with forward
+    pre/post hooks; returns the hook handles (handle.remove() detaches them). No-op while the timer is off.
+    """
+    handles = []
+    if not TIMER.enabled:
+        return handles
+
+    for name in names:
+        module = getattr(model, name, None)
+        if module is None:
+            continue
+        handles.append(module.register_forward_pre_hook(lambda *_, key=f'forward/{name}': TIMER.start(key)))
+        handles.append(module.register_forward_hook(lambda *_, key=f'forward/{name}': TIMER.stop(key)))
+    return handles
+
+
+def summary_path(results_path: str) -> str:
+    # <results>.csv -> <results>_telemetry.csv
+    root, _ = os.path.splitext(results_path)
+    return f'{root}_telemetry.csv'
+
+
+def write_summary(results_path: str) -> str:
+    """
+    function description: writes the per-phase summary next to the results CSV (if the timer is on) and prints it.
+    """
+    if not TIMER.enabled:
+        return None
+
+    rows = TIMER.summary()
+    path = summary_path(results_path)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames = list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f'\n{"phase":32s} {"calls":>8s} {"total_s":>10s} {"mean_ms":>10s} {"share":>7s} {"rss_mb":>9s} {"peak_rise_mb":>12s}')
+    for row in rows:
+        print(
+            f'{row["phase"]:32s} {row["calls"]:8d} {row["total_s"]:10.3f} {row["mean_ms"]:10.3f} {100 * row["wall_share"]:6.1f}%'
+            f' {row["rss_mb"]:9.1f} {row["peak_rise_mb"]:12.1f}'
+        )
+    print(f'Telemetry summary: {path}')
+    return path
+
+
+def torch_profiler(
+        trace_dir: str,
+        active_steps: int,
+        wait_steps: int=1,
+        warmup_steps: int=1
+    ) -> any:
+    """
+    function description: torch.profiler capturing active_steps steps (after wait + warm-up steps) into a
+    TensorBoard/Chrome trace in trace_dir; call .step() once per step.
+    """
+    import torch
+
+    os.makedirs(trace_dir, exist_ok = True)
+    return torch.profiler.profile(
+            activities = [torch.profiler.ProfilerActivity.CPU] + ([torch.profiler.ProfilerActivity.CUDA] if torch.cuda.is_available() else []),
+            schedule = torch.profiler.schedule(wait = wait_steps, warmup = warmup_steps, active = active_steps, repeat = 1),
+            on_trace_ready = torch.profiler.tensorboard_trace_handler(trace_dir),
+            record_shapes = True,
+            profile_memory = True
+    )
@@ -0,0 +1,114 @@
+"""
+@summary: Lightning side of protwavevae.telemetry (kept apart so that generation scripts do not import Lightning).
+The callback splits every training step into data fetch, forward + loss, backward and optimizer phases (validation:
+data fetch and step) and optionally drives a torch.profiler capture of the first training steps. In micro-batch mode
+the forward + loss and backward phases of the micro-batches are summed per training step (see
+protwavevae.micro_batching).
+"""
+
+import pytorch_lightning as pl
+
+import protwavevae.telemetry as telemetry
+from protwavevae.telemetry import TIMER
+
+
+class Telemetry_callback(pl.Callback):
+    """
+    class description: per-phase timers around the Lightning training/validation loops. The time between the end
+    of a batch and the start of the next one is charged to the data fetch phase.
+    """
+    def __init__(
+            self,
+            profile_steps: int=0,
+            trace_dir: str=None
+        ):
+
+        super(Telemetry_callback, self).__init__()
+
+        self.profile_steps = profile_steps
+        self.trace_dir = trace_dir
+        self.profiler = None
+        self.profiled_steps = 0
+
+    # torch.profiler capture (wait 1 step, warm up 1 step, record profile_steps steps)
+
+    def on_train_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        if self.profile_steps > 0 and self.trace_dir:
+            self.profiler = telemetry.torch_profiler(self.trace_dir, active_steps = self.profile_steps)
+            self.profiler.__enter__()
+
+    def stop_profiler(self) -> None:
+        if self.profiler is not None:
+            self.profiler.__exit__(None, None, None)
+            self.profiler = None
+            print(f'torch.profiler trace: {self.trace_dir}')
+
+    def on_train_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        self.stop_profiler()
+
+    # training step phases
+
+    def on_train_epoch_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        TIMER.start('train/data_fetch')
+
+    def on_train_batch_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.stop('train/data_fetch')
+        TIMER.start('train/forward_loss')
+
+    def on_before_backward(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.stop('train/forward_loss')
+        # micro-batches after the first one: same backward call as the first one
+        latent_cache = getattr(pl_module, 'latent_cache', None)
+        TIMER.start('train/backward', same_call = latent_cache is not None and latent_cache.index > 0)
+
+    def on_after_backward(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        TIMER.stop('train/backward')
+
+    def on_before_optimizer_step(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.start('train/optimizer')
+
+    def on_train_batch_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.stop('train/optimizer')
+        TIMER.start('train/data_fetch')
+
+        if self.profiler is not None:
+            self.profiler.step()
+            self.profiled_steps += 1
+            if self.profiled_steps >= self.profile_steps + 2: # wait + warm-up + active steps
+                self.stop_profiler()
+
+    def on_train_epoch_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.open.pop('train/data_fetch', None) # the fetch after the last batch is the end of the epoch
+
+    # validation step phases
+
+    def on_validation_epoch_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        TIMER.open.pop('train/data_fetch', None) # validation is not charged to the training data fetch
+        TIMER.start('valid/data_fetch')
+
+    def on_validation_batch_start(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.stop('valid/data_fetch')
+        TIMER.start('valid/step')
+
+    def on_validation_batch_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule, *args: any) -> None:
+        TIMER.stop('valid/step')
+        TIMER.start('valid/data_fetch')
+
+    def on_validation_epoch_end(self, trainer: pl.Trainer, pl_module: pl.LightningModule) -> None:
+        TIMER.open.pop('valid/data_fetch', None)
+
+
+def get_callbacks(args: any, PL_model: pl.LightningModule) -> list:
+    """
+    function description: switches the timer on with args.profile (the environment variable also works), times
+    the submodule forwards of PL_model.model and returns the callback (empty list while profiling is off). The
+    torch.profiler trace of args.profile_steps steps goes to <output_results_path>_trace/.
+    """
+    if getattr(args, 'profile', 0):
+        telemetry.enable()
+    if not telemetry.enabled():
+        return []
+
+    telemetry.instrument(PL_model.model)
+    trace_dir = telemetry.summary_path(args.output_results_path).replace('_telemetry.csv', '_trace')
+    return [Telemetry_callback(profile_steps = getattr(args, 'profile_steps', 0), trace_dir = trace_dir)]
@@ -0,0 +1,10 @@
+from setuptools import setup
+
+
+setup(
+        name='protwavevae',
+        version='0.1.0',
+        description='ProtWaveVAE model core shared by the Benchmark, Pfam and SH3 projects',
+        packages=['protwavevae'],
+        python_requires='>=3.8'
+)